@@ -14,6 +14,7 @@ from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from .long_term_memory import create_memory_tool
+from ..token_cache import shared_token_cache
 
 
 class DroidAgent:
@@ -92,9 +93,17 @@ class DroidAgent:
             ("user", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
+        # With Entra ID, take the token from this process's cache instead of an API key. Only the
+        # blocking provider is passed: the cache's async side is bound to one event loop, and the
+        # async OpenAI client accepts a synchronous provider as well
+        token_cache = shared_token_cache()
+        token_options = {} if token_cache is None else {
+            "azure_ad_token_provider": token_cache.token_provider,
+        }
         self.llm = AzureChatOpenAI(
             azure_deployment="gpt-4.1",
-            api_version="2024-12-01-preview"
+            api_version="2024-12-01-preview",
+            **token_options
         )
         # self.memory = ConversationBufferMemory(
         #     chat_memory=ChatMessageHistory(),
@@ -0,0 +1,9 @@
+from .batcher import AppendBatcher
+from .bridge import ThreadToLoopBridge
+from .capture_processor import CaptureProcessor
+from .delta_decoder import DeltaDecoder
+from .echo_canceller import EchoCanceller
+from .jitter_buffer import JitterBuffer
+from .resampler import StreamResampler
+from .ring_buffer import RingBuffer
+from .vad import VoiceActivityGate
@@ -0,0 +1,64 @@
+"""Decide how much buffered microphone audio goes into each input_audio_buffer.append."""
+
+import time
+
+
+class AppendBatcher:
+    """
+    Merge captured PCM into appends of a target duration.
+
+    Every append costs base64 and JSON encoding, a websocket frame and a trip through the event
+    loop, so fewer, larger appends save CPU and uplink overhead at the price of latency. To keep the
+    start of an utterance snappy, the capture side reports speech onsets and an onset flushes
+    whatever is buffered right away.
+
+    note_captured() is called on the capture processor thread and take() on the event loop.
+    Each side only writes its own onset count, so an onset reported while take() runs is
+    flushed on the next call rather than lost.
+    """
+
+    def __init__(self, sample_rate: int, target_ms: int):
+        self.sample_rate = sample_rate
+        self.target_samples = sample_rate * target_ms // 1000
+        self._onsets = 0
+        self._flushed_onsets = 0
+
+        self.started_at = time.monotonic()
+        self.captured_chunks = 0
+        self.appends = 0
+        self.early_flushes = 0
+
+    def note_captured(self, speech_started: bool):
+        """Called from the capture processor thread for every chunk written to the input buffer."""
+        self.captured_chunks += 1
+        if speech_started:
+            self._onsets += 1
+
+    def take(self, fill: int) -> int:
+        """Return how many of the fill buffered samples to send now, or 0 to keep waiting."""
+        if fill == 0:
+            return 0
+        onsets = self._onsets
+        if onsets != self._flushed_onsets:
+            self._flushed_onsets = onsets
+            self.early_flushes += 1
+            self.appends += 1
+            return fill
+        if fill >= self.target_samples:
+            self.appends += 1
+            return self.target_samples
+        return 0
+
+    @property
+    def captured_chunks_per_second(self) -> float:
+        return self.captured_chunks / max(time.monotonic() - self.started_at, 1e-9)
+
+    @property
+    def appends_per_second(self) -> float:
+        return self.appends / max(time.monotonic() - self.started_at, 1e-9)
+
+    def describe(self) -> str:
+        return (
+            f"captured chunks/s: {self.captured_chunks_per_second:.1f}, "
+            f"appends/s: {self.appends_per_second:.1f}, early flushes: {self.early_flushes}"
+        )
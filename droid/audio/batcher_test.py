@@ -0,0 +1,49 @@
+from droid.audio.batcher import AppendBatcher
+
+SAMPLE_RATE = 24000
+
+
+def test_appends_wait_for_the_target_duration():
+    batcher = AppendBatcher(SAMPLE_RATE, 100)
+    assert batcher.target_samples == 2400
+    assert batcher.take(0) == 0
+    assert batcher.take(2399) == 0
+    assert batcher.take(2400) == 2400
+    # A backlog goes out as several appends of the target size
+    assert batcher.take(5000) == 2400
+    assert batcher.take(2600) == 2400
+    assert batcher.take(200) == 0
+    assert batcher.appends == 3
+    assert batcher.early_flushes == 0
+
+
+def test_speech_onset_flushes_what_is_buffered():
+    batcher = AppendBatcher(SAMPLE_RATE, 100)
+    batcher.note_captured(False)
+    assert batcher.take(480) == 0
+    batcher.note_captured(True)
+    assert batcher.take(960) == 960
+    assert batcher.early_flushes == 1
+    # The onset is flushed once, after that the target applies again
+    assert batcher.take(480) == 0
+    assert batcher.captured_chunks == 2
+
+
+def test_onset_with_nothing_buffered_waits_for_audio():
+    batcher = AppendBatcher(SAMPLE_RATE, 100)
+    batcher.note_captured(True)
+    assert batcher.take(0) == 0
+    assert batcher.take(240) == 240
+    assert batcher.early_flushes == 1
+
+
+def test_onsets_before_a_take_flush_once():
+    batcher = AppendBatcher(SAMPLE_RATE, 100)
+    batcher.note_captured(True)
+    batcher.note_captured(True)
+    assert batcher.take(960) == 960
+    assert batcher.take(480) == 0
+    # An onset reported after the take is not lost
+    batcher.note_captured(True)
+    assert batcher.take(480) == 480
+    assert batcher.early_flushes == 2
@@ -0,0 +1,67 @@
+"""Wake an asyncio consumer from an audio thread without parking an executor thread on a queue."""
+
+import asyncio
+import time
+
+from ..metrics import LatencyHistogram
+
+
+class ThreadToLoopBridge:
+    """
+    The producer thread writes audio into a shared buffer and calls notify(); the coroutine on
+    the event loop awaits wait() and then drains everything buffered in one batch.
+
+    Wake-ups are coalesced: while one is already scheduled on the loop, further notify() calls
+    cost only an attribute check, so a slow loop never sees a backlog of callbacks. Once the
+    loop has closed, notify() does nothing, so a producer that outlives it does not fail.
+
+    loop_lag measures call_soon_threadsafe to callback execution, i.e. how busy the loop is.
+    handoff_latency measures the first notify() after a drain to the end of the next drain.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._wake_scheduled = False
+        self._first_notify_time = None
+
+        self.notifications = 0
+        self.wakeups = 0
+        self.loop_lag = LatencyHistogram("loop lag")
+        self.handoff_latency = LatencyHistogram("handoff latency")
+
+    def notify(self):
+        """Called from the producer thread after writing to the shared buffer."""
+        self.notifications += 1
+        if self._first_notify_time is None:
+            self._first_notify_time = time.perf_counter()
+        if self._wake_scheduled:
+            return
+        self._wake_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake, time.perf_counter())
+        except RuntimeError:
+            # The loop is closed; the wake stays marked as scheduled, there is nothing left to wake
+            pass
+
+    def _wake(self, scheduled_at: float):
+        self._wake_scheduled = False
+        self.wakeups += 1
+        self.loop_lag.record(time.perf_counter() - scheduled_at)
+        self._ready.set()
+
+    async def wait(self):
+        await self._ready.wait()
+        self._ready.clear()
+
+    def drained(self):
+        """Called by the consumer after it has taken what it wants from the shared buffer."""
+        if self._first_notify_time is not None:
+            self.handoff_latency.record(time.perf_counter() - self._first_notify_time)
+            self._first_notify_time = None
+
+    def describe(self) -> str:
+        return (
+            f"notifications: {self.notifications}, wakeups: {self.wakeups}, "
+            f"{self.loop_lag.describe()}, {self.handoff_latency.describe()}"
+        )
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+
+from droid.audio.bridge import ThreadToLoopBridge
+
+
+def in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+@pytest.mark.asyncio
+async def test_notify_from_a_thread_wakes_the_loop():
+    bridge = ThreadToLoopBridge(asyncio.get_running_loop())
+    waiter = asyncio.create_task(bridge.wait())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    threading.Timer(0.01, bridge.notify).start()
+    await asyncio.wait_for(waiter, 5)
+    bridge.drained()
+    assert (bridge.notifications, bridge.wakeups) == (1, 1)
+    assert bridge.loop_lag.count == 1
+    assert bridge.handoff_latency.count == 1
+
+
+@pytest.mark.asyncio
+async def test_notifies_before_the_loop_runs_coalesce_into_one_wakeup():
+    bridge = ThreadToLoopBridge(asyncio.get_running_loop())
+
+    def produce():
+        for _ in range(100):
+            bridge.notify()
+
+    # The loop is blocked in join() while the thread notifies
+    in_thread(produce)
+    await asyncio.wait_for(bridge.wait(), 5)
+    bridge.drained()
+    assert (bridge.notifications, bridge.wakeups) == (100, 1)
+    # One handoff, timed from the first of the notifies
+    assert bridge.handoff_latency.count == 1
+
+    # After the wakeup has run, the next notify schedules another
+    in_thread(bridge.notify)
+    await asyncio.wait_for(bridge.wait(), 5)
+    assert bridge.wakeups == 2
+
+
+def test_notify_after_the_loop_closed_is_ignored():
+    loop = asyncio.new_event_loop()
+    bridge = ThreadToLoopBridge(loop)
+    loop.close()
+    errors = []
+
+    def produce():
+        try:
+            bridge.notify()
+            bridge.notify()
+        except Exception as error:
+            errors.append(error)
+
+    in_thread(produce)
+    assert errors == []
+    assert (bridge.notifications, bridge.wakeups) == (2, 0)
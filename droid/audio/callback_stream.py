@@ -0,0 +1,117 @@
+"""PyAudio stream callbacks that move audio between the sound card and preallocated ring buffers."""
+
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pyaudio
+
+from .bridge import ThreadToLoopBridge
+from .ring_buffer import RingBuffer
+
+
+class CaptureCallback:
+    """
+    stream_callback for the microphone stream. PortAudio calls it on its own thread once per
+    period; it only copies the raw device PCM into the capture ring, which wakes the
+    CaptureProcessor thread waiting on it, and notifies bridge when one is given.
+
+    overflows counts periods PortAudio flagged with paInputOverflow (the card dropped input
+    before the callback ran); the ring's own overruns count audio dropped because the capture
+    processor fell behind.
+    """
+
+    def __init__(self, ring: RingBuffer, bridge: Optional[ThreadToLoopBridge] = None):
+        self.ring = ring
+        self.bridge = bridge
+        self.callbacks = 0
+        self.overflows = 0
+
+    def __call__(self, in_data, frame_count, time_info, status):
+        self.callbacks += 1
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        if in_data is not None:
+            self.ring.write(in_data)
+            if self.bridge is not None:
+                self.bridge.notify()
+        return None, pyaudio.paContinue
+
+    def describe(self) -> str:
+        return (
+            f"capture callbacks: {self.callbacks}, input overflows: {self.overflows}, "
+            f"ring overruns: {self.ring.overruns} ({self.ring.dropped_samples} samples dropped)"
+        )
+
+
+class PlaybackCallback:
+    """
+    stream_callback for the speaker stream. Each period is copied from the playback source (a
+    RingBuffer or a JitterBuffer, anything with read_into) into a preallocated chunk, padded
+    with silence when the source comes up short, and the same samples are written to the
+    far-end ring so the echo canceller's reference matches the speaker exactly, silence included.
+
+    PyAudio only accepts bytes as callback output, so converting the chunk is the one copy left
+    per period. An idle period, with nothing to play, returns a preallocated block of silence.
+
+    underflows counts periods PortAudio flagged with paOutputUnderflow (the callback was too
+    late); partial_periods counts periods the source could only partly fill. first_audio_time
+    is the time.monotonic() of the first period with audio in it, which is also passed to
+    on_first_audio, on the PortAudio thread.
+    """
+
+    def __init__(
+        self,
+        source,
+        frames_per_buffer: int,
+        far_end_ring: Optional[RingBuffer] = None,
+        on_first_audio: Optional[Callable[[float], None]] = None,
+    ):
+        self.source = source
+        self.far_end_ring = far_end_ring
+        self.on_first_audio = on_first_audio
+        self.first_audio_time = None
+        self._chunk = np.zeros(frames_per_buffer, dtype=np.int16)
+        self._silence = np.zeros(frames_per_buffer, dtype=np.int16)
+        self._silence_bytes = self._silence.tobytes()
+        self.callbacks = 0
+        self.idle_callbacks = 0
+        self.underflows = 0
+        self.partial_periods = 0
+
+    def __call__(self, in_data, frame_count, time_info, status):
+        self.callbacks += 1
+        if status & pyaudio.paOutputUnderflow:
+            self.underflows += 1
+        if frame_count > len(self._chunk):
+            # Only happens with paFramesPerBufferUnspecified, and then once per larger size
+            self._chunk = np.zeros(frame_count, dtype=np.int16)
+            self._silence = np.zeros(frame_count, dtype=np.int16)
+            self._silence_bytes = self._silence.tobytes()
+
+        chunk = self._chunk[:frame_count]
+        count = self.source.read_into(chunk)
+        if count == 0:
+            self.idle_callbacks += 1
+            if self.far_end_ring is not None:
+                self.far_end_ring.write(self._silence[:frame_count])
+            if frame_count == len(self._silence):
+                return self._silence_bytes, pyaudio.paContinue
+            return self._silence_bytes[:frame_count * 2], pyaudio.paContinue
+
+        if self.first_audio_time is None:
+            self.first_audio_time = time.monotonic()
+            if self.on_first_audio is not None:
+                self.on_first_audio(self.first_audio_time)
+        if count < frame_count:
+            self.partial_periods += 1
+            chunk[count:] = 0
+        if self.far_end_ring is not None:
+            self.far_end_ring.write(chunk)
+        return chunk.tobytes(), pyaudio.paContinue
+
+    def describe(self) -> str:
+        return (
+            f"playback callbacks: {self.callbacks}, idle: {self.idle_callbacks}, "
+            f"output underflows: {self.underflows}, partial periods: {self.partial_periods}"
+        )
@@ -0,0 +1,26 @@
+import numpy as np
+
+from droid.audio.callback_stream import PlaybackCallback
+from droid.audio.ring_buffer import RingBuffer
+
+PERIOD = 480
+
+
+def test_first_audio_is_reported_once_after_idle_periods():
+    source = RingBuffer(PERIOD * 4)
+    far_end = RingBuffer(PERIOD * 8)
+    reported = []
+    callback = PlaybackCallback(source, PERIOD, far_end, on_first_audio=reported.append)
+
+    silence, _ = callback(None, PERIOD, {}, 0)
+    assert silence == bytes(PERIOD * 2)
+    assert callback.first_audio_time is None
+
+    source.write(np.full(PERIOD + 100, 1000, dtype=np.int16))
+    audio, _ = callback(None, PERIOD, {}, 0)
+    assert np.frombuffer(audio, dtype=np.int16).tolist() == [1000] * PERIOD
+    callback(None, PERIOD, {}, 0)
+    assert reported == [callback.first_audio_time]
+    assert (callback.idle_callbacks, callback.partial_periods) == (1, 1)
+    # The speaker's silence is in the echo reference too, sample for sample
+    assert far_end.fill == 3 * PERIOD
@@ -0,0 +1,134 @@
+"""Run the microphone DSP on a worker thread, between the capture callback and the event loop."""
+
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from ..metrics import LatencyHistogram
+from .batcher import AppendBatcher
+from .bridge import ThreadToLoopBridge
+from .echo_canceller import EchoCanceller
+from .resampler import StreamResampler
+from .ring_buffer import RingBuffer
+from .vad import VoiceActivityGate
+
+
+class CaptureProcessor:
+    """
+    Take whole periods from the capture ring that CaptureCallback fills, cancel the speaker
+    echo against the far-end ring that PlaybackCallback fills, resample to the API rate and
+    gate with the voice activity detector, on a worker thread. The gated samples go into the
+    output ring, speech onsets go to the batcher, and the bridge wakes the event loop, which
+    only batches, encodes and sends.
+
+    The capture and far-end rings are read in lockstep, sample for sample. When the playback
+    callback has not written a period's reference yet, the missing part is taken as silence
+    and as many far-end samples are skipped once they arrive, so one late playback period
+    does not leave the reference misaligned for the rest of the session.
+
+    The worker is the only consumer of the capture and far-end rings and the only producer of
+    the output ring. With threaded=False nothing runs until process() is called, in the caller.
+    """
+
+    def __init__(
+        self,
+        capture_ring: RingBuffer,
+        far_end_ring: RingBuffer,
+        output: RingBuffer,
+        echo_canceller: EchoCanceller,
+        resampler: StreamResampler,
+        vad_gate: VoiceActivityGate,
+        batcher: AppendBatcher,
+        chunk_size: int,
+        bridge: Optional[ThreadToLoopBridge] = None,
+        threaded: bool = True,
+    ):
+        self.capture_ring = capture_ring
+        self.far_end_ring = far_end_ring
+        self.output = output
+        self.echo_canceller = echo_canceller
+        self.resampler = resampler
+        self.vad_gate = vad_gate
+        self.batcher = batcher
+        self.chunk_size = chunk_size
+        self.bridge = bridge
+        self.threaded = threaded
+        self._far_end_chunk = np.zeros(chunk_size, dtype=np.int16)
+        # Far-end samples stood in for with silence that are still to be skipped
+        self._far_end_shortfall = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.processed_chunks = 0
+        self.far_end_underruns = 0
+        self.far_end_skipped = 0
+        self.dsp_time = LatencyHistogram("capture dsp")
+
+    def start(self):
+        if self.threaded and self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="capture-processor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            # The timeout only bounds how long stop() waits when the microphone goes quiet
+            if self.capture_ring.wait(self.chunk_size, timeout=0.1):
+                self.process()
+
+    def process(self) -> int:
+        """Process every whole period buffered in the capture ring. Returns how many there were."""
+        chunks = 0
+        while self.capture_ring.fill >= self.chunk_size:
+            start = time.perf_counter()
+            self._process_chunk()
+            self.dsp_time.record(time.perf_counter() - start)
+            chunks += 1
+        self.processed_chunks += chunks
+        if chunks and self.bridge is not None:
+            self.bridge.notify()
+        return chunks
+
+    def _process_chunk(self):
+        audio_view = self.capture_ring.peek(self.chunk_size)
+
+        # remove the droid's own voice using what the playback callback handed to the speaker
+        # as the reference, padded with silence if the speaker stream has not caught up
+        if self._far_end_shortfall:
+            skipped = self.far_end_ring.skip(self._far_end_shortfall)
+            self._far_end_shortfall -= skipped
+            self.far_end_skipped += skipped
+        far_end = self._far_end_chunk
+        far_end_count = self.far_end_ring.read_into(far_end) if self.far_end_ring.fill else 0
+        if far_end_count < len(far_end):
+            far_end[far_end_count:] = 0
+            self._far_end_shortfall += len(far_end) - far_end_count
+            self.far_end_underruns += 1
+        audio_array = self.echo_canceller.process(np.asarray(audio_view), far_end)
+        self.capture_ring.consume(len(audio_view))
+
+        # resample audio data from the device rate to the API rate, unless the device runs at it
+        if not self.resampler.passthrough:
+            audio_array = self.resampler.process(audio_array)
+
+        # only stream audio around detected speech, silence costs uplink and audio tokens
+        gated_audio_array, speech_started = self.vad_gate.process(audio_array)
+        self.output.write(gated_audio_array)
+        self.batcher.note_captured(speech_started)
+
+    def reset_statistics(self):
+        self.dsp_time.reset()
+
+    def describe(self) -> str:
+        return (
+            f"processed chunks: {self.processed_chunks}, far-end underruns: {self.far_end_underruns} "
+            f"({self.far_end_skipped} samples skipped), {self.dsp_time.describe()}"
+        )
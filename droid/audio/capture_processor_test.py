@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from droid.audio import AppendBatcher, CaptureProcessor, EchoCanceller, RingBuffer, StreamResampler, ThreadToLoopBridge, VoiceActivityGate
+
+DEVICE_RATE = 48000
+API_RATE = 24000
+CHUNK_SIZE = 960
+
+
+def speech(seconds: float, rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (6000 * np.sin(2 * np.pi * 180 * t)).astype(np.int16)
+
+
+def make_processor(bridge=None, threaded: bool = True) -> CaptureProcessor:
+    return CaptureProcessor(
+        RingBuffer(DEVICE_RATE),
+        RingBuffer(DEVICE_RATE),
+        RingBuffer(API_RATE),
+        EchoCanceller(DEVICE_RATE),
+        StreamResampler(DEVICE_RATE, API_RATE),
+        VoiceActivityGate(API_RATE, preroll_ms=0),
+        AppendBatcher(API_RATE, 100),
+        CHUNK_SIZE,
+        bridge=bridge,
+        threaded=threaded,
+    )
+
+
+def test_only_whole_periods_are_processed():
+    processor = make_processor(threaded=False)
+    processor.capture_ring.write(speech(0.05, DEVICE_RATE)[:CHUNK_SIZE * 2 + 100])
+    assert processor.process() == 2
+    assert processor.capture_ring.fill == 100
+    assert processor.batcher.captured_chunks == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_thread_gates_audio_and_wakes_the_loop():
+    bridge = ThreadToLoopBridge(asyncio.get_running_loop())
+    processor = make_processor(bridge)
+    threads = set()
+    process = processor._process_chunk
+
+    def process_chunk():
+        threads.add(threading.current_thread().name)
+        process()
+
+    processor._process_chunk = process_chunk
+    processor.start()
+    try:
+        audio = speech(1.0, DEVICE_RATE)
+        for offset in range(0, len(audio), CHUNK_SIZE):
+            processor.capture_ring.write(audio[offset:offset + CHUNK_SIZE])
+        await asyncio.wait_for(bridge.wait(), 5)
+        while processor.processed_chunks < len(audio) // CHUNK_SIZE:
+            await asyncio.sleep(0.01)
+    finally:
+        processor.stop()
+    assert threads == {"capture-processor"}
+    assert processor.vad_gate.speech_segments == 1
+    # Half the samples at the API rate, less the echo canceller's partial block and the gate onset
+    assert API_RATE * 0.9 < processor.output.fill <= API_RATE
+    assert bridge.notifications >= 1
+
+
+def test_far_end_underrun_mid_stream_keeps_the_reference_aligned():
+    rng = np.random.default_rng(7)
+    playback = lfilter([1], [1, -0.9], rng.standard_normal(API_RATE * 6))
+    playback = (playback / np.abs(playback).max() * 12000).astype(np.int16)
+    room = np.zeros(2400)
+    room[300:] = rng.standard_normal(2100) * np.exp(-np.arange(2100) / 300)
+    room /= np.abs(room).sum() / 0.8
+    mic = np.convolve(playback, room)[:len(playback)].astype(np.int16)
+
+    processor = CaptureProcessor(
+        RingBuffer(API_RATE),
+        RingBuffer(API_RATE),
+        RingBuffer(API_RATE * 6),
+        EchoCanceller(API_RATE, tail_ms=120),
+        StreamResampler(API_RATE, API_RATE),
+        VoiceActivityGate(API_RATE, enabled=False),
+        AppendBatcher(API_RATE, 100),
+        CHUNK_SIZE,
+        threaded=False,
+    )
+    late = 2 * API_RATE // CHUNK_SIZE
+    for index, offset in enumerate(range(0, len(mic), CHUNK_SIZE)):
+        # One playback period arrives after the capture period it was played during
+        if index != late:
+            processor.far_end_ring.write(playback[offset - CHUNK_SIZE if index == late + 1 else offset:offset + CHUNK_SIZE])
+        processor.capture_ring.write(mic[offset:offset + CHUNK_SIZE])
+        processor.process()
+
+    assert processor.far_end_underruns == 1
+    assert processor.far_end_skipped == CHUNK_SIZE
+    output = np.zeros(processor.output.fill, dtype=np.int16)
+    processor.output.read_into(output)
+    converged = slice(4 * API_RATE, len(output))
+    erle = 10 * np.log10(np.sum(np.square(mic[converged].astype(np.float64))) / np.sum(np.square(output[converged].astype(np.float64))))
+    assert erle > 20
@@ -0,0 +1,102 @@
+"""Decode response.audio.delta payloads into the playout buffer off the event loop."""
+
+import base64
+import queue
+import threading
+import time
+from typing import Optional
+
+from ..metrics import LatencyHistogram
+from .jitter_buffer import JitterBuffer
+from .resampler import StreamResampler
+
+
+class DeltaDecoder:
+    """
+    Base64-decode, transport-decode and resample each response.audio.delta on a worker thread,
+    writing the samples straight into the playout buffer, so the event loop that also reads the
+    websocket only parses frames.
+
+    The worker is the playout buffer's only producer. end_of_stream() and clear() are queued
+    behind the deltas submitted before them, which keeps their order and the ring's single
+    producer rule; deltas still queued when clear() is called are skipped, not decoded.
+
+    PCM16 payloads reach the ring as a view over the base64-decoded bytes, so the ring write is
+    the only copy after decoding. With threaded=False the work runs inline in the caller.
+    """
+
+    def __init__(self, output: JitterBuffer, codec, resampler: StreamResampler, threaded: bool = True):
+        self.output = output
+        self.codec = codec
+        self.resampler = resampler
+        self.threaded = threaded
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._generation = 0
+
+        self.decoded_deltas = 0
+        self.skipped_deltas = 0
+        self.decode_time = LatencyHistogram("delta decode")
+        self.queue_delay = LatencyHistogram("decode queue delay")
+
+    def start(self):
+        if self.threaded and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="delta-decoder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def pending(self) -> int:
+        """Deltas and commands waiting for the worker."""
+        return self._queue.qsize()
+
+    def submit(self, delta: str, item_id: Optional[str] = None, content_index: int = 0):
+        """Queue a base64 delta. Its arrival time is taken now, for the playout jitter estimate."""
+        self._dispatch(self._decode, delta, item_id, content_index, time.perf_counter(), self._generation)
+
+    def end_of_stream(self):
+        self._dispatch(self.output.end_of_stream)
+
+    def clear(self):
+        """Flush the playout buffer, dropping any deltas submitted before now."""
+        self._generation += 1
+        self._dispatch(self.output.clear)
+
+    def _dispatch(self, function, *args):
+        if self._thread is None:
+            function(*args)
+        else:
+            self._queue.put((function, args))
+
+    def _run(self):
+        while (command := self._queue.get()) is not None:
+            function, args = command
+            function(*args)
+
+    def _decode(self, delta: str, item_id: Optional[str], content_index: int, arrival_time: float, generation: int):
+        if generation != self._generation:
+            self.skipped_deltas += 1
+            return
+        start = time.perf_counter()
+        self.queue_delay.record(start - arrival_time)
+        audio_array = self.codec.decode(base64.b64decode(delta))
+        if not self.resampler.passthrough:
+            audio_array = self.resampler.process(audio_array)
+        self.output.write(audio_array, arrival_time=arrival_time, item_id=item_id, content_index=content_index)
+        self.decoded_deltas += 1
+        self.decode_time.record(time.perf_counter() - start)
+
+    def reset_statistics(self):
+        self.decode_time.reset()
+        self.queue_delay.reset()
+
+    def describe(self) -> str:
+        return (
+            f"decoded: {self.decoded_deltas}, skipped: {self.skipped_deltas}, pending: {self.pending}, "
+            f"{self.decode_time.describe()}, {self.queue_delay.describe()}"
+        )
@@ -0,0 +1,64 @@
+import base64
+import threading
+
+import numpy as np
+
+from droid.audio.delta_decoder import DeltaDecoder
+from droid.audio.g711 import PCM16
+from droid.audio.jitter_buffer import JitterBuffer
+from droid.audio.resampler import StreamResampler
+
+SAMPLE_RATE = 24000
+
+
+def delta(value: int, samples: int = 480) -> str:
+    return base64.b64encode(np.full(samples, value, dtype=np.int16).tobytes()).decode("ascii")
+
+
+def make_decoder(threaded: bool) -> DeltaDecoder:
+    output = JitterBuffer(SAMPLE_RATE, 5)
+    return DeltaDecoder(output, PCM16, StreamResampler(SAMPLE_RATE, SAMPLE_RATE), threaded=threaded)
+
+
+def played(decoder: DeltaDecoder) -> np.ndarray:
+    decoder.output.end_of_stream()
+    out = np.zeros(decoder.output.fill, dtype=np.int16)
+    decoder.output.read_into(out)
+    return out
+
+
+def test_clear_discards_deltas_still_queued_for_the_worker():
+    decoder = make_decoder(threaded=True)
+    decoder.start()
+    # Hold the worker so that everything below is still queued when clear() is called
+    release = threading.Event()
+    decoder._dispatch(release.wait)
+    for _ in range(3):
+        decoder.submit(delta(1000), item_id="item_1")
+    decoder.clear()
+    for _ in range(2):
+        decoder.submit(delta(2000), item_id="item_2")
+    release.set()
+    decoder.stop()
+
+    assert (decoder.skipped_deltas, decoder.decoded_deltas) == (3, 2)
+    np.testing.assert_array_equal(played(decoder), np.full(960, 2000))
+    assert decoder.output.playback_position() is None
+
+
+def test_clear_inline_flushes_what_was_decoded():
+    decoder = make_decoder(threaded=False)
+    decoder.submit(delta(1000), item_id="item_1")
+    assert decoder.output.fill == 480
+    decoder.clear()
+    assert decoder.output.fill == 0
+    decoder.submit(delta(2000), item_id="item_2")
+    assert (decoder.skipped_deltas, decoder.decoded_deltas) == (0, 2)
+    np.testing.assert_array_equal(played(decoder), np.full(480, 2000))
+
+
+def test_deltas_are_resampled_to_the_device_rate():
+    output = JitterBuffer(SAMPLE_RATE * 2, 5)
+    decoder = DeltaDecoder(output, PCM16, StreamResampler(SAMPLE_RATE, SAMPLE_RATE * 2), threaded=False)
+    decoder.submit(delta(1000, samples=4800))
+    assert abs(output.fill - 9600) <= 1
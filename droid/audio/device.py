@@ -0,0 +1,72 @@
+"""Probe what the sound card supports so the realtime path can avoid resampling."""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import pyaudio
+
+NATIVE_RATE_MULTIPLES = (1, 2)  # 24 kHz, then 48 kHz
+
+
+@dataclass
+class AudioRatePlan:
+    device_rate: int
+    api_rate: int
+
+    @property
+    def native(self) -> bool:
+        return self.device_rate == self.api_rate
+
+    def describe(self) -> str:
+        if self.native:
+            return f"device {self.device_rate} Hz, native (no resampling)"
+        if self.device_rate % self.api_rate == 0:
+            return f"device {self.device_rate} Hz, integer {self.device_rate // self.api_rate}:1 resampling"
+        return f"device {self.device_rate} Hz, fallback resampling to {self.api_rate} Hz"
+
+
+def _supports_rate(
+    p: pyaudio.PyAudio,
+    rate: int,
+    format: int,
+    input_device_index: Optional[int],
+    input_channels: int,
+    output_device_index: Optional[int],
+    output_channels: int,
+) -> bool:
+    try:
+        return p.is_format_supported(
+            rate,
+            input_device=input_device_index,
+            input_channels=input_channels,
+            input_format=format,
+        ) and p.is_format_supported(
+            rate,
+            output_device=output_device_index,
+            output_channels=output_channels,
+            output_format=format,
+        )
+    except ValueError:
+        # PyAudio reports unsupported formats by raising rather than returning False
+        return False
+
+
+def negotiate_sample_rate(
+    p: pyaudio.PyAudio,
+    api_rate: int,
+    fallback_rate: int,
+    format: int,
+    input_device_index: Optional[int],
+    input_channels: int,
+    output_device_index: Optional[int],
+    output_channels: int,
+) -> AudioRatePlan:
+    """
+    Pick one rate for both the microphone and the speaker. The API rate itself is preferred,
+    then whole-number multiples of it, and fallback_rate is used if the card accepts none of them.
+    """
+    for multiple in NATIVE_RATE_MULTIPLES:
+        rate = api_rate * multiple
+        if _supports_rate(p, rate, format, input_device_index, input_channels, output_device_index, output_channels):
+            return AudioRatePlan(device_rate=rate, api_rate=api_rate)
+    return AudioRatePlan(device_rate=fallback_rate, api_rate=api_rate)
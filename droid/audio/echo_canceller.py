@@ -0,0 +1,137 @@
+"""Acoustic echo canceller that removes the droid's own voice from the microphone signal."""
+
+import numpy as np
+
+
+class EchoCanceller:
+    """
+    Partitioned-block frequency-domain NLMS echo canceller (overlap-save, MDF style).
+
+    The far-end reference is the audio handed to the speaker and the near-end signal is the
+    microphone. An adaptive filter of tail_ms models the path from speaker to microphone and its
+    echo estimate is subtracted from the microphone. delay_samples shifts the reference back by
+    the known playback latency so the adaptive tail only has to cover the room.
+
+    Adaptation pauses while the far end is silent and, with a Geigel detector, while the near
+    end talks over it, so the filter is not pulled off by the user's own voice.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        block_ms: int = 10,
+        tail_ms: int = 200,
+        delay_samples: int = 0,
+        step_size: float = 0.5,
+        double_talk_ratio: float = 0.6,
+        double_talk_hold_blocks: int = 20,
+    ):
+        self.sample_rate = sample_rate
+        self.block_size = sample_rate * block_ms // 1000
+        self.partitions = max(1, -(-sample_rate * tail_ms // 1000 // self.block_size))
+        self.delay_samples = delay_samples
+        self.step_size = step_size
+        self.double_talk_ratio = double_talk_ratio
+        self.double_talk_hold_blocks = double_talk_hold_blocks
+
+        n = self.block_size
+        bins = n + 1
+        self._weights = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._far_spectra = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._far_power = np.zeros(bins)
+        self._far_window = np.zeros(2 * n)
+        # Far-end samples waiting for their delay to pass, and near-end/far-end samples that do
+        # not make up a whole block yet
+        self._delay_line = np.zeros(delay_samples, dtype=np.float64)
+        self._near_pending = np.zeros(0, dtype=np.float64)
+        self._far_pending = np.zeros(0, dtype=np.float64)
+        # Recent far-end peak levels for the Geigel double-talk detector
+        self._far_peaks = np.zeros(self.partitions)
+        self._double_talk_hold = 0
+        self._constrain_next = 0
+        self._zeros = np.zeros(n)
+
+        self.blocks = 0
+        self.adapted_blocks = 0
+        self.double_talk_blocks = 0
+        self._near_energy = 0.0
+        self._error_energy = 0.0
+
+    @property
+    def erle_db(self) -> float:
+        """Echo return loss enhancement since the last reset of the energy counters, in dB."""
+        if self._error_energy <= 0 or self._near_energy <= 0:
+            return 0.0
+        return 10 * np.log10(self._near_energy / self._error_energy)
+
+    def reset_statistics(self):
+        self._near_energy = 0.0
+        self._error_energy = 0.0
+
+    def process(self, near: np.ndarray, far: np.ndarray) -> np.ndarray:
+        """
+        Cancel echo from a chunk of int16 microphone samples, given the same number of samples
+        sent to the speaker. Returns the echo-cancelled int16 samples that complete whole blocks;
+        the remainder is held until the next call.
+        """
+        far = far.astype(np.float64)
+        if self.delay_samples:
+            delayed = np.concatenate((self._delay_line, far))
+            far = delayed[:len(far)]
+            self._delay_line = delayed[len(far):]
+        near = np.concatenate((self._near_pending, near.astype(np.float64)))
+        far = np.concatenate((self._far_pending, far))
+
+        n = self.block_size
+        block_count = len(near) // n
+        output = np.empty(block_count * n)
+        for index in range(block_count):
+            block = slice(index * n, (index + 1) * n)
+            output[block] = self._process_block(near[block], far[block])
+        self._near_pending = near[block_count * n:]
+        self._far_pending = far[block_count * n:]
+
+        np.clip(np.rint(output, out=output), -32768, 32767, out=output)
+        return output.astype(np.int16)
+
+    def _process_block(self, near: np.ndarray, far: np.ndarray) -> np.ndarray:
+        n = self.block_size
+        self.blocks += 1
+
+        # Shift the newest far-end block into the overlap-save window and the partition history
+        self._far_window[:n] = self._far_window[n:]
+        self._far_window[n:] = far
+        self._far_spectra = np.roll(self._far_spectra, 1, axis=0)
+        self._far_spectra[0] = np.fft.rfft(self._far_window)
+        self._far_peaks = np.roll(self._far_peaks, 1)
+        self._far_peaks[0] = np.max(np.abs(far))
+
+        echo_estimate = np.fft.irfft(np.sum(self._weights * self._far_spectra, axis=0))[n:]
+        error = near - echo_estimate
+        self._near_energy += float(np.dot(near, near))
+        self._error_energy += float(np.dot(error, error))
+
+        far_peak = self._far_peaks.max()
+        if far_peak < 1.0:
+            return error
+        if np.max(np.abs(near)) > self.double_talk_ratio * far_peak:
+            self._double_talk_hold = self.double_talk_hold_blocks
+        if self._double_talk_hold:
+            self._double_talk_hold -= 1
+            self.double_talk_blocks += 1
+            return error
+
+        # Normalised update, with the step scaled by the far-end power across the whole tail
+        self._far_power = 0.9 * self._far_power + 0.1 * np.sum(np.abs(self._far_spectra) ** 2, axis=0)
+        error_spectrum = np.fft.rfft(np.concatenate((self._zeros, error)))
+        gradient = np.conj(self._far_spectra) * (error_spectrum / (self._far_power + 1e-6))
+        self._weights += self.step_size * gradient
+
+        # Keep one partition per block a proper linear (not circular) convolution
+        p = self._constrain_next
+        impulse = np.fft.irfft(self._weights[p])
+        impulse[n:] = 0
+        self._weights[p] = np.fft.rfft(impulse)
+        self._constrain_next = (p + 1) % self.partitions
+        self.adapted_blocks += 1
+        return error
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from scipy.io import wavfile
+from scipy.signal import lfilter
+
+from droid.audio.echo_canceller import EchoCanceller
+
+SAMPLE_RATE = 24000
+CHUNK_SIZE = 2048
+
+
+def cancel(canceller: EchoCanceller, near: np.ndarray, far: np.ndarray) -> np.ndarray:
+    output = [
+        canceller.process(near[i:i + CHUNK_SIZE], far[i:i + CHUNK_SIZE])
+        for i in range(0, len(near), CHUNK_SIZE)
+    ]
+    return np.concatenate(output)
+
+
+def energy_db(samples: np.ndarray) -> float:
+    samples = samples.astype(np.float64)
+    return 10 * np.log10(np.dot(samples, samples) + 1e-9)
+
+
+@pytest.fixture
+def recorded_pair(tmp_path):
+    """Write a playback/microphone WAV pair the way a recording session on the droid would."""
+    rng = np.random.default_rng(7)
+    seconds = 6
+    playback = lfilter([1], [1, -0.9], rng.standard_normal(SAMPLE_RATE * seconds))
+    playback = playback / np.abs(playback).max() * 12000
+    # Speaker to microphone path: 12 ms of latency followed by a decaying room response
+    room = np.zeros(2400)
+    room[300:] = rng.standard_normal(2100) * np.exp(-np.arange(2100) / 300)
+    room /= np.abs(room).sum() / 0.8
+    echo = np.convolve(playback, room)[:len(playback)]
+    mic = echo + rng.standard_normal(len(echo)) * 2
+
+    playback_path = tmp_path / "playback.wav"
+    mic_path = tmp_path / "mic.wav"
+    wavfile.write(playback_path, SAMPLE_RATE, playback.astype(np.int16))
+    wavfile.write(mic_path, SAMPLE_RATE, mic.astype(np.int16))
+    return playback_path, mic_path
+
+
+def test_cancels_echo_from_recorded_pair(recorded_pair):
+    playback_path, mic_path = recorded_pair
+    _, playback = wavfile.read(playback_path)
+    _, mic = wavfile.read(mic_path)
+
+    output = cancel(EchoCanceller(SAMPLE_RATE, tail_ms=120), mic, playback)
+
+    converged = slice(3 * SAMPLE_RATE, len(output))
+    erle = energy_db(mic[converged]) - energy_db(output[converged])
+    assert erle > 20
+
+
+def test_passes_near_end_through_when_speaker_is_silent():
+    rng = np.random.default_rng(1)
+    near = (rng.standard_normal(SAMPLE_RATE) * 3000).astype(np.int16)
+    far = np.zeros_like(near)
+
+    output = cancel(EchoCanceller(SAMPLE_RATE), near, far)
+
+    np.testing.assert_array_equal(output, near[:len(output)])
+
+
+def test_keeps_near_end_speech_during_double_talk(recorded_pair):
+    playback_path, mic_path = recorded_pair
+    _, playback = wavfile.read(playback_path)
+    _, mic = wavfile.read(mic_path)
+    # The user starts talking over the droid after the filter has converged
+    rng = np.random.default_rng(3)
+    talk = slice(4 * SAMPLE_RATE, 5 * SAMPLE_RATE)
+    near = np.zeros(len(mic))
+    near[talk] = lfilter([1], [1, -0.8], rng.standard_normal(SAMPLE_RATE)) * 1500
+    mixed = np.clip(mic + near, -32768, 32767).astype(np.int16)
+
+    canceller = EchoCanceller(SAMPLE_RATE, tail_ms=120)
+    output = cancel(canceller, mixed, playback)
+
+    assert canceller.double_talk_blocks > 0
+    residual_near = output[talk].astype(np.float64)
+    # Almost all of what remains is the user's voice, at close to its original level
+    assert abs(energy_db(residual_near) - energy_db(near[talk])) < 1.0
+    assert np.corrcoef(residual_near, near[talk])[0, 1] > 0.95
+
+
+@pytest.mark.parametrize("delay_ms, converges", [(40, True), (80, False)])
+def test_delay_must_not_exceed_the_echo_path(recorded_pair, delay_ms, converges):
+    playback_path, mic_path = recorded_pair
+    _, playback = wavfile.read(playback_path)
+    _, mic = wavfile.read(mic_path)
+    # 40 ms of output latency ahead of the room, as when the reference is taken at the callback
+    latency = SAMPLE_RATE * 40 // 1000
+    mic = np.concatenate((np.zeros(latency, dtype=np.int16), mic[:-latency]))
+
+    canceller = EchoCanceller(SAMPLE_RATE, tail_ms=120, delay_samples=SAMPLE_RATE * delay_ms // 1000)
+    output = cancel(canceller, mic, playback)
+
+    converged = slice(3 * SAMPLE_RATE, len(output))
+    erle = energy_db(mic[converged]) - energy_db(output[converged])
+    # A reference delayed past its own echo leaves the filter nothing to model
+    assert (erle > 20) == converges
@@ -0,0 +1,96 @@
+"""Table-driven G.711 (mu-law and A-law) codecs for the realtime audio transport."""
+
+import numpy as np
+
+MU_LAW_BIAS = 0x84
+# Encoding works on 14-bit magnitudes, as in the ITU-T G.191 reference implementation
+MU_LAW_BIAS_14 = 0x21
+MU_LAW_CLIP_14 = 8159
+MU_LAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+A_LAW_SEGMENT_ENDS = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def _all_int16() -> np.ndarray:
+    # Indexed by the uint16 bit pattern of each int16 sample
+    return np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32)
+
+
+def _mu_law_encode_table() -> np.ndarray:
+    samples = _all_int16() >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), MU_LAW_CLIP_14) + MU_LAW_BIAS_14
+    segment = np.searchsorted(MU_LAW_SEGMENT_ENDS, magnitude)
+    code = (np.minimum(segment, 7) << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    code = np.where(segment >= 8, 0x7F, code)
+    return (code ^ mask).astype(np.uint8)
+
+
+def _mu_law_decode_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + MU_LAW_BIAS) << exponent) - MU_LAW_BIAS
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _a_law_encode_table() -> np.ndarray:
+    samples = _all_int16() >> 3
+    mask = np.where(samples >= 0, 0xD5, 0x55)
+    magnitude = np.where(samples >= 0, samples, -samples - 1)
+    segment = np.searchsorted(A_LAW_SEGMENT_ENDS, magnitude)
+    shift = np.maximum(segment, 1)
+    code = (np.minimum(segment, 7) << 4) | ((magnitude >> shift) & 0x0F)
+    code = np.where(segment >= 8, 0x7F, code)
+    return (code ^ mask).astype(np.uint8)
+
+
+def _a_law_decode_table() -> np.ndarray:
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    segment = (codes & 0x70) >> 4
+    magnitude = (codes & 0x0F) << 4
+    magnitude = np.where(segment == 0, magnitude + 8, (magnitude + 0x108) << np.maximum(segment - 1, 0))
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+class Pcm16Codec:
+    """Raw 16-bit PCM, the transport default. Encoding hands the samples through untouched."""
+
+    sample_rate = 24000
+    bytes_per_sample = 2
+
+    def encode(self, samples):
+        return samples
+
+    def decode(self, data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.int16)
+
+
+class G711Codec:
+    """
+    One byte per sample companding, with both directions done by a single table lookup. The
+    encode table has an entry for every int16 value, so encoding is one fancy-index operation.
+    """
+
+    sample_rate = 8000
+    bytes_per_sample = 1
+
+    def __init__(self, encode_table: np.ndarray, decode_table: np.ndarray):
+        self._encode_table = encode_table
+        self._decode_table = decode_table
+
+    def encode(self, samples) -> np.ndarray:
+        return self._encode_table[np.asarray(samples, dtype=np.int16).view(np.uint16)]
+
+    def decode(self, data: bytes) -> np.ndarray:
+        return self._decode_table[np.frombuffer(data, dtype=np.uint8)]
+
+
+MU_LAW = G711Codec(_mu_law_encode_table(), _mu_law_decode_table())
+A_LAW = G711Codec(_a_law_encode_table(), _a_law_decode_table())
+PCM16 = Pcm16Codec()
+
+TRANSPORT_CODECS = {
+    "pcm16": PCM16,
+    "g711-ulaw": MU_LAW,
+    "g711-alaw": A_LAW,
+}
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from droid.audio.g711 import A_LAW, MU_LAW, PCM16, TRANSPORT_CODECS
+
+ALL_SAMPLES = np.arange(-32768, 32768, dtype=np.int16)
+ALL_CODES = np.arange(256, dtype=np.uint8).tobytes()
+
+# Reference values from the ITU-T G.191 implementation
+KNOWN_MU_LAW = {0: 0xFF, 1000: 0xCE, -1000: 0x4E, 32767: 0x80, -32768: 0x00}
+KNOWN_A_LAW = {0: 0xD5, 1000: 0xFA, -1000: 0x7A, 32767: 0xAA, -32768: 0x2A}
+
+
+@pytest.mark.parametrize("codec, known", [(MU_LAW, KNOWN_MU_LAW), (A_LAW, KNOWN_A_LAW)])
+def test_encode_matches_reference(codec, known):
+    samples = np.array(list(known.keys()), dtype=np.int16)
+    assert codec.encode(samples).tolist() == list(known.values())
+
+
+@pytest.mark.parametrize("codec", [MU_LAW, A_LAW])
+def test_round_trip_error_is_within_one_quantisation_step(codec):
+    decoded = codec.decode(codec.encode(ALL_SAMPLES).tobytes()).astype(np.int32)
+    error = np.abs(decoded - ALL_SAMPLES.astype(np.int32))
+    magnitude = np.abs(ALL_SAMPLES.astype(np.int32))
+    assert error[magnitude <= 256].max() <= 16
+    assert (error[magnitude > 256] / magnitude[magnitude > 256]).max() < 0.06
+
+
+@pytest.mark.parametrize("codec", [MU_LAW, A_LAW])
+def test_decoded_values_survive_another_round_trip(codec):
+    decoded = codec.decode(ALL_CODES)
+    np.testing.assert_array_equal(codec.decode(codec.encode(decoded).tobytes()), decoded)
+
+
+@pytest.mark.parametrize("codec", [MU_LAW, A_LAW])
+def test_speech_level_signal_to_noise(codec):
+    t = np.arange(codec.sample_rate) / codec.sample_rate
+    signal = (10000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+    decoded = codec.decode(codec.encode(signal).tobytes()).astype(np.float64)
+    noise = decoded - signal
+    snr_db = 10 * np.log10(np.sum(signal.astype(np.float64) ** 2) / np.sum(noise ** 2))
+    assert snr_db > 35
+
+
+def test_transport_codecs_cover_every_audio_format():
+    assert set(TRANSPORT_CODECS) == {"pcm16", "g711-ulaw", "g711-alaw"}
+    samples = np.array([0, 1, -1, 32767, -32768], dtype=np.int16)
+    np.testing.assert_array_equal(PCM16.decode(bytes(PCM16.encode(samples))), samples)
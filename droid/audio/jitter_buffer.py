@@ -0,0 +1,177 @@
+"""Adaptive playout buffer for assistant audio arriving in response.audio.delta bursts."""
+
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from ..metrics import LatencyHistogram
+from .ring_buffer import RingBuffer
+
+
+class JitterBuffer:
+    """
+    Hold back the start of each response until enough audio is buffered to ride out network
+    jitter, then play it out continuously.
+
+    The producer (receive_messages) calls write() for every delta, end_of_stream() on
+    response.audio.done and clear() on barge-in. The consumer (the playback callback) calls
+    read_into() once per period.
+
+    Each delta's relative delay is its arrival time minus the media time it carries, measured
+    against the earliest delta of the response, so a server that sends faster than real time
+    shows zero delay and only lateness counts. The target delay tracks a smoothed mean plus four
+    times the smoothed deviation of that delay, between min_delay_ms and max_delay_ms, and
+    playback of a response starts once the target is buffered or the response has ended.
+
+    An underrun is the buffer running dry mid-response; playback then waits for the target
+    again. A late frame is a delta whose relative delay exceeded the target in use, i.e. one
+    the buffer was too short to hide.
+
+    Deltas written with an item_id are also tracked by position in the ring, so that
+    playback_position() can tell how much of an item has actually gone to the speaker.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        capacity_seconds: float,
+        target_delay_ms: int = 120,
+        min_delay_ms: int = 40,
+        max_delay_ms: int = 500,
+    ):
+        self.sample_rate = sample_rate
+        self.ring = RingBuffer(int(sample_rate * capacity_seconds))
+        self.min_delay = min_delay_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self.target_delay = target_delay_ms / 1000
+        self._target_samples = int(self.target_delay * sample_rate)
+
+        # Producer state: delay estimate and the current response's timing reference
+        self._mean_delay = 0.0
+        self._delay_deviation = 0.0
+        self._response_offset = None
+        self._response_media_time = 0.0
+        self._ended = False
+        self._flushes = 0
+        # (item_id, content_index, ring position of the item's first sample) for recent items
+        self._items = deque(maxlen=16)
+
+        # Consumer state
+        self._playing = False
+        self._flushes_seen = 0
+        self._first_write_time = None
+
+        self.underruns = 0
+        self.late_frames = 0
+        self.frames = 0
+        self.depth = LatencyHistogram("playout depth")
+        self.start_delay = LatencyHistogram("start delay")
+
+    @property
+    def fill(self) -> int:
+        return self.ring.fill
+
+    @property
+    def jitter(self) -> float:
+        """Smoothed deviation of the delta delay, in seconds."""
+        return self._delay_deviation
+
+    def write(
+        self,
+        samples: np.ndarray,
+        arrival_time: Optional[float] = None,
+        item_id: Optional[str] = None,
+        content_index: int = 0,
+    ) -> int:
+        """Queue a decoded delta. arrival_time defaults to now (time.perf_counter())."""
+        if arrival_time is None:
+            arrival_time = time.perf_counter()
+        if self._ended or self._response_offset is None:
+            self._start_response(arrival_time)
+        if item_id is not None and (not self._items or self._items[-1][:2] != (item_id, content_index)):
+            self._items.append((item_id, content_index, self.ring.write_position))
+
+        # Relative delay against the earliest delta of this response
+        offset = arrival_time - self._response_media_time
+        if offset < self._response_offset:
+            self._response_offset = offset
+        delay = offset - self._response_offset
+        self._response_media_time += len(samples) / self.sample_rate
+        self.frames += 1
+        if delay > self.target_delay:
+            self.late_frames += 1
+
+        self._mean_delay += 0.125 * (delay - self._mean_delay)
+        self._delay_deviation += 0.125 * (abs(delay - self._mean_delay) - self._delay_deviation)
+        self.target_delay = min(max(self._mean_delay + 4 * self._delay_deviation, self.min_delay), self.max_delay)
+        self._target_samples = int(self.target_delay * self.sample_rate)
+        return self.ring.write(samples)
+
+    def _start_response(self, arrival_time: float):
+        self._ended = False
+        self._response_offset = arrival_time
+        self._response_media_time = 0.0
+        self._first_write_time = arrival_time
+
+    def end_of_stream(self):
+        """No more audio is coming for this response, so whatever is buffered may play out."""
+        self._ended = True
+
+    def playback_position(self) -> Optional[tuple[str, int, int]]:
+        """
+        The item being played, or the next one due, as (item_id, content_index, samples of it
+        handed to the speaker). None once every tracked item has been played out.
+        """
+        played = self.ring.read_position
+        items = list(self._items)
+        for index, (item_id, content_index, start) in enumerate(items):
+            end = items[index + 1][2] if index + 1 < len(items) else self.ring.write_position
+            if played < end:
+                return item_id, content_index, max(0, played - start)
+        return None
+
+    def clear(self):
+        """Drop all buffered audio and wait for the next response. O(1), producer side."""
+        self.ring.clear()
+        self._items.clear()
+        self._response_offset = None
+        self._first_write_time = None
+        self._flushes += 1
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Copy the next period into out. Returns 0 while buffering, short counts at the end."""
+        if self._flushes_seen != self._flushes:
+            self._flushes_seen = self._flushes
+            self._playing = False
+        fill = self.ring.fill
+        if not self._playing:
+            if fill == 0 or (fill < self._target_samples and not self._ended):
+                return 0
+            self._playing = True
+            if self._first_write_time is not None:
+                self.start_delay.record(time.perf_counter() - self._first_write_time)
+                self._first_write_time = None
+
+        self.depth.record(fill / self.sample_rate)
+        count = self.ring.read_into(out) if fill else 0
+        if count < len(out):
+            self._playing = False
+            if not self._ended:
+                self.underruns += 1
+        return count
+
+    def reset_statistics(self):
+        self.underruns = 0
+        self.late_frames = 0
+        self.frames = 0
+        self.depth.reset()
+        self.start_delay.reset()
+
+    def describe(self) -> str:
+        return (
+            f"target: {self.target_delay * 1000:.0f} ms, jitter: {self.jitter * 1000:.1f} ms, "
+            f"underruns: {self.underruns}, late frames: {self.late_frames}/{self.frames}, "
+            f"{self.depth.describe()}, {self.start_delay.describe()}"
+        )
@@ -0,0 +1,107 @@
+import numpy as np
+
+from droid.audio.jitter_buffer import JitterBuffer
+
+SAMPLE_RATE = 24000
+DELTA = 480  # 20 ms
+PERIOD = 960
+
+
+def delta(value: int = 1000) -> np.ndarray:
+    return np.full(DELTA, value, dtype=np.int16)
+
+
+def write_at(buffer: JitterBuffer, arrival_times, **kwargs):
+    for arrival_time in arrival_times:
+        buffer.write(delta(), arrival_time=arrival_time, **kwargs)
+
+
+def test_steady_arrivals_shrink_the_target_to_the_minimum():
+    buffer = JitterBuffer(SAMPLE_RATE, 5)
+    assert buffer.target_delay == 0.12
+    write_at(buffer, [100 + i * 0.02 for i in range(100)])
+    assert buffer.target_delay == buffer.min_delay
+    assert buffer.late_frames == 0
+
+
+def test_bursts_faster_than_real_time_count_as_no_delay():
+    buffer = JitterBuffer(SAMPLE_RATE, 5)
+    write_at(buffer, [100.0] * 100)
+    assert buffer.target_delay == buffer.min_delay
+    assert buffer.jitter == 0
+
+
+def test_jittery_arrivals_grow_the_target_up_to_the_maximum():
+    buffer = JitterBuffer(SAMPLE_RATE, 5)
+    # Every other delta is 100 ms late
+    write_at(buffer, [100 + i * 0.02 + (0.1 if i % 2 else 0) for i in range(100)])
+    assert 0.2 < buffer.target_delay < buffer.max_delay
+    assert buffer.late_frames > 0
+
+    buffer = JitterBuffer(SAMPLE_RATE, 30)
+    write_at(buffer, [100 + i * 0.02 + (1.0 if i % 2 else 0) for i in range(100)])
+    assert buffer.target_delay == buffer.max_delay
+
+
+def test_playout_waits_for_the_target_and_refills_after_an_underrun():
+    buffer = JitterBuffer(SAMPLE_RATE, 5, target_delay_ms=40, min_delay_ms=40)
+    out = np.zeros(PERIOD, dtype=np.int16)
+    buffer.write(delta(), arrival_time=100.0)
+    assert buffer.read_into(out) == 0
+    buffer.write(delta(), arrival_time=100.02)
+    # 40 ms are buffered, playback starts
+    assert buffer.read_into(out) == PERIOD
+    buffer.write(delta(), arrival_time=100.04)
+    assert buffer.read_into(out) == DELTA
+    assert buffer.underruns == 1
+
+    # Mid-response the buffer waits for the target again before playing
+    buffer.write(delta(), arrival_time=100.06)
+    assert buffer.read_into(out) == 0
+    buffer.write(delta(), arrival_time=100.08)
+    assert buffer.read_into(out) == PERIOD
+    assert buffer.underruns == 1
+
+
+def test_end_of_stream_plays_out_what_is_left_without_an_underrun():
+    buffer = JitterBuffer(SAMPLE_RATE, 5)
+    out = np.zeros(PERIOD, dtype=np.int16)
+    buffer.write(delta(), arrival_time=100.0)
+    assert buffer.read_into(out) == 0
+    buffer.end_of_stream()
+    assert buffer.read_into(out) == DELTA
+    assert buffer.read_into(out) == 0
+    assert buffer.underruns == 0
+
+
+def test_playback_position_follows_what_was_read():
+    buffer = JitterBuffer(SAMPLE_RATE, 5, target_delay_ms=40, min_delay_ms=40)
+    out = np.zeros(600, dtype=np.int16)
+    assert buffer.playback_position() is None
+    write_at(buffer, [100.0, 100.02], item_id="item_a")
+    write_at(buffer, [100.04], item_id="item_b")
+    assert buffer.playback_position() == ("item_a", 0, 0)
+    buffer.read_into(out)
+    assert buffer.playback_position() == ("item_a", 0, 600)
+    buffer.read_into(out)
+    assert buffer.playback_position() == ("item_b", 0, 1200 - 2 * DELTA)
+    buffer.end_of_stream()
+    buffer.read_into(out)
+    assert buffer.playback_position() is None
+
+
+def test_clear_drops_the_audio_and_the_items():
+    buffer = JitterBuffer(SAMPLE_RATE, 5, target_delay_ms=40, min_delay_ms=40)
+    out = np.zeros(PERIOD, dtype=np.int16)
+    write_at(buffer, [100.0, 100.02, 100.04], item_id="item_a")
+    assert buffer.read_into(out) == PERIOD
+    buffer.clear()
+    assert buffer.fill == 0
+    assert buffer.playback_position() is None
+    assert buffer.read_into(out) == 0
+    # The next response buffers up to its own target before playing
+    write_at(buffer, [200.0], item_id="item_b")
+    assert buffer.read_into(out) == 0
+    write_at(buffer, [200.02], item_id="item_b")
+    assert buffer.read_into(out) == PERIOD
+    assert buffer.underruns == 0
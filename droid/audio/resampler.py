@@ -0,0 +1,91 @@
+"""Streaming polyphase resampler for 16-bit mono PCM."""
+
+from functools import lru_cache
+from math import ceil, gcd
+
+import numpy as np
+from scipy.signal import upfirdn
+
+ZERO_CROSSINGS = 10  # Half-width of the windowed sinc, in zero crossings of the lower rate
+KAISER_BETA = 5.0  # Same window shape scipy.signal.resample_poly uses by default
+
+
+@lru_cache(maxsize=None)
+def design_polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    Design a low-pass FIR for rational resampling by up/down and split it into polyphase
+    branches. Returns an array of shape (up, taps_per_phase) where row p holds the taps
+    used for output samples that fall on phase p of the upsampled grid.
+
+    The result is cached, so the taps are computed once per rate pair.
+    """
+    max_rate = max(up, down)
+    taps_per_phase = ceil(2 * ZERO_CROSSINGS * max_rate / up)
+    num_taps = taps_per_phase * up
+    cutoff = 0.5 / max_rate  # Nyquist of the lower of the two rates, in cycles per upsampled sample
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, KAISER_BETA)
+    h *= up / h.sum()  # Zero stuffing divides the level by up, so restore it here
+    # taps[p, k] = h[p + k * up]
+    taps = h.reshape(taps_per_phase, up).T.astype(np.float32)
+    taps.setflags(write=False)
+    return taps
+
+
+class StreamResampler:
+    """
+    Resample a stream of int16 chunks from one rate to another.
+
+    The filter history and output phase carry over between calls to process(), so
+    consecutive chunks join without the edge clicks of resampling every chunk on its own.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int):
+        divisor = gcd(from_rate, to_rate)
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+        taps = design_polyphase_filter(self.up, self.down)
+        self._taps_per_phase = taps.shape[1]
+        # The prototype filter back in one piece, h[p + k * up] = taps[p, k], for upfirdn, which
+        # runs the polyphase loop in C
+        self._filter = np.ascontiguousarray(taps.T).reshape(-1)
+        self._up_inverse = pow(self.up, -1, self.down)
+        self.reset()
+
+    def reset(self):
+        """Forget the stream history, e.g. when a new utterance starts."""
+        if self.passthrough:
+            return
+        self._history = np.zeros(self._taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output sample on the upsampled grid, relative to the start of
+        # the history buffer.
+        self._position = (self._taps_per_phase - 1) * self.up
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Resample the next chunk of the stream and return the int16 output produced so far."""
+        if self.passthrough:
+            return samples
+        if len(samples) == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        buffer = np.concatenate((self._history, samples.astype(np.float32)))
+        end = len(buffer) * self.up
+        count = max(0, ceil((end - self._position) / self.down))
+        # upfirdn evaluates every down-th sample of the upsampled grid counting from zero, so
+        # shift the grid with leading zeros until the next output position falls on it
+        padding = -self._position * self._up_inverse % self.down
+        padded = np.concatenate((np.zeros(padding, dtype=np.float32), buffer)) if padding else buffer
+        first = (self._position + padding * self.up) // self.down
+        output = upfirdn(self._filter, padded, self.up, self.down)[first:first + count]
+
+        consumed = len(buffer) - len(self._history)
+        self._history = buffer[consumed:]
+        self._position += self.down * count - consumed * self.up
+
+        np.clip(np.rint(output, out=output), -32768, 32767, out=output)
+        return output.astype(np.int16)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from droid.audio.resampler import StreamResampler
+
+RATE_PAIRS = [(24000, 48000), (48000, 24000), (11025, 24000), (24000, 11025), (44100, 24000)]
+
+
+def tone(rate: int, seconds: float = 1.0, frequency: float = 440.0) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (8000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def in_chunks(resampler: StreamResampler, samples: np.ndarray, sizes: list[int]) -> np.ndarray:
+    output = []
+    offset = 0
+    index = 0
+    while offset < len(samples):
+        size = sizes[index % len(sizes)]
+        output.append(resampler.process(samples[offset:offset + size]))
+        offset += size
+        index += 1
+    return np.concatenate(output)
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATE_PAIRS)
+def test_chunked_output_equals_one_shot(from_rate, to_rate):
+    samples = tone(from_rate, seconds=0.1)
+    one_shot = StreamResampler(from_rate, to_rate).process(samples)
+    for sizes in ([2048], [1], [7, 480, 1, 4096, 333]):
+        chunked = in_chunks(StreamResampler(from_rate, to_rate), samples, sizes)
+        np.testing.assert_array_equal(chunked, one_shot)
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATE_PAIRS)
+def test_output_rate_and_content_follow_the_ratio(from_rate, to_rate):
+    samples = tone(from_rate)
+    output = in_chunks(StreamResampler(from_rate, to_rate), samples, [2048])
+    assert abs(len(output) - len(samples) * to_rate / from_rate) <= 1
+    # Same tone as the one-shot reference, once the filter delay is taken out
+    reference = resample_poly(samples.astype(np.float64), to_rate, from_rate)
+    delay = min(range(64), key=lambda shift: np.abs(output[200 + shift:-200] - reference[200:-200 - shift]).max())
+    assert np.abs(output[200 + delay:-200] - reference[200:-200 - delay]).max() < 400
+
+
+def test_state_carries_across_calls_and_reset_forgets_it():
+    samples = tone(24000, seconds=0.1)
+    resampler = StreamResampler(24000, 48000)
+    first = resampler.process(samples)
+    # The second chunk continues the first, so it differs from the same chunk processed fresh
+    second = resampler.process(samples)
+    assert not np.array_equal(second, first)
+    resampler.reset()
+    np.testing.assert_array_equal(resampler.process(samples), first)
+
+
+def test_same_rate_passes_samples_through():
+    samples = tone(24000, seconds=0.1)
+    resampler = StreamResampler(24000, 24000)
+    assert resampler.passthrough
+    assert resampler.process(samples) is samples
+
+
+def test_empty_chunk_keeps_the_stream_going():
+    samples = tone(48000, seconds=0.1)
+    resampler = StreamResampler(48000, 24000)
+    one_shot = StreamResampler(48000, 24000).process(samples)
+    output = [resampler.process(samples[:1000]), resampler.process(samples[:0]), resampler.process(samples[1000:])]
+    assert len(output[1]) == 0
+    np.testing.assert_array_equal(np.concatenate(output), one_shot)
@@ -0,0 +1,138 @@
+"""Fixed-capacity sample ring buffer for passing audio between one producer and one consumer."""
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Single-producer/single-consumer ring buffer of int16 samples.
+
+    The producer only calls write() and clear(); the consumer only calls wait(), peek(),
+    consume(), skip() and read_into(). Each side owns one position counter, so no lock is needed.
+    Memory is allocated once up front, which bounds how much audio can pile up when the other
+    side stalls.
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        # Scratch space for reads that wrap around the end of the buffer
+        self._scratch = np.zeros(capacity, dtype=dtype)
+        self._write_pos = 0
+        self._read_pos = 0
+        self._flush_pos = 0
+        self._data_ready = threading.Event()
+
+        self.overruns = 0
+        self.dropped_samples = 0
+        self.underruns = 0
+
+    @property
+    def fill(self) -> int:
+        """Number of samples waiting to be read."""
+        return self._write_pos - max(self._read_pos, self._flush_pos)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.fill
+
+    @property
+    def write_position(self) -> int:
+        """Total samples written so far, including cleared ones. Samples dropped by write() never count."""
+        return self._write_pos
+
+    @property
+    def read_position(self) -> int:
+        """Total samples handed to the consumer so far. Cleared samples count once read past."""
+        return self._read_pos
+
+    def write(self, samples) -> int:
+        """
+        Append samples (an int16 array or raw PCM bytes). When the buffer is full, the newest
+        samples, the ones that do not fit, are dropped and counted in dropped_samples and
+        overruns; what is already buffered is kept. Returns the number of samples written.
+        """
+        if not isinstance(samples, np.ndarray):
+            samples = np.frombuffer(samples, dtype=self._buffer.dtype)
+        count = len(samples)
+        free = self.free
+        if count > free:
+            self.overruns += 1
+            self.dropped_samples += count - free
+            count = free
+        if count == 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        if first < count:
+            self._buffer[:count - first] = samples[first:count]
+        self._write_pos += count
+        self._data_ready.set()
+        return count
+
+    def clear(self):
+        """Drop everything written so far. Safe to call from the producer side."""
+        self._flush_pos = self._write_pos
+
+    def wait(self, min_count: int = 1, timeout: Optional[float] = None) -> bool:
+        """Block until at least min_count samples are readable. Returns False on timeout."""
+        while self.fill < min_count:
+            self._data_ready.clear()
+            if self.fill >= min_count:
+                break
+            if not self._data_ready.wait(timeout):
+                return False
+        return True
+
+    def peek(self, max_count: int) -> memoryview:
+        """
+        Return a view of up to max_count of the oldest samples without consuming them. Asking
+        for more than is buffered counts as an underrun. The view is valid until consume().
+        """
+        self._read_pos = max(self._read_pos, self._flush_pos)
+        fill = self._write_pos - self._read_pos
+        if max_count > fill:
+            self.underruns += 1
+            max_count = fill
+
+        start = self._read_pos % self.capacity
+        first = min(max_count, self.capacity - start)
+        if first == max_count:
+            return memoryview(self._buffer[start:start + max_count])
+        self._scratch[:first] = self._buffer[start:]
+        self._scratch[first:max_count] = self._buffer[:max_count - first]
+        return memoryview(self._scratch[:max_count])
+
+    def read_into(self, out: np.ndarray) -> int:
+        """
+        Copy up to len(out) of the oldest samples into a preallocated array and consume them,
+        without creating a view. Returns the number copied; a short read counts as an underrun.
+        """
+        self._read_pos = max(self._read_pos, self._flush_pos)
+        count = min(len(out), self._write_pos - self._read_pos)
+        if count < len(out):
+            self.underruns += 1
+
+        start = self._read_pos % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        if first < count:
+            out[first:count] = self._buffer[:count - first]
+        self.consume(count)
+        return count
+
+    def skip(self, count: int) -> int:
+        """Consume up to count of the oldest samples without reading them. Returns the number skipped."""
+        self._read_pos = max(self._read_pos, self._flush_pos)
+        count = min(count, self._write_pos - self._read_pos)
+        self._read_pos += count
+        return count
+
+    def consume(self, count: int):
+        """Release count samples returned by peek() back to the producer."""
+        self._read_pos = max(self._read_pos + count, self._flush_pos)
@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+
+from droid.audio.ring_buffer import RingBuffer
+
+
+def samples(start: int, count: int) -> np.ndarray:
+    return np.arange(start, start + count, dtype=np.int16)
+
+
+def test_reads_wrap_around_the_end_of_the_buffer():
+    ring = RingBuffer(8)
+    for start in range(0, 40, 5):
+        assert ring.write(samples(start, 5)) == 5
+        out = np.zeros(5, dtype=np.int16)
+        assert ring.read_into(out) == 5
+        np.testing.assert_array_equal(out, samples(start, 5))
+    assert ring.write_position == ring.read_position == 40
+    assert ring.fill == 0
+
+
+def test_peek_across_the_end_returns_the_samples_in_order():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 6))
+    ring.consume(len(ring.peek(6)))
+    ring.write(samples(6, 6))
+    view = ring.peek(6)
+    np.testing.assert_array_equal(np.asarray(view), samples(6, 6))
+    ring.consume(len(view))
+    assert ring.fill == 0
+
+
+def test_overflow_drops_the_newest_samples():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 6))
+    assert ring.write(samples(6, 5)) == 2
+    assert (ring.overruns, ring.dropped_samples) == (1, 3)
+    assert ring.write_position == 8
+    assert ring.free == 0
+    out = np.zeros(8, dtype=np.int16)
+    ring.read_into(out)
+    np.testing.assert_array_equal(out, samples(0, 8))
+
+
+def test_raw_pcm_bytes_are_written_as_samples():
+    ring = RingBuffer(8)
+    ring.write(samples(100, 4).tobytes())
+    np.testing.assert_array_equal(np.asarray(ring.peek(4)), samples(100, 4))
+
+
+def test_short_reads_count_as_underruns():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 3))
+    out = np.full(5, -1, dtype=np.int16)
+    assert ring.read_into(out) == 3
+    np.testing.assert_array_equal(out[:3], samples(0, 3))
+    # Only the copied samples are touched
+    np.testing.assert_array_equal(out[3:], [-1, -1])
+    assert len(ring.peek(2)) == 0
+    assert ring.underruns == 2
+
+
+def test_clear_drops_what_is_buffered_but_not_what_comes_after():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 5))
+    view = ring.peek(2)
+    ring.clear()
+    assert ring.fill == 0
+    assert ring.free == 8
+    # Consuming a view taken before the clear does not move past it
+    ring.consume(len(view))
+    ring.write(samples(5, 3))
+    out = np.zeros(3, dtype=np.int16)
+    assert ring.read_into(out) == 3
+    np.testing.assert_array_equal(out, samples(5, 3))
+    assert ring.write_position == 8
+    assert ring.read_position == 8
+
+
+def test_wait_returns_once_the_producer_has_written():
+    ring = RingBuffer(8)
+    assert not ring.wait(1, timeout=0.01)
+    writer = threading.Timer(0.01, lambda: ring.write(samples(0, 4)))
+    writer.start()
+    assert ring.wait(4, timeout=5)
+    writer.join()
+
+
+def test_skip_drops_at_most_what_is_buffered():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 5))
+    assert ring.skip(3) == 3
+    assert ring.skip(4) == 2
+    assert ring.fill == 0
+    ring.write(samples(5, 2))
+    out = np.zeros(2, dtype=np.int16)
+    ring.read_into(out)
+    np.testing.assert_array_equal(out, samples(5, 2))
@@ -0,0 +1,139 @@
+"""Energy and zero-crossing voice activity gate for the microphone stream."""
+
+import numpy as np
+
+
+class VoiceActivityGate:
+    """
+    Hold back silent microphone audio and release it only around speech.
+
+    Audio is split into short frames and each frame is classified from its RMS level, compared
+    against an adaptive noise floor, and its zero-crossing rate, which separates low level hiss
+    from voiced speech. While the gate is closed the most recent preroll_ms of audio is kept,
+    and when speech begins it is sent ahead of the first speech frame so the first syllable is
+    not clipped. After the last speech frame the gate stays open for hangover_ms.
+
+    With enabled=False every frame passes through, but speech onsets are still reported.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_ms: int = 20,
+        preroll_ms: int = 300,
+        hangover_ms: int = 800,
+        min_rms: float = 300.0,
+        noise_ratio: float = 3.0,
+        max_zero_crossing_rate: float = 0.35,
+        onset_frames: int = 2,
+        enabled: bool = True,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.min_rms = min_rms
+        self.noise_ratio = noise_ratio
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.onset_frames = onset_frames
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.enabled = enabled
+
+        self._pending = np.zeros(self.frame_samples, dtype=np.int16)
+        self._pending_count = 0
+        preroll_frames = max(1, preroll_ms // frame_ms)
+        self._preroll = np.zeros((preroll_frames, self.frame_samples), dtype=np.int16)
+        self._preroll_count = 0
+        self._preroll_next = 0
+
+        self.noise_floor = min_rms
+        self.is_open = False
+        self._speech_run = 0
+        self._frames_since_speech = 0
+
+        self.processed_samples = 0
+        self.passed_samples = 0
+        self.speech_segments = 0
+        # Stream positions [start, end) of the samples returned by the last process() call
+        self.emitted_ranges: list[tuple[int, int]] = []
+
+    def _frame_features(self, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        as_float = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(np.square(as_float), axis=1))
+        signs = np.signbit(frames)
+        zero_crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_samples - 1)
+        return rms, zero_crossing_rate
+
+    def _emit(self, start: int, end: int):
+        if self.emitted_ranges and self.emitted_ranges[-1][1] == start:
+            self.emitted_ranges[-1] = (self.emitted_ranges[-1][0], end)
+        else:
+            self.emitted_ranges.append((start, end))
+
+    def _take_preroll(self) -> list[np.ndarray]:
+        count = self._preroll_count
+        order = (self._preroll_next - count + np.arange(count)) % len(self._preroll)
+        self._preroll_count = 0
+        return [self._preroll[order].reshape(-1)] if count else []
+
+    def _keep_preroll(self, frame: np.ndarray):
+        self._preroll[self._preroll_next] = frame
+        self._preroll_next = (self._preroll_next + 1) % len(self._preroll)
+        self._preroll_count = min(self._preroll_count + 1, len(self._preroll))
+
+    def process(self, samples: np.ndarray) -> tuple[np.ndarray, bool]:
+        """
+        Feed the next chunk of int16 samples. Returns the audio that should be streamed (possibly
+        empty) and whether speech started in this chunk. Where that audio sits in the stream of
+        samples fed so far is left in emitted_ranges, one range per contiguous run.
+        """
+        self.emitted_ranges = []
+        if self._pending_count:
+            samples = np.concatenate((self._pending[:self._pending_count], samples))
+        frame_count = len(samples) // self.frame_samples
+        framed = frame_count * self.frame_samples
+        leftover = len(samples) - framed
+        self._pending[:leftover] = samples[framed:]
+        self._pending_count = leftover
+        if frame_count == 0:
+            return np.zeros(0, dtype=np.int16), False
+
+        frames = samples[:framed].reshape(frame_count, self.frame_samples)
+        rms, zero_crossing_rate = self._frame_features(frames)
+        loud = rms > np.maximum(self.min_rms, self.noise_floor * self.noise_ratio)
+        voiced = (zero_crossing_rate < self.max_zero_crossing_rate) | (rms > 2 * self.min_rms)
+        is_speech = loud & voiced
+
+        output = []
+        speech_started = False
+        for index in range(frame_count):
+            frame = frames[index]
+            position = self.processed_samples + index * self.frame_samples
+            if is_speech[index]:
+                self._speech_run += 1
+                self._frames_since_speech = 0
+            else:
+                self._speech_run = 0
+                self._frames_since_speech += 1
+                # Track the background level only from frames that are not speech
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * max(rms[index], 1.0)
+
+            if not self.is_open and self._speech_run >= self.onset_frames:
+                self.is_open = True
+                speech_started = True
+                self.speech_segments += 1
+                if self.enabled and self._preroll_count:
+                    # The preroll holds the frames right before this one, oldest first
+                    self._emit(position - self._preroll_count * self.frame_samples, position)
+                    output.extend(self._take_preroll())
+            elif self.is_open and self._frames_since_speech > self.hangover_frames:
+                self.is_open = False
+
+            if self.is_open or not self.enabled:
+                self._emit(position, position + self.frame_samples)
+                output.append(frame)
+            else:
+                self._keep_preroll(frame)
+
+        self.processed_samples += framed
+        gated = np.concatenate(output) if output else np.zeros(0, dtype=np.int16)
+        self.passed_samples += len(gated)
+        return gated, speech_started
@@ -0,0 +1,49 @@
+import numpy as np
+
+from droid.audio.vad import VoiceActivityGate
+
+SAMPLE_RATE = 24000
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (6000 * np.sin(2 * np.pi * 180 * t)).astype(np.int16)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+def test_emitted_ranges_locate_the_gated_audio():
+    # Two utterances far enough apart for the gate to close in between, all in one chunk
+    audio = np.concatenate((silence(0.5), tone(0.4), silence(2.0), tone(0.4), silence(0.3)))
+    gate = VoiceActivityGate(SAMPLE_RATE)
+    gated, speech_started = gate.process(audio)
+
+    assert speech_started
+    assert gate.speech_segments == 2
+    assert len(gate.emitted_ranges) == 2
+    np.testing.assert_array_equal(np.concatenate([audio[start:end] for start, end in gate.emitted_ranges]), gated)
+    # The gate opens on the second speech frame, with the 300 ms of preroll ahead of it
+    assert gate.emitted_ranges[0][0] == int(0.5 * SAMPLE_RATE) + gate.frame_samples - int(0.3 * SAMPLE_RATE)
+
+
+def test_emitted_ranges_follow_the_stream_across_chunks():
+    audio = np.concatenate((silence(0.5), tone(0.4), silence(2.0), tone(0.4)))
+    gate = VoiceActivityGate(SAMPLE_RATE)
+    streamed = []
+    for offset in range(0, len(audio), 1000):
+        gated, _ = gate.process(audio[offset:offset + 1000])
+        emitted = [audio[start:end] for start, end in gate.emitted_ranges]
+        np.testing.assert_array_equal(np.concatenate(emitted) if emitted else gated, gated)
+        streamed.append(gated)
+    assert sum(end - start for start, end in gate.emitted_ranges) <= 1000
+    assert gate.passed_samples == sum(len(chunk) for chunk in streamed)
+
+
+def test_disabled_gate_emits_everything_that_was_framed():
+    gate = VoiceActivityGate(SAMPLE_RATE, enabled=False)
+    gate.process(silence(0.01))
+    assert gate.emitted_ranges == []
+    gated, _ = gate.process(silence(0.05))
+    assert gate.emitted_ranges == [(0, len(gated))]
@@ -0,0 +1,78 @@
+"""
+Read a long spoken response through RTClient with its message queues polling, as before, or
+pumping, and compare the time to read it and the asyncio tasks created on the way.
+
+    python -m droid.benchmarks.demux [--deltas 5000] [--delta-ms 20] [--runs 3]
+
+The mock realtime server answers one input_audio_buffer.append with a response of --deltas
+response.audio.delta events, sent as fast as it can. Polling queues start a task whenever a
+receiver waits and nobody is reading, and drop it once nobody waits; with the nested queues of
+RTClient and RTResponse that happens around every delta. Pumping queues read with one task per
+queue for the whole session.
+"""
+
+import argparse
+import asyncio
+import time
+
+from azure.core.credentials import AzureKeyCredential
+
+from droid.rtclient import RTClient, RTResponse
+from droid.rtclient.mock_server import MockRealtimeServer, Step, audio_response
+
+
+def count_tasks(loop: asyncio.AbstractEventLoop) -> list[int]:
+    created = [0]
+
+    def task_factory(loop, coro, **kwargs):
+        created[0] += 1
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    loop.set_task_factory(task_factory)
+    return created
+
+
+async def read_response(url: str, pump: bool, created: list[int]) -> tuple[float, int, int]:
+    async with RTClient(url, key_credential=AzureKeyCredential("demux"), azure_deployment="demux", pump=pump) as client:
+        tasks_before = created[0]
+        start = time.perf_counter()
+        await client.send_audio(bytes(960))
+        chunks = 0
+        async for item in client.items():
+            if not isinstance(item, RTResponse):
+                await item
+                continue
+            async for output in item:
+                async for chunk in output:
+                    chunks += chunk.type == "audio"
+            break
+        return time.perf_counter() - start, chunks, created[0] - tasks_before
+
+
+async def run(deltas: int, delta_ms: int, runs: int):
+    created = count_tasks(asyncio.get_running_loop())
+    events = audio_response(1, "A long answer read out loud.", audio_ms=deltas * delta_ms, delta_ms=delta_ms)
+    server = MockRealtimeServer([Step(events, after="input_audio_buffer.append")])
+    url = await server.start()
+    print(f"{deltas} deltas of {delta_ms} ms, {len(events)} events")
+    for pump in (False, True):
+        for _ in range(runs):
+            elapsed, chunks, tasks = await read_response(url, pump, created)
+            print(
+                f"{'pump' if pump else 'poll'}: {chunks} audio chunks in {elapsed * 1000:.0f} ms, "
+                f"{len(events) / elapsed:,.0f} events/s, tasks created: {tasks}"
+            )
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deltas", type=int, default=5000, help="response.audio.delta events in the response")
+    parser.add_argument("--delta-ms", type=int, default=20, help="audio carried by each delta")
+    parser.add_argument("--runs", type=int, default=3, help="responses read with each kind of queue")
+    args = parser.parse_args()
+    asyncio.run(run(args.deltas, args.delta_ms, args.runs))
+
+
+if __name__ == "__main__":
+    main()
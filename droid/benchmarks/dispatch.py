@@ -0,0 +1,81 @@
+"""
+Measure how many server events per second receive_messages can dispatch, per event type, with
+the configured log sampling and with every event logged.
+
+    python -m droid.benchmarks.dispatch [--events 20000]
+
+Messages are parsed once up front, so this measures dispatch, logging and handler cost only.
+The audio delta handler hands its payload to a decoder that drops it, so no decoding is
+included either.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import tempfile
+import time
+
+from droid import voice_chat
+from droid.benchmarks.pipeline import make_event
+from droid.config import SERVER_EVENT_LOG_SAMPLING
+from droid.logger import EventLogSampler, Logger
+from droid.rtclient import create_message_from_dict
+
+
+class NullDecoder:
+    def submit(self, delta, item_id=None, content_index=0):
+        pass
+
+    def end_of_stream(self):
+        pass
+
+
+def make_messages() -> dict[str, object]:
+    audio = base64.b64encode(bytes(4800)).decode("utf-8")
+    events = {
+        "response.audio.delta": make_event("response.audio.delta", 0, delta=audio),
+        "response.audio_transcript.delta": make_event("response.audio_transcript.delta", 1, delta=" hello"),
+        "response.function_call_arguments.delta": make_event(
+            "response.function_call_arguments.delta", 2, call_id="call_1", delta='{"na'
+        ),
+        "input_audio_buffer.committed": (
+            '{"type": "input_audio_buffer.committed", "event_id": "event_3", "previous_item_id": null, "item_id": "item_1"}'
+        ),
+    }
+    return {event_type: create_message_from_dict(json.loads(text)) for event_type, text in events.items()}
+
+
+async def events_per_second(context, message, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await voice_chat.dispatch_server_event(context, message)
+    return count / (time.perf_counter() - start)
+
+
+async def run(count: int):
+    voice_chat.logger = Logger(base_dir=tempfile.mkdtemp(prefix="droid-benchmark-"))
+    context = voice_chat.ServerEventContext(client=None, delta_decoder=NullDecoder())
+    messages = make_messages()
+    samplers = {
+        "sampled": EventLogSampler(SERVER_EVENT_LOG_SAMPLING),
+        "every event logged": EventLogSampler({}),
+    }
+    print(f"{'event type':42} " + " ".join(f"{name:>20}" for name in samplers))
+    for event_type, message in messages.items():
+        rates = []
+        for sampler in samplers.values():
+            voice_chat.event_log_sampler = sampler
+            rates.append(await events_per_second(context, message, count))
+        print(f"{event_type:42} " + " ".join(f"{rate:>14,.0f} ev/s" for rate in rates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000, help="events dispatched per type and mode")
+    args = parser.parse_args()
+    asyncio.run(run(args.events))
+
+
+if __name__ == "__main__":
+    main()
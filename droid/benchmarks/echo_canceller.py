@@ -0,0 +1,70 @@
+"""
+Measure CPU cost of the echo canceller per 10 ms frame, and optionally its echo reduction on a
+recorded playback/microphone pair. Run it on the droid itself to get ARM numbers.
+
+    python -m droid.benchmarks.echo_canceller [--seconds 20]
+    python -m droid.benchmarks.echo_canceller --playback playback.wav --mic mic.wav
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import lfilter
+
+from droid.audio import EchoCanceller
+from droid.config import API_SAMPLE_RATE, INPUT_CHUNK_SIZE, INPUT_SAMPLE_RATE
+
+TAIL_LENGTHS_MS = (100, 200, 300)
+
+
+def cpu_per_frame(sample_rate: int, tail_ms: int, seconds: float) -> float:
+    rng = np.random.default_rng(0)
+    far = (lfilter([1], [1, -0.9], rng.standard_normal(int(sample_rate * seconds))) * 2000).astype(np.int16)
+    near = (far * 0.1 + rng.standard_normal(len(far)) * 50).astype(np.int16)
+    canceller = EchoCanceller(sample_rate, tail_ms=tail_ms)
+    start = time.process_time()
+    for i in range(0, len(near), INPUT_CHUNK_SIZE):
+        canceller.process(near[i:i + INPUT_CHUNK_SIZE], far[i:i + INPUT_CHUNK_SIZE])
+    return (time.process_time() - start) * 1000 / canceller.blocks
+
+
+def erle_over_time(playback_path: str, mic_path: str, tail_ms: int):
+    rate, playback = wavfile.read(playback_path)
+    mic_rate, mic = wavfile.read(mic_path)
+    if rate != mic_rate:
+        raise ValueError("playback and microphone recordings must have the same sample rate")
+    length = min(len(playback), len(mic))
+    canceller = EchoCanceller(rate, tail_ms=tail_ms)
+    for second in range(length // rate):
+        window = slice(second * rate, (second + 1) * rate)
+        canceller.reset_statistics()
+        for i in range(window.start, window.stop, INPUT_CHUNK_SIZE):
+            end = min(i + INPUT_CHUNK_SIZE, window.stop)
+            canceller.process(mic[i:end], playback[i:end])
+        print(f"  {second:>4} s  ERLE {canceller.erle_db:5.1f} dB")
+    print(f"  double-talk blocks: {canceller.double_talk_blocks} of {canceller.blocks}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of synthetic audio for the CPU test")
+    parser.add_argument("--playback", help="WAV of what was sent to the speaker")
+    parser.add_argument("--mic", help="WAV recorded by the microphone at the same time")
+    parser.add_argument("--tail", type=int, default=200, help="echo tail in ms for the recorded pair")
+    args = parser.parse_args()
+
+    if args.playback and args.mic:
+        erle_over_time(args.playback, args.mic, args.tail)
+        return
+
+    print(f"{'rate':>6} {'tail ms':>8} {'cpu ms / 10 ms frame':>21} {'load':>7}")
+    for sample_rate in (API_SAMPLE_RATE, INPUT_SAMPLE_RATE):
+        for tail_ms in TAIL_LENGTHS_MS:
+            cost = cpu_per_frame(sample_rate, tail_ms, args.seconds)
+            print(f"{sample_rate:>6} {tail_ms:>8} {cost:>21.3f} {cost / 10 * 100:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
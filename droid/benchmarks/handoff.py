@@ -0,0 +1,90 @@
+"""
+Compare capture-thread to event-loop handoff latency for the old run_in_executor hop and the
+call_soon_threadsafe bridge.
+
+    python -m droid.benchmarks.handoff [--frames 500] [--interval-ms 10]
+
+A producer thread writes a frame into a RingBuffer at a fixed interval. The consumer coroutine
+drains it, and latency is measured from the write to the moment the coroutine holds the frame.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from droid.audio import RingBuffer, ThreadToLoopBridge
+from droid.metrics import LatencyHistogram
+
+FRAME_SAMPLES = 480
+
+
+def produce(buffer: RingBuffer, write_times: list, frames: int, interval: float, notify=None):
+    frame = np.zeros(FRAME_SAMPLES, dtype=np.int16)
+    for _ in range(frames):
+        time.sleep(interval)
+        write_times.append(time.perf_counter())
+        buffer.write(frame)
+        if notify:
+            notify()
+
+
+async def consume_with_executor(frames: int, interval: float) -> LatencyHistogram:
+    buffer = RingBuffer(FRAME_SAMPLES * 100)
+    write_times = []
+    histogram = LatencyHistogram("executor hop")
+    producer = threading.Thread(target=produce, args=(buffer, write_times, frames, interval), daemon=True)
+    producer.start()
+    loop = asyncio.get_running_loop()
+    received = 0
+    while received < frames:
+        await loop.run_in_executor(None, buffer.wait, FRAME_SAMPLES)
+        while buffer.fill >= FRAME_SAMPLES:
+            buffer.consume(len(buffer.peek(FRAME_SAMPLES)))
+            histogram.record(time.perf_counter() - write_times[received])
+            received += 1
+    producer.join()
+    return histogram
+
+
+async def consume_with_bridge(frames: int, interval: float) -> tuple[LatencyHistogram, ThreadToLoopBridge]:
+    buffer = RingBuffer(FRAME_SAMPLES * 100)
+    write_times = []
+    histogram = LatencyHistogram("bridge")
+    bridge = ThreadToLoopBridge(asyncio.get_running_loop())
+    producer = threading.Thread(
+        target=produce, args=(buffer, write_times, frames, interval, bridge.notify), daemon=True
+    )
+    producer.start()
+    received = 0
+    while received < frames:
+        await bridge.wait()
+        while buffer.fill >= FRAME_SAMPLES:
+            buffer.consume(len(buffer.peek(FRAME_SAMPLES)))
+            histogram.record(time.perf_counter() - write_times[received])
+            received += 1
+        bridge.drained()
+    producer.join()
+    return histogram, bridge
+
+
+async def run(frames: int, interval: float):
+    executor_histogram = await consume_with_executor(frames, interval)
+    bridge_histogram, bridge = await consume_with_bridge(frames, interval)
+    print(executor_histogram.describe())
+    print(bridge_histogram.describe())
+    print(f"bridge internals: {bridge.describe()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.frames, args.interval_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
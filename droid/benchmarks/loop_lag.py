@@ -0,0 +1,86 @@
+"""
+Measure event loop lag while a long answer streams in, with response.audio.delta decoded inline
+on the loop or on the DeltaDecoder worker thread.
+
+    python -m droid.benchmarks.loop_lag [--seconds 60] [--delta-ms 100] [--burst 5] [--device-rate 48000]
+
+The server sends an answer faster than real time, in bursts of deltas. Each delta is parsed with
+create_message_from_dict and handled by receive_messages, as in the droid, while a probe task
+sleeps for 5 ms at a time and records how late it wakes up. That lateness is what the send
+path and the capture bridge wait through while the loop is busy with playback audio.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from droid import voice_chat
+from droid.audio import DeltaDecoder, JitterBuffer, StreamResampler
+from droid.benchmarks.pipeline import FakeRealtimeClient, make_audio_deltas, make_event
+from droid.config import API_SAMPLE_RATE
+from droid.logger import Logger
+from droid.metrics import LatencyHistogram
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe_loop(histogram: LatencyHistogram, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        histogram.record(max(0.0, time.perf_counter() - start - PROBE_INTERVAL))
+
+
+async def stream_answer(threaded: bool, deltas: list[str], delta_ms: int, burst: float, device_rate: int, seconds: float):
+    client = FakeRealtimeClient()
+    output = JitterBuffer(device_rate, seconds + 1)
+    delta_decoder = DeltaDecoder(output, voice_chat.transport_codec, StreamResampler(API_SAMPLE_RATE, device_rate), threaded=threaded)
+    delta_decoder.start()
+    loop_lag = LatencyHistogram("loop lag")
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe_loop(loop_lag, stop))
+    receive_task = asyncio.create_task(voice_chat.receive_messages(client, delta_decoder))
+
+    start = time.perf_counter()
+    for index, delta in enumerate(deltas):
+        await asyncio.sleep(max(0.0, start + index * delta_ms / 1000 / burst - time.perf_counter()))
+        client.inbound.put_nowait(delta)
+    client.inbound.put_nowait(make_event("response.audio.done", len(deltas)))
+    while delta_decoder.decoded_deltas < len(deltas):
+        await asyncio.sleep(PROBE_INTERVAL)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    receive_task.cancel()
+    delta_decoder.stop()
+    print(f"{'worker thread' if threaded else 'inline'}: streamed in {elapsed:.2f} s")
+    print(f"  {loop_lag.describe()}")
+    print(f"  per delta on the loop, {client.handler_time.describe()}")
+    print(f"  {delta_decoder.decode_time.describe()}, {delta_decoder.queue_delay.describe()}")
+
+
+async def run(seconds: float, delta_ms: int, burst: float, device_rate: int):
+    voice_chat.logger = Logger(base_dir=tempfile.mkdtemp(prefix="droid-benchmark-"))
+    deltas = make_audio_deltas(int(seconds * 1000 / delta_ms), delta_ms)
+    print(
+        f"transport: {voice_chat.AUDIO_TRANSPORT_FORMAT}, {len(deltas)} deltas of {delta_ms} ms, "
+        f"{burst}x real time, api rate {API_SAMPLE_RATE} Hz -> device rate {device_rate} Hz"
+    )
+    for threaded in (False, True):
+        await stream_answer(threaded, deltas, delta_ms, burst, device_rate, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the streamed answer")
+    parser.add_argument("--delta-ms", type=int, default=100, help="audio carried by each delta")
+    parser.add_argument("--burst", type=float, default=5.0, help="how much faster than real time the server sends")
+    parser.add_argument("--device-rate", type=int, default=API_SAMPLE_RATE * 2, help="playback device rate, 2x the API rate exercises the resampler")
+    args = parser.parse_args()
+    asyncio.run(run(args.seconds, args.delta_ms, args.burst, args.device_rate))
+
+
+if __name__ == "__main__":
+    main()
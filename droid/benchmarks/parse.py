@@ -0,0 +1,87 @@
+"""
+Measure how many server frames per second each server event decoder handles, and how much each
+parsed frame keeps allocated:
+
+    per-type constructor   json.loads and the model constructor picked by event type, the way
+                           create_message_from_dict used to decode before the TypeAdapter
+    dict adapter           json.loads and create_message_from_dict
+    json adapter           parse_server_message, straight from the websocket text
+
+    python -m droid.benchmarks.parse [--frames 20000] [--session droid/rtclient/testdata/session.jsonl]
+
+Frames are taken from a session file, both in its order (all event types mixed) and as the
+audio deltas alone, which is what dominates while the droid is talking.
+Allocations are the memory blocks and bytes still held per frame while the parsed messages are
+kept alive, i.e. what each message costs the garbage collector and the allocator. The default
+session is the synthetic one in rtclient/testdata (see the README there), not a live capture.
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import get_args
+
+from droid.rtclient import ServerMessageType, create_message_from_dict, parse_server_message
+
+SESSION = Path(__file__).parent.parent / "rtclient" / "testdata" / "session.jsonl"
+MODELS_BY_TYPE = {model.model_fields["type"].default: model for model in get_args(get_args(ServerMessageType)[0])}
+
+
+def construct_by_type(frame: str):
+    data = json.loads(frame)
+    return MODELS_BY_TYPE[data["type"]](**data)
+
+
+DECODERS = {
+    "per-type constructor": construct_by_type,
+    "dict adapter": lambda frame: create_message_from_dict(json.loads(frame)),
+    "json adapter": parse_server_message,
+}
+
+
+def frames_per_second(decode, frames: list[str]) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def allocations_per_frame(decode, frames: list[str]) -> tuple[float, float]:
+    messages = []
+    gc.collect()
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    for frame in frames:
+        messages.append(decode(frame))
+    blocks = sys.getallocatedblocks() - blocks
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return blocks / len(frames), allocated / len(frames)
+
+
+def run(session: Path, count: int):
+    recorded = session.read_text().splitlines()
+    deltas = [frame for frame in recorded if json.loads(frame)["type"] == "response.audio.delta"]
+    for name, frames in (("whole session", recorded), ("response.audio.delta", deltas)):
+        frames = (frames * (count // len(frames) + 1))[:count]
+        print(f"{name}, {len(frames)} frames")
+        for decoder_name, decode in DECODERS.items():
+            rate = frames_per_second(decode, frames)
+            blocks, allocated = allocations_per_frame(decode, frames)
+            print(f"  {decoder_name:20} {rate:>12,.0f} frames/s {blocks:>8.1f} blocks/frame {allocated:>8.0f} bytes/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000, help="frames parsed per corpus and decoder")
+    parser.add_argument("--session", type=Path, default=SESSION, help="server events, one JSON frame per line")
+    args = parser.parse_args()
+    run(args.session, args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Replay audio through the voice_chat capture and playback paths without a sound card or Azure,
+and report per-chunk CPU time, allocations, buffer depths and latency.
+
+    python -m droid.benchmarks.pipeline recording.wav [--device-rate 24000] [--speed 10]
+                                        [--deltas 200] [--jitter-ms 20] [--trace-allocations]
+
+Capture: the WAV is resampled to the device rate and handed to CaptureCallback one
+INPUT_CHUNK_SIZE period at a time by a thread standing in for PortAudio. The CaptureProcessor
+thread runs the echo canceller, resampler and gate, and send_audio runs the transport encoder
+and sends into a fake client that serialises every message like RTLowLevelClient.send, then
+drops it.
+
+Playback: synthetic response.audio.delta frames, a tone encoded with the configured transport
+codec, are parsed with create_message_from_dict and handled by receive_messages, while a thread
+drains PlaybackCallback into a null sink at the device period rate. Deltas are paced at real
+time with a random extra delay of mean --jitter-ms, and the playout buffer reports how it copes.
+
+--speed runs the capture clock faster than real time; --speed 1 reproduces the droid's timing.
+Playback always runs in real time, because the playout buffer adapts to wall-clock jitter.
+--trace-allocations reports the bytes allocated while processing each chunk, at the cost of
+slower, less representative CPU numbers.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.io import wavfile
+
+from droid import voice_chat
+from droid.audio import AppendBatcher, CaptureProcessor, DeltaDecoder, EchoCanceller, JitterBuffer, RingBuffer, StreamResampler, ThreadToLoopBridge, VoiceActivityGate
+from droid.audio.callback_stream import CaptureCallback, PlaybackCallback
+from droid.config import (
+    API_SAMPLE_RATE,
+    AUDIO_APPEND_TARGET_MS,
+    INPUT_BUFFER_SECONDS,
+    INPUT_CHUNK_SIZE,
+    OUTPUT_BUFFER_SECONDS,
+    OUTPUT_CHUNK_SIZE,
+)
+from droid.logger import Logger
+from droid.metrics import LatencyHistogram
+from droid.rtclient import create_message_from_dict
+from droid.rtclient.scheduler import SendScheduler
+
+
+class FakeRealtimeClient:
+    """
+    Stands in for RTLowLevelClient: sends are serialised and dropped, audio appends through the
+    client's send scheduler, and receives come from a queue.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.send_time = LatencyHistogram("client.send")
+        self.handler_time = LatencyHistogram("message handling")
+        self.inbound = asyncio.Queue()
+        self._returned_at = None
+        self.scheduler = SendScheduler(self._write)
+
+    async def send(self, message):
+        start = time.perf_counter()
+        message_json = message.model_dump_json()
+        self.sent_messages += 1
+        self.sent_bytes += len(message_json)
+        self.send_time.record(time.perf_counter() - start)
+
+    async def send_audio_append(self, audio: str):
+        start = time.perf_counter()
+        self.scheduler.send_audio(audio)
+        self.send_time.record(time.perf_counter() - start)
+
+    async def _write(self, message_json: str):
+        self.sent_messages += 1
+        self.sent_bytes += len(message_json)
+
+    def describe_send_queues(self) -> str:
+        return self.scheduler.describe()
+
+    async def recv(self):
+        # The gap between handing out a message and the next recv() is the time receive_messages
+        # spent handling it
+        if self._returned_at is not None:
+            self.handler_time.record(time.perf_counter() - self._returned_at)
+        text = await self.inbound.get()
+        message = create_message_from_dict(json.loads(text))
+        self._returned_at = time.perf_counter()
+        return message
+
+
+class ChunkStats:
+    """Per-chunk CPU time, allocations and buffer depths for one stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_time = LatencyHistogram(f"{name} per call")
+        self.chunks = 0
+        self.cpu_seconds = 0.0
+        self.allocated_bytes = []
+        self.depths = {}
+
+    def record_depth(self, buffer_name: str, fill: int):
+        self.depths.setdefault(buffer_name, []).append(fill)
+
+    def describe(self, sample_rate: int) -> list[str]:
+        lines = [
+            f"{self.name}: {self.chunks} chunks, cpu {self.cpu_seconds * 1000 / max(self.chunks, 1):.3f} ms per chunk",
+            f"  {self.wall_time.describe()}",
+        ]
+        if self.allocated_bytes:
+            allocated = np.array(self.allocated_bytes) / 1024
+            lines.append(f"  allocated per call: mean {allocated.mean():.1f} KiB, max {allocated.max():.1f} KiB")
+        for buffer_name, fills in self.depths.items():
+            fills = np.array(fills)
+            lines.append(
+                f"  {buffer_name} depth: p50 {np.percentile(fills, 50) * 1000 / sample_rate:.0f} ms, "
+                f"p99 {np.percentile(fills, 99) * 1000 / sample_rate:.0f} ms, max {fills.max() * 1000 / sample_rate:.0f} ms"
+            )
+        return lines
+
+
+def measure(stats: ChunkStats, chunks: int, function, *args):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    result = function(*args)
+    stats.wall_time.record(time.perf_counter() - wall_start)
+    stats.cpu_seconds += time.process_time() - cpu_start
+    stats.chunks += chunks
+    if tracing:
+        stats.allocated_bytes.append(tracemalloc.get_traced_memory()[1] - baseline)
+    return result
+
+
+def load_wav(path: str, device_rate: int) -> np.ndarray:
+    rate, audio = wavfile.read(path)
+    if audio.ndim > 1:
+        audio = audio[:, 0]
+    if audio.dtype != np.int16:
+        audio = np.clip(audio.astype(np.float32) * (32767 / np.abs(audio).max()), -32768, 32767).astype(np.int16)
+    return StreamResampler(rate, device_rate).process(audio)
+
+
+def run_periods(period_count: int, period_seconds: float, callback):
+    """Call callback(index) once per period on a steady clock, like a sound card would."""
+    next_time = time.perf_counter()
+    for index in range(period_count):
+        next_time += period_seconds
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        callback(index)
+
+
+async def benchmark_capture(audio: np.ndarray, device_rate: int, speed: float) -> tuple[ChunkStats, FakeRealtimeClient, ThreadToLoopBridge, CaptureCallback]:
+    audio_input_buffer = RingBuffer(API_SAMPLE_RATE * INPUT_BUFFER_SECONDS)
+    client = FakeRealtimeClient()
+    capture_buffer = RingBuffer(device_rate * INPUT_BUFFER_SECONDS)
+    far_end_buffer = RingBuffer(device_rate * 2)
+    input_bridge = ThreadToLoopBridge(asyncio.get_running_loop())
+    capture_callback = CaptureCallback(capture_buffer)
+    playback_callback = PlaybackCallback(JitterBuffer(device_rate, 1), OUTPUT_CHUNK_SIZE)
+    capture_processor = CaptureProcessor(
+        capture_buffer,
+        far_end_buffer,
+        audio_input_buffer,
+        EchoCanceller(device_rate),
+        StreamResampler(device_rate, API_SAMPLE_RATE),
+        VoiceActivityGate(API_SAMPLE_RATE),
+        AppendBatcher(API_SAMPLE_RATE, AUDIO_APPEND_TARGET_MS),
+        INPUT_CHUNK_SIZE,
+        bridge=input_bridge,
+    )
+
+    stats = ChunkStats("capture dsp")
+    process = capture_processor.process
+
+    def timed_process():
+        stats.record_depth("capture buffer", capture_buffer.fill)
+        stats.record_depth("input buffer", audio_input_buffer.fill)
+        chunks = capture_buffer.fill // INPUT_CHUNK_SIZE
+        return measure(stats, chunks, process)
+
+    chunk_count = len(audio) // INPUT_CHUNK_SIZE
+    chunk_bytes = [audio[index * INPUT_CHUNK_SIZE:(index + 1) * INPUT_CHUNK_SIZE].tobytes() for index in range(chunk_count)]
+
+    def capture():
+        run_periods(
+            chunk_count,
+            INPUT_CHUNK_SIZE / device_rate / speed,
+            lambda index: capture_callback(chunk_bytes[index], INPUT_CHUNK_SIZE, None, 0),
+        )
+        while capture_processor.processed_chunks < chunk_count:
+            time.sleep(0.001)
+        client.closed = True
+        input_bridge.notify()
+
+    capture_processor.process = timed_process
+    capture_processor.start()
+    try:
+        producer = threading.Thread(target=capture, daemon=True)
+        producer.start()
+        await voice_chat.send_audio(client, capture_processor, input_bridge, capture_callback, playback_callback)
+        producer.join()
+        await client.scheduler.flush()
+    finally:
+        capture_processor.stop()
+        await client.scheduler.stop()
+    return stats, client, input_bridge, capture_callback
+
+
+def make_event(event_type: str, index: int, **fields) -> str:
+    return json.dumps({
+        "type": event_type,
+        "event_id": f"event_{index}",
+        "response_id": "resp_benchmark",
+        "item_id": "item_benchmark",
+        "output_index": 0,
+        "content_index": 0,
+        **fields,
+    })
+
+
+def make_audio_deltas(count: int, delta_ms: int) -> list[str]:
+    samples_per_delta = API_SAMPLE_RATE * delta_ms // 1000
+    t = np.arange(samples_per_delta * count) / API_SAMPLE_RATE
+    tone = (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    deltas = []
+    for index in range(count):
+        chunk = tone[index * samples_per_delta:(index + 1) * samples_per_delta]
+        payload = np.asarray(voice_chat.transport_codec.encode(chunk)).tobytes()
+        deltas.append(make_event("response.audio.delta", index, delta=base64.b64encode(payload).decode("utf-8")))
+    return deltas
+
+
+async def benchmark_playback(device_rate: int, delta_count: int, delta_ms: int, jitter_ms: float) -> tuple[ChunkStats, FakeRealtimeClient, PlaybackCallback]:
+    client = FakeRealtimeClient()
+    audio_output_buffer = JitterBuffer(device_rate, OUTPUT_BUFFER_SECONDS)
+    playback_callback = PlaybackCallback(audio_output_buffer, OUTPUT_CHUNK_SIZE)
+    stats = ChunkStats("playback callback")
+    deltas = make_audio_deltas(delta_count, delta_ms)
+    delivered = threading.Event()
+
+    period_seconds = OUTPUT_CHUNK_SIZE / device_rate
+    total_periods = int((delta_count * delta_ms + audio_output_buffer.max_delay * 1000 + jitter_ms * 10) / 1000 / period_seconds) + 2
+
+    def play(index):
+        stats.record_depth("playback buffer", audio_output_buffer.fill)
+        measure(stats, 1, playback_callback, None, OUTPUT_CHUNK_SIZE, None, 0)
+
+    def sink():
+        # The card runs from the first delta on, then keeps its pace until everything is out
+        delivered.wait()
+        run_periods(total_periods, period_seconds, play)
+
+    delta_decoder = DeltaDecoder(audio_output_buffer, voice_chat.transport_codec, StreamResampler(API_SAMPLE_RATE, device_rate))
+    delta_decoder.start()
+    receive_task = asyncio.create_task(voice_chat.receive_messages(client, delta_decoder))
+    player = threading.Thread(target=sink, daemon=True)
+    player.start()
+    start = time.perf_counter()
+    due = 0.0
+    for index, delta in enumerate(deltas):
+        # Real-time pacing plus network delay, without reordering
+        due = max(due, index * delta_ms / 1000 + (random.expovariate(1000 / jitter_ms) if jitter_ms else 0.0))
+        await asyncio.sleep(max(0.0, start + due - time.perf_counter()))
+        client.inbound.put_nowait(delta)
+        delivered.set()
+    client.inbound.put_nowait(make_event("response.audio.done", len(deltas)))
+    await asyncio.get_running_loop().run_in_executor(None, player.join)
+    receive_task.cancel()
+    delta_decoder.stop()
+    return stats, client, playback_callback
+
+
+async def run(paths: list[str], device_rate: int, speed: float, delta_count: int, delta_ms: int, jitter_ms: float, trace_allocations: bool):
+    # Keep the per-message log lines in the measurement, but out of the droid's log directory
+    voice_chat.logger = Logger(base_dir=tempfile.mkdtemp(prefix="droid-benchmark-"))
+    if trace_allocations:
+        tracemalloc.start()
+
+    print(f"transport: {voice_chat.AUDIO_TRANSPORT_FORMAT}, device rate: {device_rate} Hz, api rate: {API_SAMPLE_RATE} Hz, speed: {speed}x")
+    for path in paths:
+        audio = load_wav(path, device_rate)
+        stats, client, input_bridge, capture_callback = await benchmark_capture(audio, device_rate, speed)
+        print(f"{path} ({len(audio) / device_rate:.1f} s)")
+        for line in stats.describe(device_rate):
+            print(f"  {line}")
+        print(f"  appends: {client.sent_messages} ({client.sent_bytes / 1024:.0f} KiB of JSON), {client.send_time.describe()}")
+        print(f"  send queues: {client.describe_send_queues()}")
+        print(f"  capture to send, {input_bridge.handoff_latency.describe()}")
+        print(f"  {capture_callback.describe()}")
+
+    stats, client, playback_callback = await benchmark_playback(device_rate, delta_count, delta_ms, jitter_ms)
+    print(f"playback ({delta_count} deltas of {delta_ms} ms, {jitter_ms:.0f} ms mean jitter)")
+    for line in stats.describe(device_rate):
+        print(f"  {line}")
+    print(f"  response.audio.delta {client.handler_time.describe()}")
+    print(f"  {playback_callback.describe()}")
+    print(f"  playout: {playback_callback.source.describe()}")
+
+    if trace_allocations:
+        print(f"traced memory peak: {tracemalloc.get_traced_memory()[1] / 1024:.0f} KiB")
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", nargs="+", help="WAV files to replay through the capture path")
+    parser.add_argument("--device-rate", type=int, default=API_SAMPLE_RATE, help="rate the simulated sound card runs at")
+    parser.add_argument("--speed", type=float, default=10.0, help="capture clock speed relative to real time")
+    parser.add_argument("--deltas", type=int, default=200, help="response.audio.delta frames to play")
+    parser.add_argument("--delta-ms", type=int, default=50, help="audio carried by each delta")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="mean extra network delay per delta")
+    parser.add_argument("--trace-allocations", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.wav, args.device_rate, args.speed, args.deltas, args.delta_ms, args.jitter_ms, args.trace_allocations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Run many realtime conversations at once against the mock realtime server and measure what the
+clients see: session setup, the wait from the first audio sent to the first audio delta, the
+turnaround of a tool call, and the server events handled per second in total.
+
+    python -m droid.benchmarks.realtime_load [--clients 1 10 50] [--client lowlevel|rtclient]
+        [--jitter-ms 0] [--drop-after N] [--endpoint URL]
+
+Each client plays the user: it configures the session, streams 20 ms of silence every 20 ms,
+answers the get_your_info call with a tool output and response.create, and stops after the
+third response. lowlevel drives RTLowLevelClient the way voice_chat does, rtclient reads the
+same conversation through RTClient and its message queues. The mock server runs in this process
+unless --endpoint points at another one, e.g. python -m droid.rtclient.mock_server.
+"""
+
+import argparse
+import asyncio
+import base64
+import time
+from typing import Optional
+
+from azure.core.credentials import AzureKeyCredential
+
+from droid.metrics import LatencyHistogram
+from droid.rtclient import (
+    Backoff,
+    FunctionCallOutputItem,
+    ItemCreateMessage,
+    RTClient,
+    RTLowLevelClient,
+    RTResponse,
+    ResponseCreateMessage,
+    SessionUpdateMessage,
+    SessionUpdateParams,
+)
+from droid.rtclient.mock_server import MockRealtimeServer, default_script
+
+SILENCE = base64.b64encode(bytes(24000 * 20 // 1000 * 2)).decode("ascii")
+RESPONSES = 3
+
+
+class LoadStats:
+    def __init__(self):
+        self.setup = LatencyHistogram("session setup")
+        self.first_audio = LatencyHistogram("first audio")
+        self.tool_turnaround = LatencyHistogram("tool turnaround")
+        self.events = 0
+        self.failures = 0
+
+    def describe(self) -> list[str]:
+        return [self.setup.describe(), self.first_audio.describe(), self.tool_turnaround.describe()]
+
+
+async def stream_silence(send, stop: asyncio.Event):
+    while not stop.is_set():
+        await send()
+        await asyncio.sleep(0.02)
+
+
+async def lowlevel_conversation(url: str, stats: LoadStats, reconnect: bool):
+    client = RTLowLevelClient(
+        url,
+        key_credential=AzureKeyCredential("load"),
+        azure_deployment="load",
+        reconnect=reconnect,
+        backoff=Backoff(initial=0.05, maximum=0.5),
+    )
+    start = time.monotonic()
+    await client.connect()
+    await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="alloy")))
+    while (message := await client.recv()) is not None and message.type != "session.updated":
+        stats.events += 1
+    stats.setup.record(time.monotonic() - start)
+
+    stop = asyncio.Event()
+    streaming = asyncio.create_task(stream_silence(lambda: client.send_audio_append(SILENCE), stop))
+    waiting_since: Optional[float] = time.monotonic()
+    waiting_for = stats.first_audio
+    responses = 0
+    try:
+        while responses < RESPONSES and (message := await client.recv()) is not None:
+            stats.events += 1
+            if message.type == "response.audio.delta" and waiting_since is not None:
+                waiting_for.record(time.monotonic() - waiting_since)
+                waiting_since = None
+            elif message.type == "response.done":
+                responses += 1
+                call = next((item for item in message.response.output if item.type == "function_call"), None)
+                if call is not None:
+                    waiting_since, waiting_for = time.monotonic(), stats.tool_turnaround
+                    await client.send(ItemCreateMessage(item=FunctionCallOutputItem(call_id=call.call_id, output="Rubber Duck")))
+                    await client.send(ResponseCreateMessage())
+        if responses < RESPONSES:
+            stats.failures += 1
+    finally:
+        stop.set()
+        await streaming
+        await client.close()
+
+
+async def rtclient_conversation(url: str, stats: LoadStats, reconnect: bool):
+    start = time.monotonic()
+    async with RTClient(url, key_credential=AzureKeyCredential("load"), azure_deployment="load") as client:
+        await client.configure(voice="alloy")
+        stats.setup.record(time.monotonic() - start)
+        stop = asyncio.Event()
+        streaming = asyncio.create_task(stream_silence(lambda: client.send_audio(bytes(960)), stop))
+        waiting_since: Optional[float] = time.monotonic()
+        waiting_for = stats.first_audio
+        responses = 0
+        try:
+            async for item in client.items():
+                if not isinstance(item, RTResponse):
+                    await item
+                    continue
+                call_id = None
+                async for output in item:
+                    async for chunk in output:
+                        stats.events += 1
+                        if chunk.type == "audio" and waiting_since is not None:
+                            waiting_for.record(time.monotonic() - waiting_since)
+                            waiting_since = None
+                        elif chunk.type == "tool_call_arguments":
+                            call_id = f"call_{item.id.removeprefix('resp_')}"
+                responses += 1
+                if responses == RESPONSES:
+                    break
+                if call_id is not None:
+                    waiting_since, waiting_for = time.monotonic(), stats.tool_turnaround
+                    await client.send_item(FunctionCallOutputItem(call_id=call_id, output="Rubber Duck"))
+                    await client.generate_response()
+            if responses < RESPONSES:
+                stats.failures += 1
+        finally:
+            stop.set()
+            await streaming
+
+
+CONVERSATIONS = {"lowlevel": lowlevel_conversation, "rtclient": rtclient_conversation}
+
+
+async def run(client_counts: list[int], client_type: str, jitter: float, drop_after: Optional[int], endpoint: Optional[str]):
+    conversation = CONVERSATIONS[client_type]
+    print(f"client: {client_type}, jitter: {jitter * 1000:.0f} ms, drop after: {drop_after}")
+    for count in client_counts:
+        server = None
+        url = endpoint
+        if url is None:
+            server = MockRealtimeServer(default_script(), jitter=jitter, drop_after=drop_after, max_drops=count)
+            url = await server.start()
+        stats = LoadStats()
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(conversation(url, stats, drop_after is not None) for _ in range(count)), return_exceptions=True
+        )
+        elapsed = time.monotonic() - start
+        stats.failures += sum(isinstance(result, BaseException) for result in results)
+        print(f"{count} clients: {elapsed:.1f} s, {stats.events / elapsed:,.0f} events/s, failed: {stats.failures}")
+        for line in stats.describe():
+            print(f"  {line}")
+        if server is not None:
+            print(f"  server {server.describe()}")
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50], help="concurrent conversations per run")
+    parser.add_argument("--client", choices=CONVERSATIONS, default="lowlevel", help="client API that reads the conversation")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay the mock server adds before each event")
+    parser.add_argument("--drop-after", type=int, help="the mock server drops every connection once after this many events; lowlevel clients reconnect")
+    parser.add_argument("--endpoint", help="realtime endpoint to use instead of an in-process mock server")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.client, args.jitter_ms / 1000, args.drop_after, args.endpoint))
+
+
+if __name__ == "__main__":
+    main()
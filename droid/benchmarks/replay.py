@@ -0,0 +1,104 @@
+"""
+Replay a recorded realtime session through the droid's receive loop and measure how long the
+handlers take with each server event and how far the replay falls behind the recording.
+
+    python -m droid.benchmarks.replay [--recording FILE] [--speed 1 10 0] [--repeat 20] [--interval-ms 20]
+
+Recordings are written by RTLowLevelClient when REALTIME_RECORD_DIR is set. Without --recording
+the events in droid/rtclient/testdata/session.jsonl are recorded --repeat times, one every
+--interval-ms, and that recording is replayed. Each run reads the file with SessionReplay,
+parses the events with create_message_from_dict and hands them to receive_messages with a
+DeltaDecoder, as in the droid. A speed of 0 replays as fast as the handlers keep up.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from droid import voice_chat
+from droid.audio import DeltaDecoder, JitterBuffer, StreamResampler
+from droid.config import API_SAMPLE_RATE
+from droid.logger import Logger
+from droid.metrics import LatencyHistogram
+from droid.rtclient.recorder import ReplayClient, SessionRecorder, SessionReplay
+
+CORPUS = Path(__file__).parent.parent / "rtclient" / "testdata" / "session.jsonl"
+
+
+class TimedReplayClient(ReplayClient):
+    """ReplayClient that records the time from returning an event to the next recv()."""
+
+    def __init__(self, replay: SessionReplay, speed: float):
+        super().__init__(replay, speed)
+        self.handler_time = LatencyHistogram("event handling")
+        self.events = 0
+        self._returned_at = None
+
+    async def recv(self):
+        if self._returned_at is not None:
+            self.handler_time.record(time.perf_counter() - self._returned_at)
+        message = await super().recv()
+        if message is not None:
+            self.events += 1
+        self._returned_at = time.perf_counter()
+        return message
+
+
+def record_corpus(base_dir: str, repeat: int, interval: float) -> str:
+    frames = CORPUS.read_text().splitlines()
+    recorder = SessionRecorder.create(base_dir)
+    for index in range(repeat * len(frames)):
+        recorder.record_received(frames[index % len(frames)], timestamp=recorder.started_at + index * interval)
+    recorder.close()
+    return recorder.path
+
+
+async def replay_once(replay: SessionReplay, speed: float, duration: float):
+    client = TimedReplayClient(replay, speed)
+    output = JitterBuffer(API_SAMPLE_RATE, 5)
+    delta_decoder = DeltaDecoder(output, voice_chat.transport_codec, StreamResampler(API_SAMPLE_RATE, API_SAMPLE_RATE))
+    delta_decoder.start()
+    start = time.perf_counter()
+    await voice_chat.receive_messages(client, delta_decoder)
+    elapsed = time.perf_counter() - start
+    delta_decoder.stop()
+    # Tool calls are queued for execute_tool, which doesn't run here
+    while not voice_chat.execute_tool_queue.empty():
+        voice_chat.execute_tool_queue.get_nowait()
+    behind = elapsed - duration / speed if speed > 0 else 0.0
+    print(
+        f"speed {speed:g}: {client.events} events in {elapsed:.2f} s, {client.events / elapsed:,.0f} events/s, "
+        f"behind the recording {behind * 1000:.1f} ms"
+    )
+    print(f"  {client.handler_time.describe()}")
+
+
+async def run(recording: Optional[str], speeds: list[float], repeat: int, interval: float):
+    base_dir = tempfile.mkdtemp(prefix="droid-benchmark-")
+    voice_chat.logger = Logger(base_dir=base_dir)
+    if recording is None:
+        recording = record_corpus(base_dir, repeat, interval)
+    with SessionReplay(recording) as replay:
+        frames = list(replay.frames())
+        duration = frames[-1].time - frames[0].time if frames else 0.0
+        print(f"{recording}: {len(frames)} frames over {duration:.1f} s, {os.path.getsize(recording):,} bytes")
+        for speed in speeds:
+            await replay_once(replay, speed, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recording", help="session recording to replay, by default one made from the test corpus")
+    parser.add_argument("--speed", type=float, nargs="+", default=[1.0, 10.0, 0.0], help="replay speeds, 0 for as fast as possible")
+    parser.add_argument("--repeat", type=int, default=20, help="times the test corpus is recorded")
+    parser.add_argument("--interval-ms", type=float, default=20.0, help="time between the recorded corpus events")
+    args = parser.parse_args()
+    asyncio.run(run(args.recording, args.speed, args.repeat, args.interval_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
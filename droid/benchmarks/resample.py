@@ -0,0 +1,87 @@
+"""
+Compare CPU cost of the old per-chunk FFT resampling with StreamResampler.
+
+    python -m droid.benchmarks.resample [--seconds 30] [--wav input.wav]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample
+
+from droid.audio import StreamResampler
+from droid.config import API_SAMPLE_RATE, INPUT_CHUNK_SIZE, INPUT_SAMPLE_RATE, OUTPUT_CHUNK_SIZE, OUTPUT_SAMPLE_RATE
+
+
+def fft_resample_chunk(chunk: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    # Same computation voice_chat.py used to run for every chunk
+    return resample(chunk, int(len(chunk) * to_rate / from_rate)).astype(np.int16)
+
+
+def cpu_ms_per_audio_second(process, audio: np.ndarray, chunk_size: int, rate: int) -> float:
+    start = time.process_time()
+    for i in range(0, len(audio), chunk_size):
+        process(audio[i:i + chunk_size])
+    elapsed = time.process_time() - start
+    return elapsed * 1000 / (len(audio) / rate)
+
+
+def synthetic_audio(seconds: float, rate: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    voice = np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    return (6000 * voice + 300 * rng.standard_normal(len(t))).astype(np.int16)
+
+
+def run(audio_in: np.ndarray, audio_out: np.ndarray):
+    rows = [
+        (
+            f"mic {INPUT_SAMPLE_RATE}->{API_SAMPLE_RATE}",
+            lambda chunk: fft_resample_chunk(chunk, INPUT_SAMPLE_RATE, API_SAMPLE_RATE),
+            StreamResampler(INPUT_SAMPLE_RATE, API_SAMPLE_RATE).process,
+            audio_in,
+            INPUT_CHUNK_SIZE,
+            INPUT_SAMPLE_RATE,
+        ),
+        (
+            f"speaker {API_SAMPLE_RATE}->{OUTPUT_SAMPLE_RATE}",
+            lambda chunk: fft_resample_chunk(chunk, API_SAMPLE_RATE, OUTPUT_SAMPLE_RATE),
+            StreamResampler(API_SAMPLE_RATE, OUTPUT_SAMPLE_RATE).process,
+            audio_out,
+            OUTPUT_CHUNK_SIZE // 2,
+            API_SAMPLE_RATE,
+        ),
+        (
+            f"speaker {API_SAMPLE_RATE}->{API_SAMPLE_RATE * 2}",
+            lambda chunk: fft_resample_chunk(chunk, API_SAMPLE_RATE, API_SAMPLE_RATE * 2),
+            StreamResampler(API_SAMPLE_RATE, API_SAMPLE_RATE * 2).process,
+            audio_out,
+            OUTPUT_CHUNK_SIZE // 2,
+            API_SAMPLE_RATE,
+        ),
+    ]
+    print(f"{'path':<24} {'fft ms/s':>10} {'stream ms/s':>12} {'speedup':>8}")
+    for name, fft_process, stream_process, audio, chunk_size, rate in rows:
+        fft_cost = cpu_ms_per_audio_second(fft_process, audio, chunk_size, rate)
+        stream_cost = cpu_ms_per_audio_second(stream_process, audio, chunk_size, rate)
+        print(f"{name:<24} {fft_cost:>10.2f} {stream_cost:>12.2f} {fft_cost / stream_cost:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of synthetic audio")
+    parser.add_argument("--wav", help="mono 16-bit WAV at INPUT_SAMPLE_RATE to use instead of synthetic audio")
+    args = parser.parse_args()
+
+    if args.wav:
+        _, audio_in = wavfile.read(args.wav)
+    else:
+        audio_in = synthetic_audio(args.seconds, INPUT_SAMPLE_RATE)
+    audio_out = synthetic_audio(len(audio_in) / INPUT_SAMPLE_RATE, API_SAMPLE_RATE)
+    run(audio_in, audio_out)
+
+
+if __name__ == "__main__":
+    main()
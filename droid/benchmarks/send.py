@@ -0,0 +1,70 @@
+"""
+Measure how many input_audio_buffer.append messages per second RTLowLevelClient can send, by
+building and dumping the pydantic model with send() and by splicing the payload into the
+pre-serialized template with send_audio_append(). Both go through the client's send
+scheduler; the time runs until the last append has been written.
+
+    python -m droid.benchmarks.send [--sends 20000] [--append-ms 20 100 500]
+
+The websocket is replaced by one that drops every frame, and the base64 payload is encoded up
+front, so this measures the client's own cost per send.
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import time
+
+from azure.core.credentials import AzureKeyCredential
+
+from droid.config import API_SAMPLE_RATE
+from droid.rtclient import InputAudioBufferAppendMessage, RTLowLevelClient
+
+
+class NullWebSocket:
+    closed = False
+
+    async def send_str(self, data: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def sends_per_second(client: RTLowLevelClient, send, audio: str, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await send(audio)
+        # Let the writer run, as the capture loop does between appends
+        await asyncio.sleep(0)
+    await client.flush()
+    return count / (time.perf_counter() - start)
+
+
+async def run(count: int, append_ms: list[int]):
+    client = RTLowLevelClient(key_credential=AzureKeyCredential("benchmark"), model="benchmark")
+    client.ws = NullWebSocket()
+    senders = {
+        "send(model)": lambda audio: client.send(InputAudioBufferAppendMessage(audio=audio)),
+        "send_audio_append": client.send_audio_append,
+    }
+    print(f"{'append':>10} " + " ".join(f"{name:>22}" for name in senders))
+    for duration in append_ms:
+        audio = base64.b64encode(os.urandom(API_SAMPLE_RATE * duration // 1000 * 2)).decode("utf-8")
+        rates = [await sends_per_second(client, send, audio, count) for send in senders.values()]
+        print(f"{duration:>7} ms " + " ".join(f"{rate:>15,.0f} sends/s" for rate in rates))
+    print(f"dropped audio: {client.scheduler.dropped_audio}, merged audio: {client.scheduler.merged_audio}")
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=20000, help="appends sent per payload size and method")
+    parser.add_argument("--append-ms", type=int, nargs="+", default=[20, 100, 500], help="PCM16 audio per append at the API rate")
+    args = parser.parse_args()
+    asyncio.run(run(args.sends, args.append_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare websocket payload size and encode cost of the pcm16 and G.711 transports.
+
+    python -m droid.benchmarks.transport [--seconds 30]
+
+Audio is cut into AUDIO_APPEND_TARGET_MS appends and each is serialised exactly as send_audio
+does it, so the byte counts are what goes over the websocket.
+"""
+
+import argparse
+import base64
+import time
+
+import numpy as np
+
+from droid.audio import StreamResampler
+from droid.audio.g711 import TRANSPORT_CODECS
+from droid.config import AUDIO_APPEND_TARGET_MS
+from droid.rtclient import InputAudioBufferAppendMessage
+
+
+def speech_like(seconds: float, rate: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    voice = np.sin(2 * np.pi * 160 * t) + 0.5 * np.sin(2 * np.pi * 320 * t) + 0.25 * np.sin(2 * np.pi * 1200 * t)
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    return (4000 * voice * envelope + 200 * rng.standard_normal(len(t))).astype(np.int16)
+
+
+def measure(audio_format: str, audio_24k: np.ndarray, seconds: float):
+    codec = TRANSPORT_CODECS[audio_format]
+    audio = StreamResampler(24000, codec.sample_rate).process(audio_24k)
+    frame = codec.sample_rate * AUDIO_APPEND_TARGET_MS // 1000
+
+    payload_bytes = 0
+    websocket_bytes = 0
+    start = time.process_time()
+    for i in range(0, len(audio), frame):
+        payload = codec.encode(memoryview(audio[i:i + frame]))
+        base64_audio = base64.b64encode(payload).decode("utf-8")
+        message = InputAudioBufferAppendMessage(audio=base64_audio).model_dump_json()
+        payload_bytes += len(bytes(payload))
+        websocket_bytes += len(message)
+    cpu_ms = (time.process_time() - start) * 1000
+    return payload_bytes / seconds, websocket_bytes / seconds, cpu_ms / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    audio_24k = speech_like(args.seconds, 24000)
+    baseline = None
+    print(f"{'format':<10} {'rate':>6} {'audio B/s':>10} {'websocket B/s':>14} {'cpu ms/s':>9} {'vs pcm16':>9}")
+    for audio_format in ("pcm16", "g711-ulaw", "g711-alaw"):
+        audio_rate, websocket_rate, cpu = measure(audio_format, audio_24k, args.seconds)
+        baseline = baseline or websocket_rate
+        rate = TRANSPORT_CODECS[audio_format].sample_rate
+        print(
+            f"{audio_format:<10} {rate:>6} {audio_rate:>10.0f} {websocket_rate:>14.0f} "
+            f"{cpu:>9.2f} {baseline / websocket_rate:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Run the voice activity gate over WAV files and report how much audio it would stream.
+
+    python -m droid.benchmarks.vad_eval recording1.wav recording2.wav [--chunk 2048]
+
+Files are resampled to API_SAMPLE_RATE first, like the microphone path does. If a label file
+with the same name and a .txt extension exists next to a WAV (Audacity label format: start and
+end seconds separated by tabs, one speech region per line), speech recall, audio streamed
+outside speech and the clipped onset time are reported as well.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy.io import wavfile
+
+from droid.audio import StreamResampler, VoiceActivityGate
+from droid.config import API_SAMPLE_RATE, INPUT_CHUNK_SIZE
+
+
+def load_wav(path: str) -> np.ndarray:
+    rate, audio = wavfile.read(path)
+    if audio.ndim > 1:
+        audio = audio[:, 0]
+    if audio.dtype != np.int16:
+        audio = np.clip(audio.astype(np.float32) * (32767 / np.abs(audio).max()), -32768, 32767).astype(np.int16)
+    return StreamResampler(rate, API_SAMPLE_RATE).process(audio)
+
+
+def load_labels(path: str, sample_count: int) -> np.ndarray | None:
+    label_path = os.path.splitext(path)[0] + ".txt"
+    if not os.path.exists(label_path):
+        return None
+    speech = np.zeros(sample_count, dtype=bool)
+    with open(label_path, encoding="utf-8") as label_file:
+        for line in label_file:
+            fields = line.split("\t")
+            if len(fields) < 2:
+                continue
+            start, end = (int(float(value) * API_SAMPLE_RATE) for value in fields[:2])
+            speech[start:end] = True
+    return speech
+
+
+def evaluate(path: str, chunk_size: int):
+    audio = load_wav(path)
+    gate = VoiceActivityGate(API_SAMPLE_RATE)
+    streamed = np.zeros(len(audio), dtype=bool)
+
+    cpu_start = time.process_time()
+    for offset in range(0, len(audio), chunk_size):
+        gate.process(audio[offset:offset + chunk_size])
+        for start, end in gate.emitted_ranges:
+            streamed[start:end] = True
+    cpu_ms = (time.process_time() - cpu_start) * 1000
+
+    duration = len(audio) / API_SAMPLE_RATE
+    print(f"{path}")
+    print(f"  duration: {duration:.1f} s, speech segments: {gate.speech_segments}")
+    print(f"  streamed: {streamed.mean() * 100:.1f}% ({len(audio) * 2 / 1024:.0f} KiB -> {streamed.sum() * 2 / 1024:.0f} KiB pcm16)")
+    print(f"  cpu: {cpu_ms / duration:.2f} ms per second of audio")
+
+    speech = load_labels(path, len(audio))
+    if speech is None:
+        return
+    recall = streamed[speech].mean() if speech.any() else 1.0
+    false_open = streamed[~speech].mean() if (~speech).any() else 0.0
+    # Labelled speech that fell before the gate opened, per labelled region
+    starts = np.flatnonzero(speech[1:] & ~speech[:-1]) + 1
+    if speech[0]:
+        starts = np.insert(starts, 0, 0)
+    clipped_ms = []
+    for start in starts:
+        end = start + np.argmin(speech[start:]) if not speech[start:].all() else len(speech)
+        missed = np.argmax(streamed[start:end]) if streamed[start:end].any() else end - start
+        clipped_ms.append(missed * 1000 / API_SAMPLE_RATE)
+    print(f"  speech recall: {recall * 100:.1f}%, streamed outside speech: {false_open * 100:.1f}%")
+    if clipped_ms:
+        print(f"  clipped onset: mean {np.mean(clipped_ms):.0f} ms, max {np.max(clipped_ms):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", nargs="+", help="WAV files to run through the gate")
+    parser.add_argument("--chunk", type=int, default=INPUT_CHUNK_SIZE, help="samples fed to the gate per call")
+    args = parser.parse_args()
+    for path in args.wav:
+        evaluate(path, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the realtime session part of wake to first audio: the time from the wake word until
+start_realtime_chat holds a session whose session.update the server has confirmed, with the
+session opened on wake (cold) and handed over from a pre-warmed SessionPool (warm).
+
+    python -m droid.benchmarks.wake [--wakes 10] [--idle 5] [--endpoint URL]
+
+Connects to the Azure OpenAI deployment in AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY and
+AZURE_OPENAI_DEPLOYMENT (read from .env as well), or to --endpoint instead, such as the mock
+server from python -m droid.rtclient.mock_server. Each wake is simulated idle seconds after the
+previous conversation ended, which gives the pool time to warm the next session, as the wake
+word detector does in the droid. Opening the audio devices costs the same either way and is not
+included.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+from droid import voice_chat
+from droid.metrics import LatencyHistogram
+
+
+async def wake(pool, histogram: LatencyHistogram):
+    start = time.monotonic()
+    session = await pool.acquire()
+    histogram.record(time.monotonic() - start)
+    await session.client.close()
+
+
+async def run(wakes: int, idle: float):
+    results = {}
+    for prewarm in (False, True):
+        pool = voice_chat.create_session_pool()
+        histogram = LatencyHistogram("wake to session ready")
+        if prewarm:
+            pool.start()
+        for _ in range(wakes):
+            await asyncio.sleep(idle)
+            await wake(pool, histogram)
+        await pool.stop()
+        results["warm" if prewarm else "cold"] = (histogram, pool)
+    for name, (histogram, pool) in results.items():
+        print(f"{name}: {histogram.describe()}")
+        print(f"  pool {pool.describe()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wakes", type=int, default=10, help="wakes simulated with and without pre-warming")
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds between one conversation and the next wake")
+    parser.add_argument("--endpoint", help="realtime endpoint to use instead of AZURE_OPENAI_ENDPOINT")
+    args = parser.parse_args()
+    load_dotenv()
+    if args.endpoint:
+        os.environ["AZURE_OPENAI_ENDPOINT"] = args.endpoint
+        # A local endpoint takes any key and deployment
+        os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+        os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "benchmark")
+    asyncio.run(run(args.wakes, args.idle))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,33 @@ STREAM_FORMAT = pyaudio.paInt16  # Stream format
 INPUT_CHANNELS = 1  # Input channels
 OUTPUT_CHANNELS = 1  # Output channels
 OUTPUT_SAMPLE_WIDTH = 2  # Output sample width
+INPUT_BUFFER_SECONDS = 5  # Microphone audio kept while the uplink is stalled. Once it is full, newly captured audio is dropped
+OUTPUT_BUFFER_SECONDS = 120  # Assistant audio that can be queued for playback
+PLAYOUT_TARGET_DELAY_MS = 120  # Assistant audio buffered before playback starts, adapted to the measured delta jitter
+PLAYOUT_MIN_DELAY_MS = 40  # Lower bound of the adaptive playout delay, trades time to first audio
+PLAYOUT_MAX_DELAY_MS = 500  # Upper bound of the adaptive playout delay, trades smooth speech
+AUDIO_APPEND_TARGET_MS = 100  # Microphone audio merged into each input_audio_buffer.append
+ECHO_TAIL_MS = 200  # Speaker to microphone echo the echo canceller models, on top of the output stream latency
+LOCAL_VAD_ENABLED = True  # Hold back silent microphone audio instead of streaming it to the server
+LOCAL_VAD_PREROLL_MS = 300  # Audio sent ahead of detected speech so the first syllable is not clipped
+LOCAL_VAD_HANGOVER_MS = 800  # Audio sent after speech ends. Must exceed the server VAD silence_duration_ms
+LOCAL_VAD_MIN_RMS = 300  # Quietest level treated as speech, the adaptive noise floor can raise it
+AUDIO_STATS_INTERVAL = 30  # Seconds between audio pipeline statistics in the session log
+SERVER_EVENT_LOG_SAMPLING = {  # Log only 1 in N of these high-frequency server events, 0 turns them off. Other events are always logged
+    "response.audio.delta": 100,
+    "response.audio_transcript.delta": 20,
+    "response.text.delta": 20,
+    "response.function_call_arguments.delta": 20,
+}
+REALTIME_PREWARM = True  # Keep a configured realtime session open while listening for the wake word, so a conversation starts without connecting
+REALTIME_SESSION_REFRESH_MARGIN = 60  # Seconds before the server's session expiry that a standby session is replaced
+REALTIME_RECONNECT = True  # Reopen a dropped realtime websocket with backoff, restoring the session configuration and recent conversation
+REALTIME_RECONNECT_ATTEMPTS = 10  # Connection attempts after a drop before the realtime client gives up and closes
+REALTIME_REPLAY_ITEMS = 20  # Recent conversation items created again in the new session after a reconnect
+REALTIME_AUDIO_QUEUE_LIMIT = 100  # Audio appends queued behind a congested websocket before the oldest are dropped
+REALTIME_RECORD_DIR = None  # Directory to record each realtime session's websocket frames to, e.g. "./log/sessions", for replaying with droid.benchmarks.replay. None records nothing
+AUDIO_TRANSPORT_FORMAT = "pcm16"  # pcm16, g711-ulaw or g711-alaw. G.711 carries 8 kHz audio at one byte per sample
+API_SAMPLE_RATE = 8000 if AUDIO_TRANSPORT_FORMAT.startswith("g711") else 24000  # Sample rate of audio exchanged with the Realtime API. Devices are opened at this rate when supported, INPUT_SAMPLE_RATE is the fallback
 
 INSTRUCTIONS = "Keep response short. Act as humorous Star Wars droid but don't beep with answers."
 VOICE_TYPE = "shimmer"  # alloy, echo, shimmer
@@ -28,6 +28,23 @@ class Logger:
         self.logger.error(message)
 
 
+class EventLogSampler:
+    """
+    Decide which occurrences of each event type get logged: every Nth one for the types listed
+    in sample_every (0 turns them off), every one for the rest.
+    """
+
+    def __init__(self, sample_every: dict[str, int]):
+        self.sample_every = sample_every
+        self.counts = {}
+
+    def should_log(self, event_type: str) -> bool:
+        count = self.counts.get(event_type, 0)
+        self.counts[event_type] = count + 1
+        every = self.sample_every.get(event_type, 1)
+        return every > 0 and count % every == 0
+
+
 async def main(logger: Logger):
     await logger.info("Hello, World!")
     await logger.error("Hello, World!")
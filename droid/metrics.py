@@ -0,0 +1,59 @@
+"""Small, allocation-free latency histograms for the realtime audio path."""
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Log-spaced histogram of durations in seconds, from 10 us to 10 s with 8 buckets per octave
+    (about 9% resolution). Recording is a bucket increment, so it is cheap enough for per-frame use.
+    """
+
+    MIN_SECONDS = 1e-5
+    BUCKETS_PER_OCTAVE = 8
+    OCTAVES = 20
+
+    def __init__(self, name: str):
+        self.name = name
+        self._counts = np.zeros(self.BUCKETS_PER_OCTAVE * self.OCTAVES + 1, dtype=np.int64)
+        self._upper_bounds = self.MIN_SECONDS * 2 ** (np.arange(len(self._counts)) / self.BUCKETS_PER_OCTAVE)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds <= self.MIN_SECONDS:
+            index = 0
+        else:
+            index = min(
+                int(np.log2(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_OCTAVE) + 1,
+                len(self._counts) - 1,
+            )
+        self._counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound of the bucket holding the given percentile, in seconds."""
+        if self.count == 0:
+            return 0.0
+        rank = np.searchsorted(np.cumsum(self._counts), self.count * percent / 100)
+        return min(float(self._upper_bounds[rank]), self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self._counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def describe(self) -> str:
+        return (
+            f"{self.name}: n={self.count}, p50={self.percentile(50) * 1000:.2f} ms, "
+            f"p99={self.percentile(99) * 1000:.2f} ms, max={self.max * 1000:.2f} ms"
+        )
@@ -1,14 +1,16 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import asyncio
 import base64
-import json
+import time
 import uuid
 from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
 from typing import Literal, Optional
 
-from aiohttp import ClientSession, WSMsgType
+from aiohttp import ClientError, ClientSession, WSMsgType
 from azure.core.credentials import AzureKeyCredential, TokenCredential
+from azure.core.exceptions import AzureError
 
 from .models import (
     AssistantContentPart,
@@ -87,6 +89,7 @@ from .models import (
     ServerVAD,
     Session,
     SessionCreatedMessage,
+    SessionUpdatedMessage,
     SessionUpdateMessage,
     SessionUpdateParams,
     SystemContentPart,
@@ -99,9 +102,17 @@ from .models import (
     UserContentPart,
     UserMessageItem,
     UserMessageType,
+    UnknownServerMessage,
     Voice,
     create_message_from_dict,
+    parse_server_message,
 )
+from .encoder import MessageTemplate
+from .reconnect import Backoff, ConversationWindow
+from .recorder import ReplayClient, SessionRecorder, SessionReplay
+from .scheduler import Priority, SendScheduler, priority_of
+from ..metrics import LatencyHistogram
+from ..token_cache import TokenCache
 from .util.message_queue import MessageQueue
 
 
@@ -113,11 +124,17 @@ class RTLowLevelClient:
         key_credential: Optional[AzureKeyCredential] = None,
         model: Optional[str] = None,
         azure_deployment: Optional[str] = None,
+        reconnect: bool = False,
+        replay_items: int = 20,
+        backoff: Optional[Backoff] = None,
+        token_cache: Optional[TokenCache] = None,
+        audio_queue_limit: int = 100,
+        recorder: Optional[SessionRecorder] = None,
     ):
         self._is_azure_openai = url is not None
         if self._is_azure_openai:
-            if key_credential is None and token_credential is None:
-                raise ValueError("key_credential or token_credential is required for Azure OpenAI")
+            if key_credential is None and token_credential is None and token_cache is None:
+                raise ValueError("key_credential, token_credential or token_cache is required for Azure OpenAI")
             if azure_deployment is None:
                 raise ValueError("azure_deployment is required for Azure OpenAI")
         else:
@@ -127,17 +144,39 @@ class RTLowLevelClient:
                 raise ValueError("model is required for OpenAI")
 
         self._url = url if self._is_azure_openai else "wss://api.openai.com"
-        self._token_credential = token_credential
+        # Tokens come from memory, fetched ahead of expiry, rather than from the credential on every connect
+        if token_cache is None and token_credential is not None:
+            token_cache = TokenCache(token_credential)
+        self._token_cache = token_cache
         self._key_credential = key_credential
         self._session = ClientSession(base_url=self._url)
+        self.ws = None
         self._model = model
         self._azure_deployment = azure_deployment
 
-    def _get_auth(self):
-        if self._token_credential:
-            scopes = ["https://cognitiveservices.azure.com/.default"]
-            token = self._token_credential.get_token(scopes)
-            return {"Authorization": f"Bearer {token.token}"}
+        # With reconnect, a dropped websocket is reopened with backoff, the last session.update is
+        # sent again and the recent conversation replayed; recv() and send() wait for that instead
+        # of failing. Only close() ends the client, or running out of the backoff's attempts
+        self._reconnect = reconnect
+        self._backoff = backoff or Backoff()
+        self._conversation = ConversationWindow(replay_items)
+        self._session_update: Optional[SessionUpdateMessage] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        self.replayed_items = 0
+        self.downtime = LatencyHistogram("reconnect downtime")
+
+        # Audio, tool results and control messages come from different tasks; one writer sends
+        # them in priority order and bounds what can pile up behind a slow socket
+        self.scheduler = SendScheduler(self._send_str, audio_limit=audio_queue_limit)
+        # Every frame sent and received, with its time, for replaying the session later
+        self._recorder = recorder
+
+    async def _get_auth(self):
+        if self._token_cache:
+            return await self._token_cache.auth_headers()
         elif self._key_credential:
             return {"api-key": self._key_credential.key}
         else:
@@ -146,7 +185,7 @@ class RTLowLevelClient:
     async def connect(self):
         self.request_id = uuid.uuid4()
         if self._is_azure_openai:
-            auth_headers = self._get_auth()
+            auth_headers = await self._get_auth()
             headers = {"x-ms-client-request-id": str(self.request_id), **auth_headers}
             self.ws = await self._session.ws_connect(
                 "/openai/realtime",
@@ -161,18 +200,121 @@ class RTLowLevelClient:
             self.ws = await self._session.ws_connect("/v1/realtime", headers=headers, params={"model": self._model})
 
     async def send(self, message: UserMessageType):
+        """Queue the message in its priority class and wait until it has been written."""
+        if message.type == "session.update":
+            self._session_update = message
+        elif message.type == "input_audio_buffer.clear":
+            self.scheduler.discard_audio()
         message_json = message.model_dump_json()
-        await self.ws.send_str(message_json)
+        if (recorder := self._recording()) is not None:
+            recorder.record_sent(message_json)
+        await self.scheduler.send(message_json, priority_of(message.type))
+
+    async def send_audio_append(self, audio: str):
+        """
+        Queue input_audio_buffer.append for base64 audio without building the pydantic model. It
+        returns without waiting for the write, audio behind a congested socket is merged or dropped.
+        """
+        if (recorder := self._recording()) is not None:
+            recorder.record_sent_audio(audio)
+        self.scheduler.send_audio(audio)
+
+    def _recording(self) -> Optional[SessionRecorder]:
+        """The recorder, or None once the client is closing and the recording may be closed."""
+        return None if self._closing else self._recorder
+
+    async def flush(self):
+        """Wait until everything sent so far has been written to the websocket."""
+        await self.scheduler.flush()
+
+    def describe_send_queues(self) -> str:
+        return self.scheduler.describe()
+
+    async def _send_str(self, data: str, restoring: bool = False):
+        """
+        Write one frame, waiting out a reconnect. The frames that restore the session come from
+        the reconnect itself, so they go out at once and a failed write is raised to it.
+        """
+        while True:
+            ws = self.ws
+            if not restoring:
+                # Nothing goes out on a reopened socket before its session and conversation are restored
+                if self._reconnect_task is not None and not self._reconnect_task.done():
+                    await asyncio.shield(self._reconnect_task)
+                    continue
+                if self._reconnect and not self._closing and ws.closed:
+                    await self._recover(ws)
+                    continue
+            try:
+                await ws.send_str(data)
+                return
+            except (ClientError, ConnectionError):
+                if restoring or not self._reconnect or self._closing:
+                    raise
+                await self._recover(ws)
 
     async def recv(self) -> ServerMessageType | None:
-        if self.ws.closed:
-            return None
-        websocket_message = await self.ws.receive()
-        if websocket_message.type == WSMsgType.TEXT:
-            data = json.loads(websocket_message.data)
-            return create_message_from_dict(data)
+        while True:
+            ws = self.ws
+            if ws is None or self._closing:
+                return None
+            if ws.closed:
+                if not self._reconnect:
+                    return None
+                await self._recover(ws)
+                continue
+            websocket_message = await ws.receive()
+            if websocket_message.type == WSMsgType.TEXT:
+                if (recorder := self._recording()) is not None:
+                    recorder.record_received(websocket_message.data)
+                message = parse_server_message(websocket_message.data)
+                if self._reconnect:
+                    self._conversation.observe(message)
+                return message
+            if not (self._reconnect and ws.closed):
+                return None
+
+    async def _recover(self, failed_ws):
+        """Reconnect once for everyone that saw failed_ws drop."""
+        if self.ws is not failed_ws:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reopen(failed_ws))
+        await asyncio.shield(self._reconnect_task)
+
+    async def _reopen(self, failed_ws):
+        dropped_at = time.monotonic()
+        await failed_ws.close()
+        replay = self._conversation.replay()
+        restore = ([self._session_update] if self._session_update is not None else []) + replay
+        for delay in self._backoff.delays():
+            await asyncio.sleep(delay)
+            self.reconnect_attempts += 1
+            try:
+                await self.connect()
+                for message in restore:
+                    message_json = message.model_dump_json()
+                    if (recorder := self._recording()) is not None:
+                        recorder.record_sent(message_json)
+                    await self._send_str(message_json, restoring=True)
+                break
+            except (ClientError, OSError, asyncio.TimeoutError, AzureError):
+                # Refused, timed out, not authorized, or dropped again while restoring
+                await self.ws.close()
+                continue
         else:
-            return None
+            # Out of attempts: the client is closed, recv() returns None and sends fail
+            self._closing = True
+            return
+        self.replayed_items += len(replay)
+        self.reconnects += 1
+        self.downtime.record(time.monotonic() - dropped_at)
+
+    def describe_reconnects(self) -> str:
+        return (
+            f"reconnects: {self.reconnects}, attempts: {self.reconnect_attempts}, "
+            f"replayed items: {self.replayed_items}, {self.downtime.describe()}"
+        )
 
     def __aiter__(self) -> AsyncIterator[ServerMessageType | None]:
         return self
@@ -184,12 +326,22 @@ class RTLowLevelClient:
         return message
 
     async def close(self):
-        await self.ws.close()
+        self._closing = True
+        await self.scheduler.stop()
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
         await self._session.close()
+        # Last, once nothing is written or read any more
+        if self._recorder is not None:
+            self._recorder.close()
 
     @property
     def closed(self) -> bool:
-        return self.ws.closed
+        if self._reconnect and self.ws is not None:
+            return self._closing
+        return self.ws is None or self.ws.closed
 
     async def __aenter__(self):
         await self.connect()
@@ -216,10 +368,12 @@ class RTInputItem:
         audio_start_ms: int,
         has_transcription: bool,
         receive: Callable[[], Awaitable[Optional[ServerMessageType]]],
+        release: Optional[Callable[[], None]] = None,
     ):
         self.id = id
         self._has_transcription = has_transcription
         self._receive = receive
+        self._release = release
         self.previous_id: Optional[str] = None
         self.audio_start_ms = audio_start_ms
         self.audio_end_ms: Optional[int] = None
@@ -251,7 +405,15 @@ class RTInputItem:
                     case _:
                         pass
 
-        return resolve().__await__()
+        async def resolve_and_release():
+            try:
+                await resolve()
+            finally:
+                # Nothing more is read for this item
+                if self._release is not None:
+                    self._release()
+
+        return resolve_and_release().__await__()
 
 
 class RTOutputItem:
@@ -293,12 +455,19 @@ class RTResponse:
         id: str,
         previous_id: Optional[str],
         receive: Callable[[], Awaitable[Optional[ServerMessageType]]],
+        release: Optional[Callable[[], None]] = None,
+        pump: bool = False,
     ):
         self.id = id
         self.previous_id = previous_id
         self._receive = receive
+        self._release = release
         self._response_queue = MessageQueue(lambda: self._receive_response_message(), self._response_message_classifier)
         self._item_queue = MessageQueue(lambda: self._response_queue.receive("ITEM"), self._item_id_extractor)
+        if pump:
+            # Both pumps end once release() makes receive return None
+            self._response_queue.start_pump()
+            self._item_queue.start_pump()
 
     async def _receive_response_message(self):
         return await self._receive()
@@ -358,6 +527,8 @@ class RTResponse:
     async def __anext__(self):
         control_message = await self._response_queue.receive("RESPONSE")
         if control_message is None or control_message.type == "response.done":
+            if self._release is not None:
+                self._release()
             raise StopAsyncIteration
         if control_message.type == "response.output_item.added":
             item_id = control_message.item.id
@@ -373,8 +544,11 @@ class RTClient:
         key_credential: Optional[AzureKeyCredential] = None,
         model: Optional[str] = None,
         azure_deployment: Optional[str] = None,
+        pump: bool = True,
     ):
         self._client = RTLowLevelClient(url, token_credential, key_credential, model, azure_deployment)
+        # Read the session with long-lived pump tasks rather than poll tasks started by each receive
+        self._pump = pump
 
         self._message_queue = MessageQueue(self._receive_message, self._message_id_extractor)
 
@@ -521,7 +695,7 @@ class RTClient:
 
     async def send_audio(self, audio: bytes):
         base64_encoded = base64.b64encode(audio).decode("utf-8")
-        await self._client.send(InputAudioBufferAppendMessage(audio=base64_encoded))
+        await self._client.send_audio_append(base64_encoded)
 
     async def commit_audio(self):
         await self._client.send(InputAudioBufferCommitMessage())
@@ -536,37 +710,46 @@ class RTClient:
         await self._client.send(ResponseCreateMessage())
 
     async def control_messages(self) -> AsyncIterable[ServerMessageType]:
-        while True:
-            message = await self._message_queue.receive("SESSION")
-            if message is None:
-                break
+        async for message in self._message_queue.stream("SESSION"):
             yield message
 
     async def items(self) -> AsyncIterable[RTInputItem | RTResponse]:
-        while True:
-            message = await self._message_queue.receive("SESSION-ITEM")
-            if message is None:
-                break
-            elif message.type == "input_audio_buffer.speech_started":
+        async for message in self._message_queue.stream("SESSION-ITEM"):
+            if message.type == "input_audio_buffer.speech_started":
                 item_id = message.item_id
                 yield RTInputItem(
                     item_id,
                     message.audio_start_ms,
                     self._transcription_enabled,
                     lambda: self._item_queue.receive(item_id),
+                    lambda: self._item_queue.release(item_id),
                 )
             elif message.type == "response.created":
                 response_id = message.response.id
-                yield RTResponse(response_id, None, lambda: self._item_queue.receive(response_id))
+                yield RTResponse(
+                    response_id,
+                    None,
+                    lambda: self._item_queue.receive(response_id),
+                    lambda: self._item_queue.release(response_id),
+                    pump=self._pump,
+                )
             else:
                 raise ValueError(f"Unexpected message type {message.type}")
 
     async def connect(self):
         await self._client.connect()
+        if self._pump:
+            self._message_queue.start_pump()
+            self._item_queue.start_pump()
 
     async def close(self):
+        await self._item_queue.stop_pump()
+        await self._message_queue.stop_pump()
         await self._client.close()
 
+    def describe_queues(self) -> str:
+        return f"messages: {self._message_queue.describe()}; items: {self._item_queue.describe()}"
+
     async def __aenter__(self):
         await self.connect()
         return self
@@ -620,6 +803,7 @@ __all__ = [
     "ErrorMessage",
     "Session",
     "SessionCreatedMessage",
+    "SessionUpdatedMessage",
     "InputAudioBufferCommittedMessage",
     "InputAudioBufferClearedMessage",
     "InputAudioBufferSpeechStartedMessage",
@@ -666,4 +850,14 @@ __all__ = [
     "UserMessageType",
     "ServerMessageType",
     "create_message_from_dict",
+    "parse_server_message",
+    "UnknownServerMessage",
+    "MessageTemplate",
+    "Backoff",
+    "ConversationWindow",
+    "Priority",
+    "SendScheduler",
+    "SessionRecorder",
+    "SessionReplay",
+    "ReplayClient",
 ]
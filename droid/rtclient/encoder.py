@@ -0,0 +1,29 @@
+"""Pre-serialized JSON for client messages sent many times a second."""
+
+from pydantic import BaseModel
+
+from .models import InputAudioBufferAppendMessage
+
+_MARKER = "__droid_spliced_field__"
+
+
+class MessageTemplate:
+    """
+    The JSON of a client message in which only one string field changes, split around that field
+    once so that encode() is two string concatenations instead of building and dumping a model.
+
+    The value is spliced in verbatim, so it must be a string that JSON does not escape, such as
+    base64. Every other field keeps the value the template was built with.
+    """
+
+    def __init__(self, model_type: type[BaseModel], field: str, **fields):
+        message_json = model_type(**{field: _MARKER}, **fields).model_dump_json()
+        self.prefix, self.suffix = message_json.split(f'"{_MARKER}"')
+        self.prefix += '"'
+        self.suffix = '"' + self.suffix
+
+    def encode(self, value: str) -> str:
+        return self.prefix + value + self.suffix
+
+
+AUDIO_APPEND = MessageTemplate(InputAudioBufferAppendMessage, "audio")
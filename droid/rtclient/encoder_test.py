@@ -0,0 +1,45 @@
+import asyncio
+import base64
+import os
+
+import pytest
+
+from azure.core.credentials import AzureKeyCredential
+
+from droid.rtclient import InputAudioBufferAppendMessage, RTLowLevelClient
+from droid.rtclient.encoder import AUDIO_APPEND, MessageTemplate
+from droid.rtclient.models import ItemDeleteMessage
+
+# Empty, padded and unpadded base64, a 20 ms and a 100 ms PCM16 append at 24 kHz
+PAYLOADS = [base64.b64encode(os.urandom(size)).decode("utf-8") for size in (0, 1, 2, 3, 960, 4800)]
+
+
+@pytest.mark.parametrize("audio", PAYLOADS, ids=lambda audio: f"{len(audio)} chars")
+def test_audio_append_matches_model_dump_json(audio):
+    assert AUDIO_APPEND.encode(audio) == InputAudioBufferAppendMessage(audio=audio).model_dump_json()
+
+
+def test_template_keeps_the_other_fields():
+    template = MessageTemplate(ItemDeleteMessage, "item_id", event_id="event_7")
+    assert template.encode("item_1") == ItemDeleteMessage(item_id="item_1", event_id="event_7").model_dump_json()
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_str(self, data: str):
+        self.sent.append(data)
+
+
+def test_send_audio_append_sends_the_same_frame_as_send():
+    async def send_both():
+        client = RTLowLevelClient(key_credential=AzureKeyCredential("key"), model="gpt-4o-realtime-preview")
+        client.ws = RecordingWebSocket()
+        await client.send(InputAudioBufferAppendMessage(audio=PAYLOADS[-1]))
+        await client.send_audio_append(PAYLOADS[-1])
+        await client._session.close()
+        return client.ws.sent
+
+    sent = asyncio.run(send_both())
+    assert sent[0] == sent[1]
@@ -0,0 +1,397 @@
+"""
+A local stand-in for the Azure OpenAI realtime endpoint, for end-to-end runs and load tests
+without a deployment.
+
+    python -m droid.rtclient.mock_server [--port 8765] [--script events.jsonl] [--jitter-ms 0] [--drop-after N]
+
+Point AZURE_OPENAI_ENDPOINT (or a benchmark's --endpoint) at the printed URL. Any API key or
+bearer token is accepted.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+SESSION = {
+    "id": "sess_mock",
+    "object": "realtime.session",
+    "model": "gpt-4o-realtime-preview",
+    "expires_at": None,
+    "modalities": ["audio", "text"],
+    "instructions": "",
+    "voice": "alloy",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "input_audio_transcription": None,
+    "turn_detection": {"type": "server_vad", "threshold": 0.5, "prefix_padding_ms": 300, "silence_duration_ms": 500},
+    "tools": [],
+    "tool_choice": "auto",
+    "temperature": 0.8,
+    "max_response_output_tokens": "inf",
+}
+
+USAGE = {
+    "total_tokens": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "input_token_details": {"cached_tokens": 0, "text_tokens": 0, "audio_tokens": 0},
+    "output_token_details": {"text_tokens": 0, "audio_tokens": 0},
+}
+
+
+class Step:
+    """
+    Server events streamed interval seconds apart. With after set, the step waits until the
+    client has sent one more message of that type than earlier steps waited for, so two steps
+    after "response.create" answer the first and the second response.create.
+    """
+
+    def __init__(self, events: list[dict], after: Optional[str] = None, interval: float = 0.0):
+        self.events = events
+        self.after = after
+        self.interval = interval
+
+
+def user_speech(turn: int, transcript: str, speech_ms: int = 1500, previous_item_id: Optional[str] = None) -> list[dict]:
+    """What server VAD and transcription report for one utterance of the user."""
+    item_id = f"item_user_{turn}"
+    start_ms = turn * 10000
+    item = {"id": item_id, "object": "realtime.item", "type": "message", "status": "completed", "role": "user"}
+    return [
+        {"type": "input_audio_buffer.speech_started", "audio_start_ms": start_ms, "item_id": item_id},
+        {"type": "input_audio_buffer.speech_stopped", "audio_end_ms": start_ms + speech_ms, "item_id": item_id},
+        {"type": "input_audio_buffer.committed", "previous_item_id": previous_item_id, "item_id": item_id},
+        {
+            "type": "conversation.item.created",
+            "previous_item_id": previous_item_id,
+            "item": dict(item, content=[{"type": "input_audio", "transcript": None}]),
+        },
+        {
+            "type": "conversation.item.input_audio_transcription.completed",
+            "item_id": item_id,
+            "content_index": 0,
+            "transcript": transcript,
+        },
+    ]
+
+
+def tone(duration_ms: int, sample_rate: int = 24000, frequency: float = 440.0) -> bytes:
+    """PCM16 sine wave, so that what the client plays is audible and not silence."""
+    t = np.arange(sample_rate * duration_ms // 1000) / sample_rate
+    return (np.sin(2 * math.pi * frequency * t) * 8000).astype("<i2").tobytes()
+
+
+def audio_response(
+    index: int,
+    transcript: str,
+    audio_ms: int = 1000,
+    delta_ms: int = 50,
+    sample_rate: int = 24000,
+    previous_item_id: Optional[str] = None,
+) -> list[dict]:
+    """A spoken response of audio_ms, in response.audio.delta frames of delta_ms each."""
+    response_id = f"resp_{index}"
+    item_id = f"item_asst_{index}"
+    location = {"response_id": response_id, "item_id": item_id, "output_index": 0, "content_index": 0}
+    item = {"id": item_id, "object": "realtime.item", "type": "message", "status": "in_progress", "role": "assistant", "content": []}
+    part = {"type": "audio", "transcript": transcript}
+    done_item = dict(item, status="completed", content=[part])
+    audio = tone(audio_ms, sample_rate)
+    frame_bytes = sample_rate * delta_ms // 1000 * 2
+    frames = [audio[offset:offset + frame_bytes] for offset in range(0, len(audio), frame_bytes)]
+    words = transcript.split(" ")
+
+    events = [
+        {"type": "response.created", "response": _response(response_id, "in_progress", [])},
+        {"type": "response.output_item.added", "response_id": response_id, "output_index": 0, "item": item},
+        {"type": "conversation.item.created", "previous_item_id": previous_item_id, "item": item},
+        {"type": "response.content_part.added", **location, "part": dict(part, transcript="")},
+    ]
+    for frame_index, frame in enumerate(frames):
+        # Spread the transcript over the first frames, as the service sends it ahead of the audio
+        if frame_index < len(words):
+            word = words[frame_index] if frame_index == 0 else " " + words[frame_index]
+            events.append({"type": "response.audio_transcript.delta", **location, "delta": word})
+        events.append({"type": "response.audio.delta", **location, "delta": base64.b64encode(frame).decode("ascii")})
+    events += [
+        {"type": "response.audio.done", **location},
+        {"type": "response.audio_transcript.done", **location, "transcript": transcript},
+        {"type": "response.content_part.done", **location, "part": part},
+        {"type": "response.output_item.done", "response_id": response_id, "output_index": 0, "item": done_item},
+        {"type": "response.done", "response": _response(response_id, "completed", [done_item])},
+    ]
+    return events
+
+
+def function_call_response(index: int, name: str, arguments: dict, previous_item_id: Optional[str] = None) -> list[dict]:
+    """A response that calls the tool name, with the arguments streamed in a few deltas."""
+    response_id = f"resp_{index}"
+    item_id = f"item_call_{index}"
+    call_id = f"call_{index}"
+    arguments_json = json.dumps(arguments)
+    item = {
+        "id": item_id,
+        "object": "realtime.item",
+        "type": "function_call",
+        "status": "in_progress",
+        "name": name,
+        "call_id": call_id,
+        "arguments": "",
+    }
+    done_item = dict(item, status="completed", arguments=arguments_json)
+    location = {"response_id": response_id, "item_id": item_id, "output_index": 0, "call_id": call_id}
+    chunk = max(1, len(arguments_json) // 4)
+    return [
+        {"type": "response.created", "response": _response(response_id, "in_progress", [])},
+        {"type": "response.output_item.added", "response_id": response_id, "output_index": 0, "item": item},
+        {"type": "conversation.item.created", "previous_item_id": previous_item_id, "item": item},
+        *(
+            {"type": "response.function_call_arguments.delta", **location, "delta": arguments_json[offset:offset + chunk]}
+            for offset in range(0, len(arguments_json), chunk)
+        ),
+        {"type": "response.function_call_arguments.done", **location, "name": name, "arguments": arguments_json},
+        {"type": "response.output_item.done", "response_id": response_id, "output_index": 0, "item": done_item},
+        {"type": "response.done", "response": _response(response_id, "completed", [done_item])},
+    ]
+
+
+def _response(response_id: str, status: str, output: list[dict], status_details: Optional[dict] = None) -> dict:
+    return {
+        "object": "realtime.response",
+        "id": response_id,
+        "status": status,
+        "status_details": status_details,
+        "output": output,
+        "usage": USAGE if status != "in_progress" else None,
+    }
+
+
+def default_script(delta_ms: int = 50) -> list[Step]:
+    """
+    A conversation like the droid has: the user asks something, the droid answers, the user asks
+    about the droid, which calls get_your_info and answers once the tool output and response.create
+    come back. Audio deltas are paced at about real time.
+    """
+    interval = delta_ms / 1000
+    return [
+        Step(
+            user_speech(1, "Hello droid, how are you?")
+            + audio_response(1, "Beep boop! I'm running at full power.", delta_ms=delta_ms, previous_item_id="item_user_1"),
+            after="input_audio_buffer.append",
+            interval=interval,
+        ),
+        Step(
+            user_speech(2, "What is your name?", previous_item_id="item_asst_1")
+            + function_call_response(2, "get_your_info", {"query": "name"}, previous_item_id="item_user_2"),
+            after="input_audio_buffer.append",
+        ),
+        Step(
+            audio_response(3, "They call me Rubber Duck.", delta_ms=delta_ms, previous_item_id="item_call_2"),
+            after="response.create",
+            interval=interval,
+        ),
+    ]
+
+
+def load_script(path: Path, after: Optional[str] = "input_audio_buffer.append", interval: float = 0.0) -> list[Step]:
+    """
+    A recorded event stream, one JSON event per line, played back as a single step. The session
+    events are left out, the server sends its own.
+    """
+    events = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+    return [Step([event for event in events if not event["type"].startswith("session.")], after, interval)]
+
+
+class _Connection:
+    def __init__(self, ws: web.WebSocketResponse, request: web.Request, session: dict):
+        self.ws = ws
+        self.request = request
+        self.session = session
+        self.received: Counter[str] = Counter()
+        self.consumed: Counter[str] = Counter()
+        self.arrived = asyncio.Condition()
+        self.write_lock = asyncio.Lock()
+        self.cancel_requested = False
+        self.sent = 0
+
+
+class MockRealtimeServer:
+    """
+    Serves /openai/realtime (Azure) and /v1/realtime (OpenAI) over websockets, with any number
+    of concurrent connections. Each connection gets session.created, a session.updated for every
+    session.update (with the update applied), and then its own run through the script.
+
+    jitter adds up to that many seconds to every delay between streamed events. After drop_after
+    streamed events a connection is aborted without a close frame, like a network drop, for the
+    first max_drops connections that get that far. A response.cancel stops the response being
+    streamed and answers it with a cancelled response.done.
+    """
+
+    def __init__(
+        self,
+        script: Optional[list[Step]] = None,
+        jitter: float = 0.0,
+        drop_after: Optional[int] = None,
+        max_drops: int = 1,
+        session_lifetime: float = 30 * 60,
+        seed: Optional[int] = None,
+    ):
+        self.script = script if script is not None else default_script()
+        self.jitter = jitter
+        self.drop_after = drop_after
+        self.max_drops = max_drops
+        self.session_lifetime = session_lifetime
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._connections: list[_Connection] = []
+
+        self.connections = 0
+        self.drops = 0
+        self.events_sent = 0
+        self.received: Counter[str] = Counter()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/openai/realtime", self.handle)
+        app.router.add_get("/v1/realtime", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Listen on host and port (0 picks a free one) and return the endpoint URL."""
+        self._runner = web.AppRunner(self.make_app(), shutdown_timeout=1)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        # handle() drops each connection from the list as its socket closes
+        for connection in list(self._connections):
+            await connection.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def open_connections(self) -> int:
+        return sum(not connection.ws.closed for connection in self._connections)
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        if "api-key" not in request.headers and not request.headers.get("Authorization", "").startswith("Bearer "):
+            raise web.HTTPUnauthorized()
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        session = dict(SESSION, id=f"sess_mock_{self.connections}", expires_at=int(time.time() + self.session_lifetime))
+        connection = _Connection(ws, request, session)
+        self._connections.append(connection)
+        await self._send(connection, {"type": "session.created", "session": session})
+        stream_task = asyncio.create_task(self._stream(connection))
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    await self._receive(connection, json.loads(message.data))
+        finally:
+            stream_task.cancel()
+            self._connections.remove(connection)
+        return ws
+
+    async def _receive(self, connection: _Connection, message: dict):
+        self.received[message["type"]] += 1
+        if message["type"] == "session.update":
+            updates = {key: value for key, value in message.get("session", {}).items() if value is not None and key in SESSION}
+            connection.session.update(updates)
+            await self._send(connection, {"type": "session.updated", "session": connection.session})
+        elif message["type"] == "response.cancel":
+            connection.cancel_requested = True
+        async with connection.arrived:
+            connection.received[message["type"]] += 1
+            connection.arrived.notify_all()
+
+    async def _stream(self, connection: _Connection):
+        try:
+            await self._play(connection)
+        except ConnectionResetError:
+            pass
+
+    async def _play(self, connection: _Connection):
+        streamed = 0
+        for step in self.script:
+            if step.after is not None:
+                async with connection.arrived:
+                    await connection.arrived.wait_for(lambda: connection.received[step.after] > connection.consumed[step.after])
+                connection.consumed[step.after] += 1
+            connection.cancel_requested = False
+            cancelled_response = None
+            for event in step.events:
+                response_id = event.get("response_id") or event.get("response", {}).get("id")
+                if connection.cancel_requested and response_id is not None:
+                    cancelled_response = response_id
+                if cancelled_response is not None and response_id == cancelled_response:
+                    if event["type"] != "response.done":
+                        continue
+                    details = {"type": "cancelled", "reason": "client_cancelled"}
+                    event = {"type": "response.done", "response": _response(response_id, "cancelled", [], details)}
+                delay = step.interval + (self._random.uniform(0.0, self.jitter) if self.jitter else 0.0)
+                if delay:
+                    await asyncio.sleep(delay)
+                await self._send(connection, event)
+                streamed += 1
+                if streamed == self.drop_after and self.drops < self.max_drops:
+                    self.drops += 1
+                    connection.request.transport.abort()
+                    return
+
+    async def _send(self, connection: _Connection, event: dict):
+        connection.sent += 1
+        self.events_sent += 1
+        event = {"event_id": f"event_{connection.sent:05d}", **event}
+        async with connection.write_lock:
+            await connection.ws.send_str(json.dumps(event))
+
+    def describe(self) -> str:
+        return (
+            f"connections: {self.connections}, drops: {self.drops}, events sent: {self.events_sent}, "
+            f"messages received: {sum(self.received.values())}"
+        )
+
+
+async def serve(server: MockRealtimeServer, host: str, port: int):
+    url = await server.start(host, port)
+    print(f"Mock realtime endpoint at {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", type=Path, help="recorded server events, one JSON object per line, instead of the built-in conversation")
+    parser.add_argument("--interval-ms", type=float, default=0.0, help="delay between the events of a --script")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay before each event, up to this")
+    parser.add_argument("--drop-after", type=int, help="abort a connection after this many streamed events")
+    parser.add_argument("--max-drops", type=int, default=1, help="connections dropped at most")
+    args = parser.parse_args()
+    script = load_script(args.script, interval=args.interval_ms / 1000) if args.script else default_script()
+    server = MockRealtimeServer(script, jitter=args.jitter_ms / 1000, drop_after=args.drop_after, max_drops=args.max_drops)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, WSServerHandshakeError
+from azure.core.credentials import AzureKeyCredential
+
+from droid.rtclient import (
+    Backoff,
+    FunctionCallOutputItem,
+    ItemCreateMessage,
+    RTClient,
+    RTLowLevelClient,
+    RTResponse,
+    ResponseCancelMessage,
+    ResponseCreateMessage,
+    SessionUpdateMessage,
+    SessionUpdateParams,
+    UnknownServerMessage,
+    parse_server_message,
+)
+from droid.rtclient.mock_server import MockRealtimeServer, Step, audio_response, default_script, load_script
+
+
+def fast_script() -> list[Step]:
+    script = default_script()
+    for step in script:
+        step.interval = 0.0
+    return script
+
+
+@pytest_asyncio.fixture
+async def server():
+    mock = MockRealtimeServer(fast_script(), seed=1)
+    mock.url = await mock.start()
+    yield mock
+    await mock.stop()
+
+
+def make_client(url: str, **options) -> RTLowLevelClient:
+    return RTLowLevelClient(url, key_credential=AzureKeyCredential("key"), azure_deployment="droid", **options)
+
+
+async def receive_until(client: RTLowLevelClient, event_type: str) -> list:
+    messages = []
+    while True:
+        message = await asyncio.wait_for(client.recv(), 5)
+        assert message is not None, "connection closed"
+        messages.append(message)
+        if message.type == event_type:
+            return messages
+
+
+def test_scripted_events_match_the_models():
+    for step in default_script():
+        for event in step.events:
+            message = parse_server_message(json.dumps(dict(event, event_id="event_1")))
+            assert not isinstance(message, UnknownServerMessage), event["type"]
+
+
+def test_recorded_session_loads_without_its_session_events(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in [
+        {"type": "session.created", "session": {}},
+        {"type": "input_audio_buffer.speech_started", "audio_start_ms": 0, "item_id": "item_1"},
+    ]))
+    [step] = load_script(path)
+    assert [event["type"] for event in step.events] == ["input_audio_buffer.speech_started"]
+    assert step.after == "input_audio_buffer.append"
+
+
+@pytest.mark.asyncio
+async def test_client_runs_the_scripted_conversation(server):
+    client = make_client(server.url)
+    await client.connect()
+    await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="echo")))
+    messages = await receive_until(client, "session.updated")
+    assert [message.type for message in messages] == ["session.created", "session.updated"]
+    assert messages[1].session.voice == "echo"
+
+    await client.send_audio_append("AAAA")
+    first = await receive_until(client, "response.done")
+    assert first[0].type == "input_audio_buffer.speech_started"
+    assert sum(message.type == "response.audio.delta" for message in first) == 20
+    # The second question comes with more audio
+    await client.send_audio_append("AAAA")
+    call = (await receive_until(client, "response.done"))[-1].response.output[0]
+    assert (call.name, call.arguments) == ("get_your_info", '{"query": "name"}')
+
+    await client.send(ItemCreateMessage(item=FunctionCallOutputItem(call_id=call.call_id, output="Rubber Duck")))
+    await client.send(ResponseCreateMessage())
+    answer = await receive_until(client, "response.done")
+    assert answer[-1].response.id == "resp_3"
+    assert server.received["input_audio_buffer.append"] == 2
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_requests_without_credentials_are_refused(server):
+    async with ClientSession() as session:
+        with pytest.raises(WSServerHandshakeError) as error:
+            await session.ws_connect(f"{server.url}/openai/realtime")
+    assert error.value.status == 401
+
+
+@pytest.mark.asyncio
+async def test_concurrent_clients_each_get_the_script(server):
+    async def converse():
+        client = make_client(server.url)
+        await client.connect()
+        # Each append triggers one step; flush so that the scheduler doesn't merge them
+        for _ in range(2):
+            await client.send_audio_append("AAAA")
+            await client.flush()
+        for _ in range(2):
+            await receive_until(client, "response.done")
+        await client.close()
+
+    await asyncio.gather(*(converse() for _ in range(20)))
+    assert server.connections == 20
+    assert server.received["input_audio_buffer.append"] == 40
+
+
+@pytest.mark.asyncio
+async def test_stop_closes_every_open_connection():
+    server = MockRealtimeServer(fast_script())
+    url = await server.start()
+    clients = [make_client(url) for _ in range(5)]
+    for client in clients:
+        await client.connect()
+        await receive_until(client, "session.created")
+    assert server.open_connections == 5
+    # Without the runner, stop() only has its own loop to close the sockets with
+    runner, server._runner = server._runner, None
+    await server.stop()
+    assert server.open_connections == 0
+    server._runner = runner
+    await server.stop()
+    for client in clients:
+        assert await asyncio.wait_for(client.recv(), 5) is None
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_response_cancel_cuts_the_response_short(server):
+    server.script = [Step(audio_response(1, "A long answer.", audio_ms=5000), after="input_audio_buffer.append", interval=0.01)]
+    client = make_client(server.url)
+    await client.connect()
+    await client.send_audio_append("AAAA")
+    await receive_until(client, "response.audio.delta")
+    await client.send(ResponseCancelMessage())
+    messages = await receive_until(client, "response.done")
+    assert messages[-1].response.status == "cancelled"
+    assert sum(message.type == "response.audio.delta" for message in messages) < 99
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_dropped_connection_is_restored_by_the_client(server):
+    server.drop_after = 10
+    client = make_client(server.url, reconnect=True, backoff=Backoff(initial=0.01, maximum=0.05))
+    await client.connect()
+    await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="echo")))
+    await client.send_audio_append("AAAA")
+    messages = await receive_until(client, "session.updated")
+    messages += await receive_until(client, "session.updated")
+    assert [message.session.id for message in messages if message.type == "session.created"] == ["sess_mock_1", "sess_mock_2"]
+    assert server.drops == 1
+    assert client.reconnects == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pump", [True, False])
+async def test_rtclient_receives_responses_through_its_queues(server, pump):
+    async with RTClient(server.url, key_credential=AzureKeyCredential("key"), azure_deployment="droid", pump=pump) as client:
+        await client.configure(voice="echo")
+        for _ in range(2):
+            await client.send_audio(b"\0\0" * 480)
+            await asyncio.sleep(0.01)
+        chunks = []
+        async for item in client.items():
+            if isinstance(item, RTResponse):
+                async for output in item:
+                    async for chunk in output:
+                        chunks.append(chunk.type)
+                if item.id == "resp_2":
+                    break
+            else:
+                await item
+    assert chunks.count("audio") == 20
+    assert "tool_call_arguments" in chunks
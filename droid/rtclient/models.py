@@ -3,7 +3,7 @@
 
 from typing import Annotated, Any, Literal, Optional, Union
 
-from pydantic import AliasChoices, BaseModel, Field
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 
 Voice = Literal["alloy", "shimmer", "echo"]
 AudioFormat = Literal["pcm16", "g711-ulaw", "g711-alaw"]
@@ -248,6 +248,7 @@ class Session(BaseModel):
     temperature: Temperature
     # max_response_output_tokens: Optional[int]
     max_response_output_tokens: Optional[Union[int, Literal["inf"]]]
+    expires_at: Optional[int] = None
 
 
 class SessionCreatedMessage(ServerMessageBase):
@@ -573,6 +574,14 @@ class RateLimitsUpdatedMessage(ServerMessageBase):
     rate_limits: list[RateLimits]
 
 
+class UnknownServerMessage(ServerMessageBase):
+    """A server event of a type these models don't know yet, with all of its fields kept as extras."""
+
+    model_config = ConfigDict(extra="allow")
+
+    type: str
+
+
 UserMessageType = Annotated[
     Union[
         SessionUpdateMessage,
@@ -591,6 +600,7 @@ ServerMessageType = Annotated[
     Union[
         ErrorMessage,
         SessionCreatedMessage,
+        SessionUpdatedMessage,
         InputAudioBufferCommittedMessage,
         InputAudioBufferClearedMessage,
         InputAudioBufferSpeechStartedMessage,
@@ -620,62 +630,32 @@ ServerMessageType = Annotated[
 ]
 
 
-def create_message_from_dict(data: dict) -> ServerMessageType:
-    event_type = data.get("type")
-    match event_type:
-        case "error":
-            return ErrorMessage(**data)
-        case "session.created":
-            return SessionCreatedMessage(**data)
-        case "session.updated":
-            return SessionUpdatedMessage(**data)
-        case "input_audio_buffer.committed":
-            return InputAudioBufferCommittedMessage(**data)
-        case "input_audio_buffer.cleared":
-            return InputAudioBufferClearedMessage(**data)
-        case "input_audio_buffer.speech_started":
-            return InputAudioBufferSpeechStartedMessage(**data)
-        case "input_audio_buffer.speech_stopped":
-            return InputAudioBufferSpeechStoppedMessage(**data)
-        case "conversation.item.created":
-            return ItemCreatedMessage(**data)
-        case "conversation.item.truncated":
-            return ItemTruncatedMessage(**data)
-        case "conversation.item.deleted":
-            return ItemDeletedMessage(**data)
-        case "conversation.item.input_audio_transcription.completed":
-            return ItemInputAudioTranscriptionCompletedMessage(**data)
-        case "conversation.item.input_audio_transcription.failed":
-            return ItemInputAudioTranscriptionFailedMessage(**data)
-        case "response.created":
-            return ResponseCreatedMessage(**data)
-        case "response.done":
-            return ResponseDoneMessage(**data)
-        case "response.output_item.added":
-            return ResponseOutputItemAddedMessage(**data)
-        case "response.output_item.done":
-            return ResponseOutputItemDoneMessage(**data)
-        case "response.content_part.added":
-            return ResponseContentPartAddedMessage(**data)
-        case "response.content_part.done":
-            return ResponseContentPartDoneMessage(**data)
-        case "response.text.delta":
-            return ResponseTextDeltaMessage(**data)
-        case "response.text.done":
-            return ResponseTextDoneMessage(**data)
-        case "response.audio_transcript.delta":
-            return ResponseAudioTranscriptDeltaMessage(**data)
-        case "response.audio_transcript.done":
-            return ResponseAudioTranscriptDoneMessage(**data)
-        case "response.audio.delta":
-            return ResponseAudioDeltaMessage(**data)
-        case "response.audio.done":
-            return ResponseAudioDoneMessage(**data)
-        case "response.function_call_arguments.delta":
-            return ResponseFunctionCallArgumentsDeltaMessage(**data)
-        case "response.function_call_arguments.done":
-            return ResponseFunctionCallArgumentsDoneMessage(**data)
-        case "rate_limits.updated":
-            return RateLimitsUpdatedMessage(**data)
-        case _:
-            raise ValueError(f"Unknown event type: {event_type}")
+_server_message_adapter = TypeAdapter(ServerMessageType)
+
+
+def _is_unknown_type(error: ValidationError) -> bool:
+    return error.error_count() == 1 and error.errors()[0]["type"] == "union_tag_invalid"
+
+
+def parse_server_message(text: Union[str, bytes]) -> Union[ServerMessageType, UnknownServerMessage]:
+    """
+    Decode a server event straight from the websocket text in one pass. Event types missing from
+    ServerMessageType come back as UnknownServerMessage; anything else that doesn't validate
+    raises ValidationError.
+    """
+    try:
+        return _server_message_adapter.validate_json(text)
+    except ValidationError as error:
+        if _is_unknown_type(error):
+            return UnknownServerMessage.model_validate_json(text)
+        raise
+
+
+def create_message_from_dict(data: dict) -> Union[ServerMessageType, UnknownServerMessage]:
+    """Like parse_server_message, for an event that has already been decoded from JSON."""
+    try:
+        return _server_message_adapter.validate_python(data)
+    except ValidationError as error:
+        if _is_unknown_type(error):
+            return UnknownServerMessage.model_validate(data)
+        raise
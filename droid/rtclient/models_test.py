@@ -0,0 +1,48 @@
+import json
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from droid.rtclient import SessionUpdatedMessage, UnknownServerMessage, create_message_from_dict, parse_server_message
+
+SESSION = Path(__file__).parent / "testdata" / "session.jsonl"
+FRAMES = SESSION.read_text().splitlines()
+
+
+@pytest.mark.parametrize("frame", FRAMES, ids=lambda frame: json.loads(frame)["event_id"])
+def test_json_and_dict_decoding_agree(frame):
+    message = parse_server_message(frame)
+    assert type(message) is not UnknownServerMessage
+    assert message == create_message_from_dict(json.loads(frame))
+
+
+def test_session_updated_is_decoded():
+    frame = next(frame for frame in FRAMES if json.loads(frame)["type"] == "session.updated")
+    message = parse_server_message(frame)
+    assert isinstance(message, SessionUpdatedMessage)
+    assert message.session.voice == "alloy"
+
+
+def test_unknown_type_is_passed_through():
+    frame = '{"type": "response.reasoning.delta", "event_id": "event_1", "delta": "hmm", "output_index": 0}'
+    for message in (parse_server_message(frame), create_message_from_dict(json.loads(frame))):
+        assert isinstance(message, UnknownServerMessage)
+        assert message.type == "response.reasoning.delta"
+        assert message.event_id == "event_1"
+        assert message.model_extra == {"delta": "hmm", "output_index": 0}
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        '{"event_id": "event_1", "delta": "hmm"}',
+        '{"type": "response.text.delta", "event_id": "event_1"}',
+        '{"type": "response.reasoning.delta"}',
+        '{"type": "response.text.delta", ',
+    ],
+    ids=["missing type", "missing fields", "unknown type without event id", "truncated"],
+)
+def test_invalid_frames_are_rejected(frame):
+    with pytest.raises(ValidationError):
+        parse_server_message(frame)
@@ -0,0 +1,105 @@
+"""Reconnect policy and conversation replay for RTLowLevelClient."""
+
+import random
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from .models import (
+    AssistantMessageItem,
+    FunctionCallItem,
+    FunctionCallOutputItem,
+    InputTextContentPart,
+    Item,
+    ItemCreateMessage,
+    OutputTextContentPart,
+    SystemMessageItem,
+    UserMessageItem,
+)
+
+
+class Backoff:
+    """
+    Delays between reconnect attempts: the first attempt is immediate, after that the delay grows
+    by multiplier per attempt up to maximum, with full jitter so that clients dropped together
+    don't come back together. There are max_attempts delays, or no end to them with None.
+    """
+
+    def __init__(self, initial: float = 0.1, maximum: float = 5.0, multiplier: float = 2.0, max_attempts: Optional[int] = 10):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.max_attempts = max_attempts
+
+    def delays(self) -> Iterator[float]:
+        if self.max_attempts == 0:
+            return
+        yield 0.0
+        attempt = 0
+        while self.max_attempts is None or attempt + 1 < self.max_attempts:
+            yield random.uniform(0.0, min(self.maximum, self.initial * self.multiplier**attempt))
+            attempt += 1
+
+
+class ConversationWindow:
+    """
+    The most recent conversation items, rebuilt as client items so that they can be created
+    again in a fresh session after a reconnect.
+
+    Items are kept in conversation order, as announced by conversation.item.created, and filled
+    in once their content is final: the user's speech by its input_audio_transcription.completed
+    transcript, the assistant's by the transcript or text in response.output_item.done. Items
+    whose content never became known, such as speech that failed transcription, are skipped.
+    """
+
+    def __init__(self, max_items: int = 20):
+        self.max_items = max_items
+        self._items: OrderedDict[str, Optional[Item]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(item is not None for item in self._items.values())
+
+    def observe(self, message):
+        """Update the window from a server event. Events that don't concern items are ignored."""
+        match message.type:
+            case "conversation.item.created":
+                self._set(message.item.id, self._client_item(message.item))
+            case "response.output_item.done":
+                self._set(message.item.id, self._client_item(message.item))
+            case "conversation.item.input_audio_transcription.completed":
+                if message.transcript:
+                    self._set(message.item_id, UserMessageItem(content=[InputTextContentPart(text=message.transcript)]))
+            case "conversation.item.deleted":
+                self._items.pop(message.item_id, None)
+
+    def _set(self, item_id: str, item: Optional[Item]):
+        if item_id in self._items:
+            if item is not None:
+                self._items[item_id] = item
+            return
+        self._items[item_id] = item
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    @staticmethod
+    def _client_item(item) -> Optional[Item]:
+        if item.type == "function_call":
+            return FunctionCallItem(name=item.name, call_id=item.call_id, arguments=item.arguments) if item.arguments else None
+        if item.type == "function_call_output":
+            return FunctionCallOutputItem(call_id=item.call_id, output=item.output)
+        text = "".join(getattr(part, "text", None) or getattr(part, "transcript", None) or "" for part in item.content)
+        if not text:
+            return None
+        if item.role == "user":
+            return UserMessageItem(content=[InputTextContentPart(text=text)])
+        if item.role == "assistant":
+            return AssistantMessageItem(content=[OutputTextContentPart(text=text)])
+        return SystemMessageItem(content=[InputTextContentPart(text=text)])
+
+    def replay(self) -> list[ItemCreateMessage]:
+        """
+        Messages that recreate the window, oldest first. The window is emptied, since the new
+        session announces the replayed items again under new ids.
+        """
+        messages = [ItemCreateMessage(item=item) for item in self._items.values() if item is not None]
+        self._items.clear()
+        return messages
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientError, WSMsgType, web
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ClientAuthenticationError
+
+from droid.rtclient import (
+    Backoff,
+    ConversationWindow,
+    RTLowLevelClient,
+    SessionUpdateMessage,
+    SessionUpdateParams,
+    create_message_from_dict,
+)
+
+EVENTS = [json.loads(line) for line in (Path(__file__).parent / "testdata" / "session.jsonl").read_text().splitlines()]
+SESSION = EVENTS[0]["session"]
+
+
+def test_backoff_starts_immediately_and_grows_to_the_cap():
+    backoff = Backoff(initial=0.1, maximum=1.0, max_attempts=None)
+    delays = backoff.delays()
+    assert next(delays) == 0.0
+    for attempt in range(10):
+        assert 0.0 <= next(delays) <= min(1.0, 0.1 * 2**attempt)
+
+
+def test_backoff_ends_after_max_attempts():
+    assert len(list(Backoff(max_attempts=3).delays())) == 3
+    assert list(Backoff(max_attempts=0).delays()) == []
+
+
+def replayed(window: ConversationWindow) -> list[tuple]:
+    return [
+        (message.item.type, getattr(message.item, "role", None), getattr(message.item, "call_id", None))
+        for message in window.replay()
+    ]
+
+
+def test_window_rebuilds_the_recorded_conversation_in_order():
+    window = ConversationWindow()
+    for event in EVENTS:
+        window.observe(create_message_from_dict(event))
+    # The user's transcripts arrive after the replies but keep their place, the deleted function
+    # output and the cancelled reply with no transcript are left out
+    assert replayed(window) == [
+        ("message", "user", None),
+        ("message", "assistant", None),
+        ("message", "user", None),
+        ("function_call", None, "call_abc"),
+        ("message", "assistant", None),
+    ]
+    assert len(window) == 0
+
+
+def test_window_keeps_only_the_most_recent_items():
+    # The last three items are the function call, its output and the text reply, and the output was deleted
+    window = ConversationWindow(max_items=3)
+    for event in EVENTS:
+        window.observe(create_message_from_dict(event))
+    assert replayed(window) == [("function_call", None, "call_abc"), ("message", "assistant", None)]
+
+
+class DroppingServer:
+    """Fake realtime endpoint that records what each connection received and can drop it."""
+
+    def __init__(self):
+        self.received = []
+        self.requests = []
+        self.sockets = []
+        self.refuse = 0
+
+    async def handle(self, request):
+        if self.refuse:
+            self.refuse -= 1
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        received = []
+        self.received.append(received)
+        self.requests.append(request)
+        self.sockets.append(ws)
+        session = dict(SESSION, id=f"sess_{len(self.sockets)}")
+        await ws.send_str(json.dumps({"type": "session.created", "event_id": "event_0", "session": session}))
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            received.append(json.loads(message.data))
+            if received[-1]["type"] == "session.update":
+                await ws.send_str(json.dumps({"type": "session.updated", "event_id": "event_0", "session": session}))
+        return ws
+
+    def drop(self):
+        self.requests[-1].transport.abort()
+
+
+@pytest_asyncio.fixture
+async def server():
+    fake = DroppingServer()
+    app = web.Application()
+    app.router.add_get("/openai/realtime", fake.handle)
+    runner = web.AppRunner(app, shutdown_timeout=1)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    fake.url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    yield fake
+    await runner.cleanup()
+
+
+class ListRecorder:
+    def __init__(self):
+        self.sent = []
+
+    def record_sent(self, text: str):
+        self.sent.append(json.loads(text)["type"])
+
+    def record_received(self, text: str):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_client(server, reconnect: bool = True, max_attempts: int = 10, recorder=None) -> RTLowLevelClient:
+    return RTLowLevelClient(
+        server.url,
+        key_credential=AzureKeyCredential("key"),
+        azure_deployment="droid",
+        reconnect=reconnect,
+        backoff=Backoff(initial=0.01, maximum=0.05, max_attempts=max_attempts),
+        recorder=recorder,
+    )
+
+
+async def start_conversation(server, client) -> list[str]:
+    """Connect, configure the session and play the recorded conversation to the client."""
+    await client.connect()
+    await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="alloy")))
+    types = [(await client.recv()).type, (await client.recv()).type]
+    for event in EVENTS[2:]:
+        await server.sockets[-1].send_str(json.dumps(event))
+        types.append((await client.recv()).type)
+    return types
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_dropped_connection_is_restored_with_session_and_conversation(server):
+    client = make_client(server)
+    await start_conversation(server, client)
+    server.drop()
+
+    message = await client.recv()
+    assert message.type == "session.created"
+    assert message.session.id == "sess_2"
+    await wait_until(lambda: len(server.received) == 2 and len(server.received[1]) >= 6)
+    assert [event["type"] for event in server.received[1]] == ["session.update"] + ["conversation.item.create"] * 5
+    assert server.received[1][0] == server.received[0][0]
+    assert server.received[1][1]["item"]["content"][0]["text"] == "Hello droid, how are you?"
+    assert client.reconnects == 1
+    assert client.replayed_items == 5
+    assert client.downtime.max < 1.0
+    assert not client.closed
+    await client.close()
+    assert client.closed
+
+
+@pytest.mark.asyncio
+async def test_send_waits_for_the_reconnect(server):
+    client = make_client(server)
+    await start_conversation(server, client)
+    server.drop()
+    # Nobody is reading, so the drop shows up as a failed write
+    await asyncio.sleep(0.1)
+
+    await client.send_audio_append("AAAA")
+    await wait_until(lambda: len(server.received) == 2 and "input_audio_buffer.append" in [event["type"] for event in server.received[1]])
+    # The session is configured and the conversation restored before any new audio
+    assert server.received[1][0]["type"] == "session.update"
+    assert client.reconnects == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_refused_reconnects_back_off_and_retry(server):
+    client = make_client(server)
+    await start_conversation(server, client)
+    server.refuse = 3
+    server.drop()
+
+    assert (await client.recv()).type == "session.created"
+    assert client.reconnect_attempts == 4
+    assert client.reconnects == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_without_reconnect_a_drop_closes_the_client(server):
+    client = make_client(server, reconnect=False)
+    await start_conversation(server, client)
+    server.drop()
+
+    assert await client.recv() is None
+    assert client.closed
+    assert await client.recv() is None
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_restored_session_and_conversation_are_recorded(server):
+    recorder = ListRecorder()
+    client = make_client(server, recorder=recorder)
+    await start_conversation(server, client)
+    server.drop()
+
+    assert (await client.recv()).type == "session.created"
+    assert recorder.sent == ["session.update"] * 2 + ["conversation.item.create"] * 5
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_authentication_is_retried(server):
+    client = make_client(server)
+    await start_conversation(server, client)
+    get_auth = client._get_auth
+    failures = [ClientAuthenticationError("token expired"), asyncio.TimeoutError()]
+
+    async def failing_auth():
+        if failures:
+            raise failures.pop(0)
+        return await get_auth()
+
+    client._get_auth = failing_auth
+    server.drop()
+
+    assert (await client.recv()).type == "session.created"
+    assert client.reconnect_attempts == 3
+    assert client.reconnects == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_out_of_attempts_the_client_closes(server):
+    client = make_client(server, max_attempts=3)
+    await start_conversation(server, client)
+    server.refuse = 10
+    server.drop()
+
+    assert await client.recv() is None
+    assert client.closed
+    assert client.reconnect_attempts == 3
+    assert client.reconnects == 0
+    with pytest.raises((ClientError, ConnectionError)):
+        await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="alloy")))
+    await client.close()
@@ -0,0 +1,210 @@
+"""
+Record the realtime websocket traffic of a session to a compact binary file, and play it back.
+
+A recording starts with MAGIC and a header of the monotonic and wall clock time it was started
+at, followed by one record per frame:
+
+    u32 payload length | f64 time.monotonic() | u8 direction | u8 kind | payload
+
+all little-endian. A JSON record's payload is the frame text as UTF-8. An audio record, used
+for response.audio.delta and input_audio_buffer.append, stores the frame without its base64
+field (u32 length and the JSON, with the field set to null) followed by the raw audio bytes, so
+audio takes three quarters of the space and no base64 work to read. Records are only ever
+appended; a recording cut short by a crash loses at most its last, partial record.
+"""
+
+import asyncio
+import base64
+import datetime
+import json
+import mmap
+import os
+import struct
+import time
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from typing import Optional
+
+from .models import ServerMessageType, create_message_from_dict
+
+MAGIC = b"RTREC\x00\x01\x00"
+HEADER = struct.Struct("<dd")
+RECORD = struct.Struct("<IdBB")
+ENVELOPE = struct.Struct("<I")
+
+RECEIVED = 0
+SENT = 1
+JSON_FRAME = 0
+AUDIO_FRAME = 1
+
+# The field that carries base64 audio, by message type
+AUDIO_FIELDS = {"response.audio.delta": "delta", "input_audio_buffer.append": "audio"}
+_AUDIO_TYPES = [(f'"{message_type}"', field) for message_type, field in AUDIO_FIELDS.items()]
+
+
+class SessionRecorder:
+    """Append every frame sent and received to a recording at path, which must not exist yet."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "xb", buffering=64 * 1024)
+        self.started_at = time.monotonic()
+        self._file.write(MAGIC + HEADER.pack(self.started_at, time.time()))
+        self.frames = 0
+        self.audio_bytes = 0
+
+    @classmethod
+    def create(cls, base_dir: str) -> "SessionRecorder":
+        """A new recording in base_dir, named by the time like the log files."""
+        os.makedirs(base_dir, exist_ok=True)
+        name = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.rtrec"
+        return cls(os.path.join(base_dir, name))
+
+    def record_received(self, text: str, timestamp: Optional[float] = None):
+        self._record(RECEIVED, text, timestamp)
+
+    def record_sent(self, text: str, timestamp: Optional[float] = None):
+        self._record(SENT, text, timestamp)
+
+    def record_sent_audio(self, audio: str, timestamp: Optional[float] = None):
+        """input_audio_buffer.append of base64 audio, without building its JSON first."""
+        self._write_audio(SENT, {"type": "input_audio_buffer.append", "audio": None}, base64.b64decode(audio), timestamp)
+
+    def _record(self, direction: int, text: str, timestamp: Optional[float]):
+        for quoted_type, field in _AUDIO_TYPES:
+            if quoted_type in text:
+                data = json.loads(text)
+                if isinstance(data.get(field), str):
+                    audio = base64.b64decode(data[field])
+                    data[field] = None
+                    self._write_audio(direction, data, audio, timestamp)
+                    return
+                break
+        self._write(direction, JSON_FRAME, text.encode("utf-8"), timestamp)
+
+    def _write_audio(self, direction: int, envelope: dict, audio: bytes, timestamp: Optional[float]):
+        envelope_bytes = json.dumps(envelope, separators=(",", ":")).encode("utf-8")
+        self.audio_bytes += len(audio)
+        self._write(direction, AUDIO_FRAME, ENVELOPE.pack(len(envelope_bytes)) + envelope_bytes + audio, timestamp)
+
+    def _write(self, direction: int, kind: int, payload: bytes, timestamp: Optional[float]):
+        self._file.write(RECORD.pack(len(payload), time.monotonic() if timestamp is None else timestamp, direction, kind))
+        self._file.write(payload)
+        self.frames += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class RecordedFrame:
+    __slots__ = ("time", "direction", "data")
+
+    def __init__(self, time: float, direction: int, data: dict):
+        # Seconds since the recording started
+        self.time = time
+        self.direction = direction
+        self.data = data
+
+
+class SessionReplay:
+    """
+    A recording, memory-mapped. Iterating gives its frames as RecordedFrame objects with the
+    audio base64 encoded again, so data is what went over the wire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a realtime session recording")
+        self.started_at, self.wall_time = HEADER.unpack_from(self._mmap, len(MAGIC))
+
+    def __iter__(self) -> Iterator[RecordedFrame]:
+        return self.frames()
+
+    def frames(self, direction: Optional[int] = None) -> Iterator[RecordedFrame]:
+        buffer = self._mmap
+        offset = len(MAGIC) + HEADER.size
+        while offset + RECORD.size <= len(buffer):
+            length, timestamp, frame_direction, kind = RECORD.unpack_from(buffer, offset)
+            start = offset + RECORD.size
+            offset = start + length
+            if offset > len(buffer):
+                break
+            if direction is not None and frame_direction != direction:
+                continue
+            yield RecordedFrame(timestamp - self.started_at, frame_direction, self._decode(buffer, start, offset, kind))
+
+    @staticmethod
+    def _decode(buffer: mmap.mmap, start: int, end: int, kind: int) -> dict:
+        if kind == JSON_FRAME:
+            return json.loads(buffer[start:end])
+        (envelope_length,) = ENVELOPE.unpack_from(buffer, start)
+        audio_start = start + ENVELOPE.size + envelope_length
+        data = json.loads(buffer[start + ENVELOPE.size:audio_start])
+        data[AUDIO_FIELDS[data["type"]]] = base64.b64encode(buffer[audio_start:end]).decode("ascii")
+        return data
+
+    async def play(self, speed: float = 1.0, direction: Optional[int] = RECEIVED) -> AsyncIterator[RecordedFrame]:
+        """
+        The frames at the pace they were recorded, speed times faster. A speed of 0 plays them
+        as fast as they can be read.
+        """
+        start = time.monotonic()
+        first = None
+        for frame in self.frames(direction):
+            if first is None:
+                first = frame.time
+            if speed > 0:
+                delay = start + (frame.time - first) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield frame
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayClient:
+    """
+    Stands in for RTLowLevelClient in receive_messages: recv() returns the recorded server
+    events, parsed with create_message_from_dict, at the recorded pace, and what the handlers
+    send is collected in sent. A session.created after the first one counts as a reconnect.
+    """
+
+    def __init__(self, replay: SessionReplay, speed: float = 1.0):
+        self._frames = replay.play(speed)
+        self.closed = False
+        self.sent = []
+        self.sessions = 0
+
+    async def recv(self) -> Optional[ServerMessageType]:
+        try:
+            frame = await anext(self._frames)
+        except StopAsyncIteration:
+            self.closed = True
+            return None
+        if frame.data.get("type") == "session.created":
+            self.sessions += 1
+        return create_message_from_dict(frame.data)
+
+    def describe_reconnects(self) -> str:
+        return f"replayed reconnects: {max(0, self.sessions - 1)}"
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def send_audio_append(self, audio: str):
+        self.sent.append(audio)
+
+    async def close(self):
+        self.closed = True
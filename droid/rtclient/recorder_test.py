@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+from azure.core.credentials import AzureKeyCredential
+
+from droid.rtclient import RTLowLevelClient, SessionUpdateMessage, SessionUpdateParams
+from droid.rtclient.mock_server import MockRealtimeServer, default_script
+from droid.rtclient.recorder import RECEIVED, SENT, ReplayClient, SessionRecorder, SessionReplay
+
+CORPUS = Path(__file__).parent / "testdata" / "session.jsonl"
+FRAMES = CORPUS.read_text().splitlines()
+
+
+def record_corpus(path: Path, interval: float = 0.01) -> SessionRecorder:
+    recorder = SessionRecorder(str(path))
+    for index, frame in enumerate(FRAMES):
+        recorder.record_received(frame, timestamp=recorder.started_at + index * interval)
+    recorder.record_sent('{"type":"response.create","response":null}', timestamp=recorder.started_at + len(FRAMES) * interval)
+    recorder.record_sent_audio("AAECAwQF", timestamp=recorder.started_at + len(FRAMES) * interval)
+    recorder.close()
+    return recorder
+
+
+def test_frames_come_back_as_recorded(tmp_path):
+    path = tmp_path / "session.rtrec"
+    recorder = record_corpus(path)
+    with SessionReplay(str(path)) as replay:
+        frames = list(replay)
+    assert [frame.data for frame in frames[:len(FRAMES)]] == [json.loads(frame) for frame in FRAMES]
+    assert [frame.direction for frame in frames] == [RECEIVED] * len(FRAMES) + [SENT, SENT]
+    assert frames[-1].data == {"type": "input_audio_buffer.append", "audio": "AAECAwQF"}
+    assert frames[1].time == pytest.approx(0.01)
+    assert recorder.frames == len(FRAMES) + 2
+
+
+def test_audio_is_stored_as_raw_bytes(tmp_path):
+    path = tmp_path / "session.rtrec"
+    recorder = record_corpus(path)
+    text_size = sum(len(frame) for frame in FRAMES)
+    audio_base64 = sum(len(json.loads(frame)["delta"]) for frame in FRAMES if '"response.audio.delta"' in frame)
+    assert recorder.audio_bytes == audio_base64 * 3 // 4 + 6
+    # The base64 overhead of the audio is gone
+    assert os.path.getsize(path) < text_size - audio_base64 // 5
+
+
+def test_partial_last_record_is_skipped(tmp_path):
+    path = tmp_path / "session.rtrec"
+    record_corpus(path)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 3)
+    with SessionReplay(str(path)) as replay:
+        assert len(list(replay.frames(SENT))) == 1
+        assert len(list(replay.frames(RECEIVED))) == len(FRAMES)
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "session.jsonl"
+    path.write_text(FRAMES[0])
+    with pytest.raises(ValueError):
+        SessionReplay(str(path))
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_the_recorded_pace(tmp_path):
+    path = tmp_path / "session.rtrec"
+    record_corpus(path, interval=0.02)
+    with SessionReplay(str(path)) as replay:
+        recorded = replay.frames(RECEIVED)
+        duration = list(recorded)[-1].time
+        for speed, expected in ((10.0, duration / 10), (0.0, 0.0)):
+            start = time.monotonic()
+            count = 0
+            async for _ in replay.play(speed):
+                count += 1
+            assert count == len(FRAMES)
+            assert expected <= time.monotonic() - start < expected + 0.5
+
+
+@pytest.mark.asyncio
+async def test_recorded_client_session_replays_through_the_models(tmp_path):
+    script = default_script()
+    for step in script:
+        step.interval = 0.0
+    server = MockRealtimeServer(script[:1])
+    url = await server.start()
+    recorder = SessionRecorder.create(str(tmp_path))
+    client = RTLowLevelClient(url, key_credential=AzureKeyCredential("key"), azure_deployment="droid", recorder=recorder)
+    await client.connect()
+    await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="echo")))
+    await client.send_audio_append("AAAA")
+    received = []
+    while not received or received[-1].type != "response.done":
+        received.append(await client.recv())
+    await client.close()
+    await server.stop()
+
+    with SessionReplay(recorder.path) as replay:
+        assert [frame.data["type"] for frame in replay.frames(SENT)] == ["session.update", "input_audio_buffer.append"]
+        replay_client = ReplayClient(replay, speed=0)
+        replayed = []
+        while (message := await replay_client.recv()) is not None:
+            replayed.append(message)
+        assert replay_client.closed
+    assert [message.model_dump() for message in replayed] == [message.model_dump() for message in received]
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_recorded_once_the_client_is_closed(tmp_path):
+    server = MockRealtimeServer([])
+    url = await server.start()
+    recorder = SessionRecorder.create(str(tmp_path))
+    client = RTLowLevelClient(url, key_credential=AzureKeyCredential("key"), azure_deployment="droid", recorder=recorder)
+    await client.connect()
+    await client.send_audio_append("AAAA")
+    await client.close()
+    frames = recorder.frames
+    # The send task of a conversation can still be running when the client closes
+    await client.send_audio_append("AAAA")
+    with pytest.raises(ConnectionResetError):
+        await client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="echo")))
+    assert recorder.frames == frames
+    await server.stop()
@@ -0,0 +1,202 @@
+"""One writer for the realtime websocket, sending queued messages by priority class."""
+
+import asyncio
+import base64
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Awaitable, Callable, Optional
+
+from ..metrics import LatencyHistogram
+from .encoder import AUDIO_APPEND
+
+
+class Priority(IntEnum):
+    CONTROL = 0
+    TOOL = 1
+    AUDIO = 2
+
+
+# Session and input buffer control goes first. Everything else that isn't audio keeps its order
+# in the TOOL class: a response.create still follows the tool output it answers, and a
+# response.cancel and the truncate after it can't overtake a response.create queued before them.
+MESSAGE_PRIORITIES = {
+    "session.update": Priority.CONTROL,
+    "input_audio_buffer.clear": Priority.CONTROL,
+    "input_audio_buffer.append": Priority.AUDIO,
+    "input_audio_buffer.commit": Priority.AUDIO,
+}
+
+
+def priority_of(message_type: str) -> Priority:
+    return MESSAGE_PRIORITIES.get(message_type, Priority.TOOL)
+
+
+def merge_audio(chunks: list[str]) -> str:
+    """Join base64 audio chunks into one payload."""
+    # Base64 of whole 3-byte groups has no padding and concatenates as is
+    if not any(chunk.endswith("=") for chunk in chunks[:-1]):
+        return "".join(chunks)
+    return base64.b64encode(b"".join(base64.b64decode(chunk) for chunk in chunks)).decode("ascii")
+
+
+class SendScheduler:
+    """
+    Queue outbound messages per priority class and write them from a single task, always taking
+    the oldest message of the highest class that has one: control before tool results before
+    audio. Within a class the order is kept.
+
+    send() waits for its message to be written and raises what the write raised. The control and
+    tool queues hold queue_limit messages each; beyond that send() waits for room, which is the
+    backpressure on the callers when the socket can't keep up.
+
+    Audio chunks from send_audio() are not waited for, the capture loop must not stall. When the
+    audio queue holds audio_limit entries the oldest chunk is dropped, and when chunks have piled
+    up behind a slow write they go out merged into appends of up to merge_limit base64
+    characters, which also bounds how long a control message waits for the write in progress.
+    Audio class messages sent with send(), such as input_audio_buffer.commit, keep their place
+    among the chunks and are never dropped or merged. A failed audio write is raised from the
+    next send_audio().
+
+    queue_delay records, per class, how long messages waited between being queued and written.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        queue_limit: int = 64,
+        audio_limit: int = 100,
+        merge_limit: int = 32 * 1024,
+    ):
+        self._send = send
+        self.audio_limit = audio_limit
+        self.merge_limit = merge_limit
+        # Entries are (queued at, message json, future); audio chunks have base64 audio and no future
+        self._queues: dict[Priority, deque[tuple[float, str, Optional[asyncio.Future]]]] = {
+            priority: deque() for priority in Priority
+        }
+        self._room = {priority: asyncio.Semaphore(queue_limit) for priority in (Priority.CONTROL, Priority.TOOL)}
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._audio_error: Optional[BaseException] = None
+
+        self.dropped_audio = 0
+        self.merged_audio = 0
+        self.queue_delay = {priority: LatencyHistogram(f"{priority.name.lower()} queue delay") for priority in Priority}
+
+    async def send(self, data: str, priority: Priority):
+        if priority in self._room:
+            await self._room[priority].acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append((time.monotonic(), data, future))
+        self._start_writing()
+        await future
+
+    def send_audio(self, audio: str):
+        """Queue base64 audio for an input_audio_buffer.append."""
+        if self._audio_error is not None:
+            error, self._audio_error = self._audio_error, None
+            raise error
+        audio_queue = self._queues[Priority.AUDIO]
+        if len(audio_queue) >= self.audio_limit:
+            self._drop_audio(1)
+        audio_queue.append((time.monotonic(), audio, None))
+        self._start_writing()
+
+    def discard_audio(self):
+        """Drop the audio chunks that haven't been written, as input_audio_buffer.clear would."""
+        self._drop_audio(len(self._queues[Priority.AUDIO]))
+
+    def _drop_audio(self, count: int):
+        audio_queue = self._queues[Priority.AUDIO]
+        kept = deque()
+        while audio_queue and count:
+            entry = audio_queue.popleft()
+            if entry[2] is None:
+                self.dropped_audio += 1
+                count -= 1
+            else:
+                kept.append(entry)
+        audio_queue.extendleft(reversed(kept))
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        await self._idle.wait()
+
+    def _start_writing(self):
+        self._idle.clear()
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        while True:
+            priority = next((priority for priority in Priority if self._queues[priority]), None)
+            if priority is None:
+                self._idle.set()
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            enqueued_at, data, future = self._queues[priority].popleft()
+            now = time.monotonic()
+            self.queue_delay[priority].record(now - enqueued_at)
+            if priority in self._room:
+                self._room[priority].release()
+            if future is None:
+                data = AUDIO_APPEND.encode(self._merge_queued_audio(data, now))
+            self._writing = future
+            try:
+                await self._send(data)
+            except Exception as error:
+                if future is None:
+                    self._audio_error = error
+                elif not future.done():
+                    future.set_exception(error)
+                continue
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    def _merge_queued_audio(self, audio: str, now: float) -> str:
+        audio_queue = self._queues[Priority.AUDIO]
+        chunks = [audio]
+        size = len(audio)
+        while audio_queue and audio_queue[0][2] is None and size + len(audio_queue[0][1]) <= self.merge_limit:
+            enqueued_at, chunk, _ = audio_queue.popleft()
+            self.queue_delay[Priority.AUDIO].record(now - enqueued_at)
+            chunks.append(chunk)
+            size += len(chunk)
+        if len(chunks) == 1:
+            return audio
+        self.merged_audio += len(chunks) - 1
+        return merge_audio(chunks)
+
+    async def stop(self):
+        """Stop writing. Messages still queued fail with ConnectionResetError."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None and not self._writing.done():
+            self._writing.set_exception(ConnectionResetError("Realtime client closed"))
+        for queue in self._queues.values():
+            for _, _, future in queue:
+                if future is not None and not future.done():
+                    future.set_exception(ConnectionResetError("Realtime client closed"))
+            queue.clear()
+        self._idle.set()
+
+    def reset_statistics(self):
+        for histogram in self.queue_delay.values():
+            histogram.reset()
+
+    def describe(self) -> str:
+        return ", ".join(
+            [self.queue_delay[priority].describe() for priority in Priority]
+            + [f"dropped audio: {self.dropped_audio}, merged audio: {self.merged_audio}"]
+        )
@@ -0,0 +1,242 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from azure.core.credentials import AzureKeyCredential
+
+from droid.rtclient import (
+    InputAudioBufferClearMessage,
+    InputAudioBufferCommitMessage,
+    ItemCreateMessage,
+    ItemTruncateMessage,
+    FunctionCallOutputItem,
+    Priority,
+    RTLowLevelClient,
+    ResponseCancelMessage,
+    ResponseCreateMessage,
+    SendScheduler,
+)
+from droid.rtclient.scheduler import merge_audio, priority_of
+
+
+class GatedSocket:
+    """Collects what is written; writes wait while the gate is closed."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.fail = False
+
+    async def send(self, data: str):
+        await self.gate.wait()
+        if self.fail:
+            raise ConnectionResetError("socket closed")
+        self.sent.append(json.loads(data))
+
+    @property
+    def types(self) -> list[str]:
+        return [message["type"] for message in self.sent]
+
+
+def chunk(index: int) -> str:
+    # 3 bytes per chunk, so that the base64 has no padding
+    return base64.b64encode(bytes([index] * 3)).decode("ascii")
+
+
+async def block_writer(scheduler: SendScheduler, socket: GatedSocket) -> asyncio.Task:
+    """Have the writer stuck on a first message, so that everything after it queues up."""
+    socket.gate.clear()
+    first = asyncio.create_task(scheduler.send('{"type": "first"}', Priority.TOOL))
+    await asyncio.sleep(0.01)
+    return first
+
+
+def test_message_types_map_to_classes():
+    assert priority_of("session.update") == Priority.CONTROL
+    assert priority_of("response.cancel") == Priority.TOOL
+    assert priority_of("conversation.item.truncate") == Priority.TOOL
+    assert priority_of("conversation.item.create") == Priority.TOOL
+    assert priority_of("response.create") == Priority.TOOL
+    assert priority_of("input_audio_buffer.commit") == Priority.AUDIO
+
+
+def test_merge_audio_joins_padded_chunks():
+    chunks = [base64.b64encode(data).decode("ascii") for data in (b"a", b"bcde", b"fg")]
+    assert base64.b64decode(merge_audio(chunks)) == b"abcdefg"
+    assert merge_audio([chunk(1), chunk(2)]) == chunk(1) + chunk(2)
+
+
+@pytest.mark.asyncio
+async def test_higher_classes_overtake_queued_audio():
+    socket = GatedSocket()
+    scheduler = SendScheduler(socket.send, merge_limit=0)
+    first = await block_writer(scheduler, socket)
+    for index in range(3):
+        scheduler.send_audio(chunk(index))
+    tool = asyncio.create_task(scheduler.send('{"type": "conversation.item.create"}', Priority.TOOL))
+    create = asyncio.create_task(scheduler.send('{"type": "response.create"}', Priority.TOOL))
+    update = asyncio.create_task(scheduler.send('{"type": "session.update"}', Priority.CONTROL))
+    await asyncio.sleep(0.01)
+    socket.gate.set()
+    await asyncio.gather(first, tool, create, update)
+    await scheduler.flush()
+    assert socket.types == [
+        "first",
+        "session.update",
+        "conversation.item.create",
+        "response.create",
+    ] + ["input_audio_buffer.append"] * 3
+    assert [message["audio"] for message in socket.sent[4:]] == [chunk(0), chunk(1), chunk(2)]
+    assert scheduler.queue_delay[Priority.AUDIO].count == 3
+    assert scheduler.queue_delay[Priority.CONTROL].count == 1
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_audio_behind_a_slow_write_is_merged():
+    socket = GatedSocket()
+    scheduler = SendScheduler(socket.send, merge_limit=12)
+    first = await block_writer(scheduler, socket)
+    for index in range(5):
+        scheduler.send_audio(chunk(index))
+    socket.gate.set()
+    await first
+    await scheduler.flush()
+    assert [message["audio"] for message in socket.sent[1:]] == [
+        chunk(0) + chunk(1) + chunk(2),
+        chunk(3) + chunk(4),
+    ]
+    assert scheduler.merged_audio == 3
+    assert scheduler.queue_delay[Priority.AUDIO].count == 5
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_audio_queue_drops_the_oldest_chunks_but_not_a_commit():
+    socket = GatedSocket()
+    scheduler = SendScheduler(socket.send, audio_limit=3, merge_limit=0)
+    first = await block_writer(scheduler, socket)
+    scheduler.send_audio(chunk(0))
+    commit = asyncio.create_task(scheduler.send('{"type": "input_audio_buffer.commit"}', Priority.AUDIO))
+    await asyncio.sleep(0)
+    for index in range(1, 5):
+        scheduler.send_audio(chunk(index))
+    socket.gate.set()
+    await asyncio.gather(first, commit)
+    await scheduler.flush()
+    assert socket.types == ["first", "input_audio_buffer.commit", "input_audio_buffer.append", "input_audio_buffer.append"]
+    assert [message["audio"] for message in socket.sent[2:]] == [chunk(3), chunk(4)]
+    assert scheduler.dropped_audio == 3
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_holds_the_sender_back():
+    socket = GatedSocket()
+    scheduler = SendScheduler(socket.send, queue_limit=1)
+    first = await block_writer(scheduler, socket)
+    queued = asyncio.create_task(scheduler.send('{"type": "second"}', Priority.TOOL))
+    waiting = asyncio.create_task(scheduler.send('{"type": "third"}', Priority.TOOL))
+    await asyncio.sleep(0.01)
+    assert len(scheduler._queues[Priority.TOOL]) == 1
+    socket.gate.set()
+    await asyncio.gather(first, queued, waiting)
+    assert socket.types == ["first", "second", "third"]
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_write_errors_reach_the_sender():
+    socket = GatedSocket()
+    socket.fail = True
+    scheduler = SendScheduler(socket.send)
+    with pytest.raises(ConnectionResetError):
+        await scheduler.send('{"type": "response.create"}', Priority.TOOL)
+    scheduler.send_audio(chunk(0))
+    await scheduler.flush()
+    with pytest.raises(ConnectionResetError):
+        scheduler.send_audio(chunk(1))
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_fails_what_is_still_queued():
+    socket = GatedSocket()
+    scheduler = SendScheduler(socket.send)
+    first = await block_writer(scheduler, socket)
+    queued = asyncio.create_task(scheduler.send('{"type": "second"}', Priority.CONTROL))
+    await asyncio.sleep(0)
+    await scheduler.stop()
+    for task in (first, queued):
+        with pytest.raises(ConnectionResetError):
+            await task
+
+
+class FakeWebSocket(GatedSocket):
+    closed = False
+
+    async def send_str(self, data: str):
+        await self.send(data)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_client_sends_through_the_scheduler():
+    client = RTLowLevelClient(key_credential=AzureKeyCredential("key"), model="droid")
+    client.ws = FakeWebSocket()
+    client.ws.gate.clear()
+    tool_output = asyncio.create_task(
+        client.send(ItemCreateMessage(item=FunctionCallOutputItem(call_id="call_abc", output="sunny")))
+    )
+    await asyncio.sleep(0.01)
+    await client.send_audio_append(chunk(0))
+    response = asyncio.create_task(client.send(ResponseCreateMessage()))
+    cancel = asyncio.create_task(client.send(ResponseCancelMessage()))
+    commit = asyncio.create_task(client.send(InputAudioBufferCommitMessage()))
+    await asyncio.sleep(0.01)
+    # A clear discards the audio that hasn't gone out yet instead of sending it after the clear
+    clear = asyncio.create_task(client.send(InputAudioBufferClearMessage()))
+    await asyncio.sleep(0.01)
+    client.ws.gate.set()
+    await asyncio.gather(tool_output, response, cancel, commit, clear)
+    assert client.ws.types == [
+        "conversation.item.create",
+        "input_audio_buffer.clear",
+        "response.create",
+        "response.cancel",
+        "input_audio_buffer.commit",
+    ]
+    assert client.scheduler.dropped_audio == 1
+    assert "control queue delay: n=1" in client.describe_send_queues()
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cancel_does_not_overtake_a_queued_response_create():
+    client = RTLowLevelClient(key_credential=AzureKeyCredential("key"), model="droid")
+    client.ws = FakeWebSocket()
+    client.ws.gate.clear()
+    in_flight = asyncio.create_task(client.send(ResponseCreateMessage()))
+    await asyncio.sleep(0.01)
+    # The user barges in while a tool result and the response.create answering it are queued
+    tool_output = asyncio.create_task(
+        client.send(ItemCreateMessage(item=FunctionCallOutputItem(call_id="call_abc", output="sunny")))
+    )
+    response = asyncio.create_task(client.send(ResponseCreateMessage()))
+    cancel = asyncio.create_task(client.send(ResponseCancelMessage()))
+    truncate = asyncio.create_task(client.send(ItemTruncateMessage(item_id="item_1", content_index=0, audio_end_ms=500)))
+    await asyncio.sleep(0.01)
+    client.ws.gate.set()
+    await asyncio.gather(in_flight, tool_output, response, cancel, truncate)
+    assert client.ws.types == [
+        "response.create",
+        "conversation.item.create",
+        "response.create",
+        "response.cancel",
+        "conversation.item.truncate",
+    ]
+    await client.close()
@@ -0,0 +1,181 @@
+"""Keep a configured realtime session open ahead of time, so a conversation starts without connecting."""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+from ..metrics import LatencyHistogram
+from .models import ServerMessageType, SessionUpdateMessage
+
+if TYPE_CHECKING:
+    from . import RTLowLevelClient
+
+
+class PooledSession:
+    """A connected client whose session.update the server has already confirmed."""
+
+    def __init__(self, client: "RTLowLevelClient", events: list[ServerMessageType], setup_time: float, refresh_at: float):
+        self.client = client
+        # Server events received before the handover, oldest first
+        self.events = events
+        self.setup_time = setup_time
+        self.refresh_at = refresh_at
+        self.warm = False
+        self._watch_task: Optional[asyncio.Task] = None
+
+
+class SessionPool:
+    """
+    Open a realtime session, send it the session.update and wait for session.updated before
+    anyone asks for it, so that acquire() hands over a ready session instead of paying for TLS,
+    the websocket upgrade and session setup on every wake.
+
+    Once start()ed, a background task keeps one standby session. While it waits, the task reads
+    the socket, so pings are answered and a server side close is noticed, and events that arrive
+    are kept for whoever takes the session. refresh_margin seconds before the server's
+    expires_at (or max_age after setup, if the server sends none) a replacement is opened and
+    the old standby closed. A session that is handed over is replaced straight away.
+
+    acquire() opens a session on the spot when no standby is ready, which is also all the pool
+    does when it was never started.
+    """
+
+    def __init__(
+        self,
+        create_client: Callable[[], "RTLowLevelClient"],
+        session_update: SessionUpdateMessage,
+        refresh_margin: float = 60.0,
+        max_age: float = 25 * 60,
+        setup_timeout: float = 10.0,
+        retry_interval: float = 5.0,
+    ):
+        self._create_client = create_client
+        self._session_update = session_update
+        self.refresh_margin = refresh_margin
+        self.max_age = max_age
+        self.setup_timeout = setup_timeout
+        self.retry_interval = retry_interval
+        self._standby: Optional[PooledSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.warm_handovers = 0
+        self.cold_handovers = 0
+        self.refreshes = 0
+        self.lost_sessions = 0
+        self.setup_failures = 0
+        self.last_error: Optional[BaseException] = None
+        self.setup_time = LatencyHistogram("session setup")
+
+    @property
+    def ready(self) -> bool:
+        return self._standby is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_warm())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        standby, self._standby = self._standby, None
+        if standby is not None:
+            await self._discard(standby)
+
+    async def acquire(self) -> PooledSession:
+        """Take the standby session, or open one now. The caller owns and closes the client."""
+        session, self._standby = self._standby, None
+        if session is not None:
+            await self._stop_watching(session)
+            if not session.client.closed:
+                session.warm = True
+                self.warm_handovers += 1
+                return session
+            self.lost_sessions += 1
+            await session.client.close()
+        session = await self._open()
+        self.cold_handovers += 1
+        return session
+
+    async def _open(self) -> PooledSession:
+        start = time.monotonic()
+        client = self._create_client()
+        events = []
+        expires_at = None
+        try:
+            async with asyncio.timeout(self.setup_timeout):
+                await client.connect()
+                await client.send(self._session_update)
+                while True:
+                    message = await client.recv()
+                    if message is None:
+                        raise ConnectionError("Realtime session closed during setup")
+                    events.append(message)
+                    if message.type == "error":
+                        raise ConnectionError(f"Realtime session setup failed: {message.error.message}")
+                    if message.type in ("session.created", "session.updated"):
+                        expires_at = message.session.expires_at or expires_at
+                    if message.type == "session.updated":
+                        break
+        except BaseException:
+            await client.close()
+            raise
+        ready = time.monotonic()
+        lifetime = expires_at - time.time() if expires_at is not None else self.max_age
+        self.setup_time.record(ready - start)
+        # A session shorter lived than the margin still stands by for half of its life
+        return PooledSession(client, events, ready - start, ready + max(lifetime - self.refresh_margin, lifetime / 2))
+
+    async def _keep_warm(self):
+        while True:
+            try:
+                session = await self._open()
+            except Exception as error:
+                # Refused, timed out, not authorized or an unexpected event: standing by is only
+                # an optimisation, so any failure is counted and retried, never ends the task
+                self.setup_failures += 1
+                self.last_error = error
+                await asyncio.sleep(self.retry_interval)
+                continue
+            previous, self._standby = self._standby, session
+            if previous is not None:
+                await self._discard(previous)
+            session._watch_task = asyncio.create_task(self._watch(session))
+            done, _ = await asyncio.wait({session._watch_task}, timeout=max(0.0, session.refresh_at - time.monotonic()))
+            if not done:
+                # Open the replacement while this one can still be handed over
+                self.refreshes += 1
+            elif self._standby is session:
+                self._standby = None
+                self.lost_sessions += 1
+                await session.client.close()
+
+    async def _watch(self, session: PooledSession):
+        try:
+            while (message := await session.client.recv()) is not None:
+                session.events.append(message)
+        except Exception as error:
+            # The standby is lost either way; _keep_warm replaces it
+            self.last_error = error
+
+    async def _stop_watching(self, session: PooledSession):
+        if session._watch_task is not None and not session._watch_task.done():
+            session._watch_task.cancel()
+            try:
+                await session._watch_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _discard(self, session: PooledSession):
+        await self._stop_watching(session)
+        await session.client.close()
+
+    def describe(self) -> str:
+        return (
+            f"warm: {self.warm_handovers}, cold: {self.cold_handovers}, refreshes: {self.refreshes}, "
+            f"lost: {self.lost_sessions}, setup failures: {self.setup_failures}, {self.setup_time.describe()}"
+        )
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp import WSMsgType, web
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ClientAuthenticationError
+
+from droid.rtclient import RTLowLevelClient, SessionUpdateMessage, SessionUpdateParams
+from droid.rtclient.session_pool import SessionPool
+
+SESSION = {
+    "id": "sess_1",
+    "model": "gpt-4o-realtime-preview",
+    "modalities": ["audio", "text"],
+    "instructions": "",
+    "voice": "alloy",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "input_audio_transcription": None,
+    "turn_detection": {"type": "server_vad"},
+    "tools": [],
+    "tool_choice": "auto",
+    "temperature": 0.8,
+    "max_response_output_tokens": "inf",
+}
+
+
+class FakeRealtimeServer:
+    """Answers each connection with session.created and each session.update with session.updated."""
+
+    def __init__(self, lifetime: float = 1800):
+        self.lifetime = lifetime
+        self.sockets = []
+        self.updates = 0
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.append(ws)
+        session = dict(SESSION, expires_at=int(time.time() + self.lifetime))
+        await ws.send_str(json.dumps({"type": "session.created", "event_id": "event_1", "session": session}))
+        async for message in ws:
+            if message.type == WSMsgType.TEXT and json.loads(message.data)["type"] == "session.update":
+                self.updates += 1
+                await ws.send_str(json.dumps({"type": "session.updated", "event_id": "event_2", "session": session}))
+        return ws
+
+    @property
+    def open_sockets(self) -> int:
+        return sum(not ws.closed for ws in self.sockets)
+
+
+@pytest_asyncio.fixture
+async def server():
+    fake = FakeRealtimeServer()
+    app = web.Application()
+    app.router.add_get("/openai/realtime", fake.handle)
+    runner = web.AppRunner(app, shutdown_timeout=1)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    fake.url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    yield fake
+    await runner.cleanup()
+
+
+def make_pool(server, **options) -> SessionPool:
+    def create_client():
+        return RTLowLevelClient(server.url, key_credential=AzureKeyCredential("key"), azure_deployment="droid")
+
+    return SessionPool(create_client, SessionUpdateMessage(session=SessionUpdateParams(voice="alloy")), **options)
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_acquire_without_standby_opens_a_ready_session(server):
+    pool = make_pool(server)
+    session = await pool.acquire()
+    assert not session.warm
+    assert [message.type for message in session.events] == ["session.created", "session.updated"]
+    assert server.updates == 1
+    assert pool.cold_handovers == 1
+    await session.client.close()
+
+
+@pytest.mark.asyncio
+async def test_standby_session_is_handed_over_and_replaced(server):
+    pool = make_pool(server)
+    pool.start()
+    await wait_until(lambda: pool.ready)
+    session = await pool.acquire()
+    assert session.warm
+    assert not session.client.closed
+    await wait_until(lambda: pool.ready)
+    assert server.updates == 2
+
+    # The handed over session is the caller's to use
+    await session.client.send(SessionUpdateMessage(session=SessionUpdateParams(voice="echo")))
+    assert (await session.client.recv()).type == "session.updated"
+    await session.client.close()
+    await pool.stop()
+    await wait_until(lambda: server.open_sockets == 0)
+    assert pool.warm_handovers == 1
+
+
+@pytest.mark.asyncio
+async def test_standby_is_refreshed_before_it_expires(server):
+    server.lifetime = 2
+    pool = make_pool(server, refresh_margin=1.5)
+    pool.start()
+    await wait_until(lambda: pool.refreshes >= 1)
+    # The old standby stays ready until its replacement has connected and replaced it
+    await wait_until(lambda: len(server.sockets) >= 2 and pool.ready and server.open_sockets == 1)
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_standby_closed_by_the_server_is_replaced(server):
+    pool = make_pool(server)
+    pool.start()
+    await wait_until(lambda: pool.ready)
+    await server.sockets[0].close()
+    await wait_until(lambda: pool.lost_sessions == 1 and pool.ready)
+    session = await pool.acquire()
+    assert session.warm
+    assert not session.client.closed
+    await session.client.close()
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_authentication_is_retried(server):
+    failures = [ClientAuthenticationError("token expired"), ClientAuthenticationError("token expired")]
+
+    def create_client():
+        client = RTLowLevelClient(server.url, key_credential=AzureKeyCredential("key"), azure_deployment="droid")
+        if failures:
+            error = failures.pop(0)
+
+            async def connect():
+                raise error
+
+            client.connect = connect
+        return client
+
+    pool = SessionPool(create_client, SessionUpdateMessage(session=SessionUpdateParams(voice="alloy")), retry_interval=0.01)
+    pool.start()
+    await wait_until(lambda: pool.ready)
+    assert pool.setup_failures == 2
+    assert isinstance(pool.last_error, ClientAuthenticationError)
+    await pool.stop()
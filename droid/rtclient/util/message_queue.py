@@ -2,34 +2,102 @@
 # Licensed under the MIT license.
 
 import asyncio
-from collections.abc import Awaitable, Callable
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
 from typing import Generic, Optional, TypeVar
 
 T = TypeVar("T")
 
+# Messages kept for ids nobody is receiving yet, per id and in total. A long answer is a few
+# thousand audio deltas; beyond that the messages are for ids nobody will ask for, like the
+# deltas of a cancelled response, and the oldest go first.
+MAX_STORED_PER_ID = 10_000
+MAX_STORED = 50_000
+# Released ids remembered, so that what still arrives for them is discarded. Late messages only
+# trail a release by a round trip, so the oldest ids are forgotten first; should one still come
+# for a forgotten id, it is stored and evicted like any other.
+MAX_RELEASED = 1_000
+
 
 class MessageQueue(Generic[T]):
-    def __init__(self, receive_delegate: Callable[[], Awaitable[T]], id_extractor: Callable[[T], Optional[str]]):
-        self._stored_messages: dict[str, list[T]] = {}
-        self.waiting_receivers: dict[str, list[asyncio.Future]] = {}
+    """
+    Hands the messages read with receive_delegate to the receivers of their ids.
+
+    By default a poll task reads while anyone is waiting and stops when nobody is. After
+    start_pump(), one task reads until the source ends or stop_pump(), and receive() and
+    stream() only wait on what it hands over. Either way, messages for ids nobody is waiting
+    for are stored until they are received or release() drops the id.
+    """
+
+    def __init__(
+        self,
+        receive_delegate: Callable[[], Awaitable[T]],
+        id_extractor: Callable[[T], Optional[str]],
+        max_stored_per_id: int = MAX_STORED_PER_ID,
+        max_stored: int = MAX_STORED,
+        max_released: int = MAX_RELEASED,
+    ):
+        # In the order the ids first got a message stored, so the first id has held its
+        # messages the longest
+        self._stored_messages: dict[str, deque[T]] = {}
+        self.stored_count = 0
+        self.waiting_receivers: dict[str, deque[asyncio.Future]] = {}
+        self.waiting_count = 0
         self.is_polling: bool = False
         self.receive_delegate = receive_delegate
         self.id_extractor = id_extractor
         self.poll_task: Optional[asyncio.Task] = None
+        self.pump_task: Optional[asyncio.Task] = None
+        self.poll_tasks = 0
+        # Set once the pump has read the end of the source or failed reading it
+        self.ended = False
+        self.error: Optional[Exception] = None
+        # In the order the ids were released, used as an ordered set
+        self._released: dict[str, None] = {}
+        self.max_stored_per_id = max_stored_per_id
+        self.max_stored = max_stored
+        self.max_released = max_released
+        self.evicted = 0
+        self.unrouted = 0
+        self.discarded = 0
+        self.peak_stored = 0
 
     def _push_back(self, id: str, message: T):
-        if id not in self._stored_messages:
-            self._stored_messages[id] = []
-        self._stored_messages[id].append(message)
+        messages = self._stored_messages.get(id)
+        if messages is None:
+            messages = self._stored_messages[id] = deque()
+        elif len(messages) >= self.max_stored_per_id:
+            messages.popleft()
+            self.stored_count -= 1
+            self.evicted += 1
+        messages.append(message)
+        self.stored_count += 1
+        if self.stored_count > self.max_stored:
+            self._evict_oldest()
+        self.peak_stored = max(self.peak_stored, self.stored_count)
+
+    def _evict_oldest(self):
+        id, messages = next(iter(self._stored_messages.items()))
+        messages.popleft()
+        if not messages:
+            del self._stored_messages[id]
+        self.stored_count -= 1
+        self.evicted += 1
 
     def _pop_front(self, id: str) -> Optional[T]:
-        if id not in self._stored_messages:
+        messages = self._stored_messages.get(id)
+        if messages is None:
             return None
-        message = self._stored_messages[id].pop(0)
-        if not self._stored_messages[id]:
+        message = messages.popleft()
+        if not messages:
             del self._stored_messages[id]
+        self.stored_count -= 1
         return message
 
+    def stored_messages(self, id: str) -> int:
+        messages = self._stored_messages.get(id)
+        return len(messages) if messages is not None else 0
+
     async def poll_receive(self):
         if self.is_polling:
             return
@@ -42,7 +110,7 @@ class MessageQueue(Generic[T]):
                     self.notify_end_of_stream()
                     break
                 self.notify_receiver(message)
-                if self.get_all_waiting_receivers_count() == 0:
+                if self.waiting_count == 0:
                     break
         except Exception as error:
             self.notify_error(error)
@@ -50,12 +118,57 @@ class MessageQueue(Generic[T]):
             self.is_polling = False
             self.poll_task = None
 
+    def start_pump(self):
+        if self.pump_task is None:
+            self.pump_task = asyncio.create_task(self._pump())
+
+    async def stop_pump(self):
+        """Stop reading; receivers still waiting get None."""
+        if self.pump_task is None:
+            return
+        self.pump_task.cancel()
+        try:
+            await self.pump_task
+        except asyncio.CancelledError:
+            pass
+        self.ended = True
+        self.notify_end_of_stream()
+
+    async def _pump(self):
+        try:
+            while (message := await self.receive_delegate()) is not None:
+                self.notify_receiver(message)
+        except Exception as error:
+            self.error = error
+            self.ended = True
+            self.notify_error(error)
+            return
+        self.ended = True
+        self.notify_end_of_stream()
+
+    def release(self, id: str):
+        """Done with id: drop what is stored for it and discard whatever still comes for it."""
+        self._released[id] = None
+        if len(self._released) > self.max_released:
+            del self._released[next(iter(self._released))]
+        messages = self._stored_messages.pop(id, None)
+        if messages is not None:
+            self.stored_count -= len(messages)
+            self.discarded += len(messages)
+        futures = self.waiting_receivers.pop(id, None)
+        if futures is not None:
+            self.waiting_count -= len(futures)
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
     def notify_error(self, error: Exception):
         for futures in self.waiting_receivers.values():
             for future in futures:
                 if not future.done():
                     future.set_exception(error)
         self.waiting_receivers.clear()
+        self.waiting_count = 0
 
     def notify_end_of_stream(self):
         for futures in self.waiting_receivers.values():
@@ -63,35 +176,71 @@ class MessageQueue(Generic[T]):
                 if not future.done():
                     future.set_result(None)
         self.waiting_receivers.clear()
+        self.waiting_count = 0
 
     def notify_receiver(self, message: T):
         id = self.id_extractor(message)
         if id is None:
+            self.unrouted += 1
+            return
+        if id in self._released:
+            self.discarded += 1
             return
 
-        if id not in self.waiting_receivers:
+        futures = self.waiting_receivers.get(id)
+        if futures is None:
             self._push_back(id, message)
             return
 
-        future = self.waiting_receivers[id].pop(0)
-        if not self.waiting_receivers[id]:
+        future = futures.popleft()
+        if not futures:
             del self.waiting_receivers[id]
+        self.waiting_count -= 1
         future.set_result(message)
 
     def get_all_waiting_receivers_count(self) -> int:
-        return sum(len(futures) for futures in self.waiting_receivers.values())
+        return self.waiting_count
 
     async def receive(self, receiver_id: str) -> Optional[T]:
         found_message = self._pop_front(receiver_id)
         if found_message is not None:
             return found_message
+        if self.ended or receiver_id in self._released:
+            if self.error is not None:
+                raise self.error
+            return None
 
-        future = asyncio.Future()
-        if receiver_id not in self.waiting_receivers:
-            self.waiting_receivers[receiver_id] = []
-        self.waiting_receivers[receiver_id].append(future)
+        future = asyncio.get_running_loop().create_future()
+        futures = self.waiting_receivers.get(receiver_id)
+        if futures is None:
+            futures = self.waiting_receivers[receiver_id] = deque()
+        futures.append(future)
+        self.waiting_count += 1
 
-        if not self.is_polling and self.poll_task is None:
+        if self.pump_task is None and not self.is_polling and self.poll_task is None:
+            self.poll_tasks += 1
             self.poll_task = asyncio.create_task(self.poll_receive())
 
-        return await future
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # A receiver that gave up must not be handed the next message
+            futures = self.waiting_receivers.get(receiver_id)
+            if futures is not None and future in futures:
+                futures.remove(future)
+                if not futures:
+                    del self.waiting_receivers[receiver_id]
+                self.waiting_count -= 1
+            raise
+
+    async def stream(self, id: str) -> AsyncIterator[T]:
+        """The messages for id until the source ends or id is released."""
+        while (message := await self.receive(id)) is not None:
+            yield message
+
+    def describe(self) -> str:
+        return (
+            f"stored: {self.stored_count} in {len(self._stored_messages)} ids (peak {self.peak_stored}), "
+            f"evicted: {self.evicted}, discarded: {self.discarded}, unrouted: {self.unrouted}, "
+            f"waiting: {self.waiting_count}, poll tasks: {self.poll_tasks}"
+        )
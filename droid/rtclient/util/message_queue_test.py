@@ -1,7 +1,8 @@
 import asyncio
+from collections.abc import Awaitable, Callable
 
 import pytest
-from message_queue import MessageQueue
+from droid.rtclient.util.message_queue import MessageQueue
 
 
 class Message:
@@ -25,11 +26,11 @@ def message_queue():
 @pytest.mark.asyncio
 async def test_receive_existing_message(message_queue):
     message = Message("1", "Hello")
-    message_queue.messages.append(message)
+    message_queue.notify_receiver(message)
 
     result = await message_queue.receive("1")
     assert result == message
-    assert len(message_queue.messages) == 0
+    assert message_queue.stored_count == 0
 
 
 @pytest.mark.asyncio
@@ -46,7 +47,8 @@ async def test_receive_non_existing_message(message_queue):
 @pytest.mark.asyncio
 async def test_receive_multiple_messages(message_queue):
     messages = [Message("1", "First"), Message("2", "Second"), Message("3", "Third")]
-    message_queue.messages.extend(messages)
+    for message in messages:
+        message_queue.notify_receiver(message)
 
     result1 = await message_queue.receive("2")
     result2 = await message_queue.receive("1")
@@ -55,7 +57,7 @@ async def test_receive_multiple_messages(message_queue):
     assert result1 == messages[1]
     assert result2 == messages[0]
     assert result3 == messages[2]
-    assert len(message_queue.messages) == 0
+    assert message_queue.stored_count == 0
 
 
 @pytest.mark.asyncio
@@ -92,16 +94,17 @@ async def test_multiple_receivers_same_id(message_queue):
 @pytest.mark.asyncio
 async def test_id_extractor_returns_none(message_queue):
     message = Message("1", "Ignored")
-    message_queue.messages.append(message)
 
     def id_extractor(msg):
         return None
 
     message_queue.id_extractor = id_extractor
+    message_queue.notify_receiver(message)
 
     result = await message_queue.receive("1")
     assert result is None
-    assert len(message_queue.messages) == 1
+    assert message_queue.stored_count == 0
+    assert message_queue.unrouted == 1
 
 
 @pytest.mark.asyncio
@@ -169,3 +172,167 @@ async def test_concurrent_receive_calls(message_queue):
     assert [msg.content if msg else None for msg in results] == ["First", "Second", "Third", None]
     assert not message_queue.is_polling
     assert message_queue.poll_task is None
+
+
+def feed(messages: list) -> Callable[[], Awaitable]:
+    iterator = iter(messages)
+
+    async def receive_delegate():
+        return next(iterator, None)
+
+    return receive_delegate
+
+
+@pytest.mark.asyncio
+async def test_waiting_count_follows_the_receivers(message_queue):
+    message_queue.receive_delegate = feed([Message("2", "Second"), Message("1", "First")])
+    tasks = [asyncio.create_task(message_queue.receive(id)) for id in ("1", "1", "2")]
+    await asyncio.sleep(0)
+    assert message_queue.get_all_waiting_receivers_count() == 3
+    results = await asyncio.gather(*tasks)
+    assert [result.content if result else None for result in results] == ["First", None, "Second"]
+    assert message_queue.waiting_count == 0
+    assert not message_queue.waiting_receivers
+
+
+@pytest.mark.asyncio
+async def test_cancelled_receiver_is_not_handed_a_message(message_queue):
+    arrived = asyncio.Event()
+
+    async def receive_delegate():
+        await arrived.wait()
+        return Message("1", "First")
+
+    message_queue.receive_delegate = receive_delegate
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(message_queue.receive("1"), 0.01)
+    assert message_queue.waiting_count == 0
+    arrived.set()
+    await asyncio.sleep(0)
+    assert (await message_queue.receive("1")).content == "First"
+
+
+def test_messages_over_the_per_id_limit_evict_the_oldest():
+    queue = MessageQueue(feed([]), lambda message: message.id, max_stored_per_id=3)
+    for index in range(5):
+        queue.notify_receiver(Message("1", str(index)))
+    assert queue.stored_messages("1") == 3
+    assert queue.evicted == 2
+    assert [queue._pop_front("1").content for _ in range(3)] == ["2", "3", "4"]
+
+
+def test_messages_over_the_total_limit_evict_the_longest_held_id():
+    queue = MessageQueue(feed([]), lambda message: message.id, max_stored=4)
+    # Deltas of a cancelled response that nobody receives
+    for index in range(3):
+        queue.notify_receiver(Message("cancelled", str(index)))
+    for index in range(3):
+        queue.notify_receiver(Message("current", str(index)))
+    assert queue.stored_count == 4
+    assert queue.stored_messages("cancelled") == 1
+    assert queue.stored_messages("current") == 3
+    assert queue.peak_stored == 4
+    assert "evicted: 2" in queue.describe()
+
+
+@pytest.mark.asyncio
+async def test_stored_messages_at_scale():
+    ids = [str(index) for index in range(1000)]
+    messages = [Message(ids[index % len(ids)], index) for index in range(100_000)]
+    queue = MessageQueue(feed([]), lambda message: message.id, max_stored=len(messages))
+    for message in messages:
+        queue.notify_receiver(message)
+    assert queue.stored_count == 100_000
+    assert queue.evicted == 0
+    received = [await queue.receive(id) for id in ids for _ in range(100)]
+    assert [message.content for message in received[:100]] == list(range(0, 100_000, 1000))
+    assert queue.stored_count == 0
+    assert not queue._stored_messages
+
+
+@pytest.mark.asyncio
+async def test_waiting_receivers_at_scale():
+    ids = [str(index) for index in range(1000)]
+    queue = MessageQueue(feed([Message(ids[index % len(ids)], index) for index in range(100_000)]), lambda message: message.id)
+
+    async def receive_all(id: str) -> list:
+        return [(await queue.receive(id)).content for _ in range(100)]
+
+    results = await asyncio.gather(*(receive_all(id) for id in ids))
+    assert results[7] == list(range(7, 100_000, 1000))
+    assert queue.waiting_count == 0
+    assert queue.stored_count == 0
+    assert queue.unrouted == 0
+
+
+@pytest.mark.asyncio
+async def test_pump_reads_ahead_into_the_streams():
+    messages = [Message(id, index) for index, id in enumerate("abab")]
+    queue = MessageQueue(feed(messages), lambda message: message.id)
+    queue.start_pump()
+    await queue.pump_task
+    assert queue.ended
+    assert queue.stored_messages("a") == 2
+    assert [message.content async for message in queue.stream("a")] == [0, 2]
+    assert [message.content async for message in queue.stream("b")] == [1, 3]
+    assert await queue.receive("c") is None
+    assert queue.poll_tasks == 0
+
+
+@pytest.mark.asyncio
+async def test_released_id_drops_its_messages():
+    arrived = asyncio.Queue()
+    queue = MessageQueue(arrived.get, lambda message: message.id)
+    queue.start_pump()
+    arrived.put_nowait(Message("cancelled", 0))
+    arrived.put_nowait(Message("current", 1))
+    receiving = asyncio.create_task(queue.receive("cancelled"))
+    assert (await queue.receive("current")).content == 1
+    assert (await receiving).content == 0
+    waiting = asyncio.create_task(queue.receive("cancelled"))
+    await asyncio.sleep(0)
+    queue.release("cancelled")
+    assert await waiting is None
+    arrived.put_nowait(Message("cancelled", 2))
+    arrived.put_nowait(None)
+    await queue.pump_task
+    assert queue.discarded == 1
+    assert queue.stored_count == 0
+    assert await queue.receive("cancelled") is None
+
+
+def test_released_ids_are_remembered_up_to_the_limit():
+    queue = MessageQueue(feed([]), lambda message: message.id, max_released=3)
+    for index in range(10):
+        queue.release(f"response_{index}")
+    assert list(queue._released) == ["response_7", "response_8", "response_9"]
+    queue.notify_receiver(Message("response_9", 0))
+    assert queue.discarded == 1
+    # A message for an id released long ago is kept like one for an id not yet received
+    queue.notify_receiver(Message("response_0", 1))
+    assert queue.stored_messages("response_0") == 1
+
+
+@pytest.mark.asyncio
+async def test_pump_error_reaches_every_receiver():
+    async def receive_delegate():
+        raise ConnectionError("Test error")
+
+    queue = MessageQueue(receive_delegate, lambda message: message.id)
+    waiting = asyncio.create_task(queue.receive("1"))
+    queue.start_pump()
+    with pytest.raises(ConnectionError):
+        await waiting
+    with pytest.raises(ConnectionError):
+        async for _ in queue.stream("2"):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_stopped_pump_ends_the_streams():
+    queue = MessageQueue(asyncio.Queue().get, lambda message: message.id)
+    queue.start_pump()
+    streaming = asyncio.create_task(asyncio.wait_for(anext(queue.stream("1"), None), 5))
+    await asyncio.sleep(0)
+    await queue.stop_pump()
+    assert await streaming is None
@@ -0,0 +1,175 @@
+"""Entra ID access tokens for the Azure OpenAI clients, fetched ahead of expiry and served from memory."""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+from azure.core.credentials import AccessToken, TokenCredential
+
+from .metrics import LatencyHistogram
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class TokenCache:
+    """
+    Hold the current access token of a credential and renew it refresh_margin seconds before it
+    expires, so that connecting never waits for the identity endpoint.
+
+    get_token() returns the cached token while it is valid and, once it is inside the refresh
+    margin, starts a background refresh at most once at a time. Only when there is no usable
+    token at all does it wait, and concurrent callers then share a single fetch. start() adds a
+    task that refreshes on schedule even when nobody asks, and retries every retry_interval
+    seconds after a failure while the old token still works.
+
+    The credential is synchronous (azure.core TokenCredential), so async fetches run on a worker
+    thread. The async methods belong to the event loop that first calls them, and calling them
+    from another loop raises RuntimeError, since the refresh task lives on that loop. Once it is
+    closed the next loop takes over. token_provider() is the blocking variant for synchronous
+    clients and works from any thread or loop.
+    """
+
+    # A token this close to expiry is not handed out at all
+    MIN_VALIDITY = 30.0
+
+    def __init__(
+        self,
+        credential: TokenCredential,
+        scopes: tuple[str, ...] = (COGNITIVE_SERVICES_SCOPE,),
+        refresh_margin: float = 300.0,
+        retry_interval: float = 10.0,
+    ):
+        self._credential = credential
+        self._scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self._token: Optional[AccessToken] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.fetches = 0
+        self.failures = 0
+        self.waits = 0
+        self.last_error: Optional[BaseException] = None
+        self.fetch_time = LatencyHistogram("token fetch")
+
+    def _remaining(self, token: Optional[AccessToken]) -> float:
+        return token.expires_on - time.time() if token is not None else 0.0
+
+    def _fetch(self) -> AccessToken:
+        with self._lock:
+            start = time.perf_counter()
+            token = self._credential.get_token(*self._scopes)
+            self.fetch_time.record(time.perf_counter() - start)
+            self.fetches += 1
+            self._token = token
+            return token
+
+    def _bound_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is None or self._loop.is_closed():
+            # tasks of a closed loop will never finish
+            self._loop = loop
+            self._refresh_task = None
+            self._task = None
+        elif self._loop is not loop:
+            raise RuntimeError("TokenCache is bound to another event loop, use token_provider() from other loops")
+        return loop
+
+    def _refresh(self) -> asyncio.Task:
+        loop = self._bound_loop()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = loop.create_task(asyncio.to_thread(self._fetch))
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return self._refresh_task
+
+    def _refresh_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+            self.last_error = task.exception()
+
+    async def get_token(self) -> AccessToken:
+        self._bound_loop()
+        token = self._token
+        remaining = self._remaining(token)
+        if remaining > self.MIN_VALIDITY:
+            if remaining < self.refresh_margin:
+                self._refresh()
+            return token
+        self.waits += 1
+        return await asyncio.shield(self._refresh())
+
+    async def auth_headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {(await self.get_token()).token}"}
+
+    async def async_token_provider(self) -> str:
+        return (await self.get_token()).token
+
+    def token_provider(self) -> str:
+        """Blocking variant of get_token(), for synchronous clients and other threads."""
+        token = self._token
+        if self._remaining(token) <= self.MIN_VALIDITY:
+            self.waits += 1
+            token = self._fetch()
+        return token.token
+
+    def start(self):
+        loop = self._bound_loop()
+        if self._task is None:
+            self._task = loop.create_task(self._keep_fresh())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _keep_fresh(self):
+        while True:
+            if self._remaining(self._token) < self.refresh_margin:
+                try:
+                    await asyncio.shield(self._refresh())
+                except Exception:
+                    # counted by _refresh_done, the current token is used until it runs out
+                    await asyncio.sleep(self.retry_interval)
+                    continue
+            await asyncio.sleep(max(self.retry_interval, self._remaining(self._token) - self.refresh_margin))
+
+    def describe(self) -> str:
+        return (
+            f"expires in: {self._remaining(self._token):.0f} s, fetches: {self.fetches}, waits: {self.waits}, "
+            f"failures: {self.failures}, {self.fetch_time.describe()}"
+        )
+
+
+_shared_token_cache: Optional[TokenCache] = None
+
+
+def shared_token_cache() -> Optional[TokenCache]:
+    """
+    The process-wide token cache over azure-identity's DefaultAzureCredential, when
+    AZURE_OPENAI_USE_ENTRA_ID is set. The realtime client and the agent's chat model run in
+    separate processes, so each keeps its own. None means the clients use API keys, which is
+    also what happens when azure-identity is not installed.
+    """
+    global _shared_token_cache
+    if os.environ.get("AZURE_OPENAI_USE_ENTRA_ID", "").lower() not in ("1", "true", "yes"):
+        return None
+    if _shared_token_cache is None:
+        try:
+            from azure.identity import DefaultAzureCredential
+        except ImportError:
+            print(
+                "AZURE_OPENAI_USE_ENTRA_ID is set but azure-identity is not installed "
+                "(pip install azure-identity). Falling back to AZURE_OPENAI_API_KEY."
+            )
+            return None
+        _shared_token_cache = TokenCache(DefaultAzureCredential())
+    return _shared_token_cache
@@ -0,0 +1,166 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+from azure.core.credentials import AccessToken
+
+from droid.rtclient import RTLowLevelClient
+from droid import token_cache
+from droid.token_cache import TokenCache
+
+
+class FakeCredential:
+    """Issues token-1, token-2, ... valid for lifetime seconds. Fetches block while gate is cleared."""
+
+    def __init__(self, lifetime: float = 3600):
+        self.lifetime = lifetime
+        self.calls = 0
+        self.scopes = []
+        self.fail = False
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        self.gate.wait(5)
+        self.scopes.append(scopes)
+        if self.fail:
+            raise ConnectionError("identity endpoint unreachable")
+        self.calls += 1
+        return AccessToken(f"token-{self.calls}", int(time.time() + self.lifetime))
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_token_is_fetched_once_and_served_from_memory():
+    credential = FakeCredential()
+    cache = TokenCache(credential)
+    assert (await cache.get_token()).token == "token-1"
+    assert await cache.auth_headers() == {"Authorization": "Bearer token-1"}
+    assert await cache.async_token_provider() == "token-1"
+    assert cache.token_provider() == "token-1"
+    assert credential.calls == 1
+    assert credential.scopes == [("https://cognitiveservices.azure.com/.default",)]
+    assert cache.waits == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_fetch():
+    credential = FakeCredential()
+    credential.gate.clear()
+    cache = TokenCache(credential)
+    pending = asyncio.gather(*(cache.get_token() for _ in range(10)))
+    await asyncio.sleep(0.05)
+    credential.gate.set()
+    assert {token.token for token in await pending} == {"token-1"}
+    assert credential.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_token_inside_the_margin_is_served_while_refreshing():
+    credential = FakeCredential(lifetime=200)
+    cache = TokenCache(credential, refresh_margin=300)
+    await cache.get_token()
+    credential.gate.clear()
+    # The old token is still good for minutes, so nobody waits for its replacement
+    start = time.perf_counter()
+    assert (await cache.get_token()).token == "token-1"
+    assert (await cache.get_token()).token == "token-1"
+    assert time.perf_counter() - start < 0.1
+    credential.gate.set()
+    await wait_until(lambda: credential.calls == 2)
+    await wait_until(lambda: cache._refresh_task.done())
+    assert (await cache.get_token()).token == "token-2"
+    assert cache.waits == 1
+
+
+@pytest.mark.asyncio
+async def test_background_task_refreshes_before_expiry():
+    credential = FakeCredential(lifetime=32)
+    cache = TokenCache(credential, refresh_margin=32, retry_interval=0.05)
+    cache.start()
+    await wait_until(lambda: credential.calls >= 3)
+    assert cache.token_provider().startswith("token-")
+    await cache.stop()
+    assert cache.waits == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_the_valid_token_and_retries():
+    credential = FakeCredential(lifetime=200)
+    cache = TokenCache(credential, refresh_margin=300, retry_interval=0.05)
+    await cache.get_token()
+    credential.fail = True
+    cache.start()
+    await wait_until(lambda: cache.failures >= 2)
+    assert (await cache.get_token()).token == "token-1"
+    assert isinstance(cache.last_error, ConnectionError)
+    credential.fail = False
+    await wait_until(lambda: credential.calls >= 2)
+    await cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_not_handed_out():
+    credential = FakeCredential(lifetime=10)
+    cache = TokenCache(credential)
+    await cache.get_token()
+    assert (await cache.get_token()).token == "token-2"
+    credential.fail = True
+    with pytest.raises(ConnectionError):
+        await cache.get_token()
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bound_to_one_event_loop():
+    credential = FakeCredential()
+    cache = TokenCache(credential)
+    await cache.get_token()
+
+    def other_loop():
+        with pytest.raises(RuntimeError, match="another event loop"):
+            asyncio.run(cache.get_token())
+        # the blocking provider does not touch the loop
+        return cache.token_provider()
+
+    assert await asyncio.to_thread(other_loop) == "token-1"
+    assert credential.calls == 1
+
+
+def test_closed_event_loop_hands_the_cache_over():
+    credential = FakeCredential(lifetime=200)
+    cache = TokenCache(credential, refresh_margin=300)
+    # Inside the margin every call starts a refresh on the loop of the moment
+    for _ in range(3):
+        assert asyncio.run(cache.get_token()).token.startswith("token-")
+    assert credential.calls >= 2
+
+
+@pytest.mark.asyncio
+async def test_realtime_client_authenticates_from_the_cache():
+    credential = FakeCredential()
+    cache = TokenCache(credential)
+    clients = [
+        RTLowLevelClient("http://localhost", token_cache=cache, azure_deployment="droid"),
+        RTLowLevelClient("http://localhost", token_cache=cache, azure_deployment="droid"),
+    ]
+    for client in clients:
+        assert await client._get_auth() == {"Authorization": "Bearer token-1"}
+        await client.close()
+    assert credential.calls == 1
+
+
+def test_missing_azure_identity_falls_back_to_api_keys(monkeypatch, capsys):
+    monkeypatch.setenv("AZURE_OPENAI_USE_ENTRA_ID", "true")
+    monkeypatch.setattr(token_cache, "_shared_token_cache", None)
+    # A None entry makes the import raise ImportError, as when the package is not installed
+    monkeypatch.setitem(sys.modules, "azure.identity", None)
+    assert token_cache.shared_token_cache() is None
+    assert "azure-identity is not installed" in capsys.readouterr().out
@@ -5,21 +5,19 @@ import asyncio
 import base64
 import json
 import os
-import queue
 import sys
 import time
-import threading
+from dataclasses import dataclass
+from typing import Optional
 
 from azure.core.credentials import AzureKeyCredential
 from dotenv import load_dotenv
 import pyaudio
 
-import numpy as np
-from scipy.signal import resample
 from scipy.io.wavfile import write
 
 from .rtclient import (
-    InputAudioBufferAppendMessage,
+    Backoff,
     InputAudioTranscription,
     RTLowLevelClient,
     ServerVAD,
@@ -28,13 +26,43 @@ from .rtclient import (
     ResponseCreateMessage,
     ResponseCreateParams,
     ItemCreateMessage,
+    ItemTruncateMessage,
+    ResponseCancelMessage,
     FunctionCallOutputItem,
 )
+from .rtclient.recorder import SessionRecorder
+from .rtclient.session_pool import SessionPool
+from .audio import AppendBatcher, CaptureProcessor, DeltaDecoder, EchoCanceller, JitterBuffer, RingBuffer, StreamResampler, ThreadToLoopBridge, VoiceActivityGate
+from .audio.callback_stream import CaptureCallback, PlaybackCallback
+from .audio.device import negotiate_sample_rate
+from .audio.g711 import TRANSPORT_CODECS
 from .config import (
+    API_SAMPLE_RATE,
+    AUDIO_TRANSPORT_FORMAT,
+    REALTIME_SESSION_REFRESH_MARGIN,
+    REALTIME_RECONNECT,
+    REALTIME_RECONNECT_ATTEMPTS,
+    REALTIME_REPLAY_ITEMS,
+    REALTIME_AUDIO_QUEUE_LIMIT,
+    REALTIME_RECORD_DIR,
     INPUT_SAMPLE_RATE,
     INPUT_CHUNK_SIZE,
     OUTPUT_SAMPLE_RATE,
     OUTPUT_CHUNK_SIZE,
+    OUTPUT_SAMPLE_WIDTH,
+    INPUT_BUFFER_SECONDS,
+    OUTPUT_BUFFER_SECONDS,
+    PLAYOUT_TARGET_DELAY_MS,
+    PLAYOUT_MIN_DELAY_MS,
+    PLAYOUT_MAX_DELAY_MS,
+    AUDIO_APPEND_TARGET_MS,
+    ECHO_TAIL_MS,
+    LOCAL_VAD_ENABLED,
+    LOCAL_VAD_PREROLL_MS,
+    LOCAL_VAD_HANGOVER_MS,
+    LOCAL_VAD_MIN_RMS,
+    AUDIO_STATS_INTERVAL,
+    SERVER_EVENT_LOG_SAMPLING,
     STREAM_FORMAT,
     INPUT_CHANNELS,
     OUTPUT_CHANNELS,
@@ -46,13 +74,13 @@ from .config import (
     TOOL_CHOICE,
     TOOL_MAP
 )
-from .logger import Logger
-
-ai_last_talk_time = 0
+from .logger import EventLogSampler, Logger
+from .token_cache import shared_token_cache
 
 logger = Logger()
-audio_input_queue = queue.Queue()
-audio_output_queue = queue.Queue()
+event_log_sampler = EventLogSampler(SERVER_EVENT_LOG_SAMPLING)
+# Converts between those samples and the bytes carried in input_audio_buffer.append / response.audio.delta
+transport_codec = TRANSPORT_CODECS[AUDIO_TRANSPORT_FORMAT]
 execute_tool_queue = asyncio.Queue()
 client_event_queue = asyncio.Queue()
 
@@ -101,212 +129,290 @@ async def send_text_client_event(client: RTLowLevelClient):
         await client.send(message)
 
 
-def listen_audio(input_stream: pyaudio.Stream):
-    global ai_last_talk_time
-    while True:
-        audio_data = input_stream.read(INPUT_CHUNK_SIZE, exception_on_overflow=False)
-        if audio_data is None:
-            continue
+def describe_vad_gate(vad_gate: VoiceActivityGate) -> str:
+    streamed = vad_gate.passed_samples / max(vad_gate.processed_samples, 1)
+    return f"streamed: {streamed * 100:.1f}%, speech segments: {vad_gate.speech_segments}, noise floor: {vad_gate.noise_floor:.0f}"
 
-        # Check if it's been more than 1 second since AI last talked
-        if time.time() - ai_last_talk_time < 1:
-            print("AI is talking, skipping input audio")
-            continue
+async def send_audio(
+    client: RTLowLevelClient,
+    capture_processor: CaptureProcessor,
+    input_bridge: ThreadToLoopBridge,
+    capture_callback: CaptureCallback,
+    playback_callback: PlaybackCallback,
+):
+    echo_canceller = capture_processor.echo_canceller
+    audio_input_buffer = capture_processor.output
+    append_batcher = capture_processor.batcher
+    next_stats_time = time.monotonic() + AUDIO_STATS_INTERVAL
+    while not client.closed:
+        # The capture processor wakes us once it has gated new audio into audio_input_buffer,
+        # then the batcher decides what to send
+        await input_bridge.wait()
+        while sample_count := append_batcher.take(audio_input_buffer.fill):
+            audio_view = audio_input_buffer.peek(sample_count)
+            base64_audio = base64.b64encode(transport_codec.encode(audio_view)).decode("utf-8")
+            audio_input_buffer.consume(len(audio_view))
+            #await logger.info("Client | input_audio_buffer.append")
+            await client.send_audio_append(base64_audio)
+            await asyncio.sleep(0)
+        input_bridge.drained()
 
-        # resample audio data from 11025 Hz to 24000 Hz
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        resampled_audio_array = resample(audio_array, int(len(audio_array) * 24000 / 11025), )
-        resampled_audio_data = resampled_audio_array.astype(np.int16).tobytes()
+        if time.monotonic() >= next_stats_time:
+            next_stats_time += AUDIO_STATS_INTERVAL
+            await logger.info(f"Client | audio batching | {append_batcher.describe()}")
+            await logger.info(f"Client | audio gating | {describe_vad_gate(capture_processor.vad_gate)}")
+            await logger.info(f"Client | echo cancellation | ERLE: {echo_canceller.erle_db:.1f} dB, double-talk blocks: {echo_canceller.double_talk_blocks}")
+            echo_canceller.reset_statistics()
+            await logger.info(f"Client | capture processing | {capture_processor.describe()}")
+            capture_processor.reset_statistics()
+            await logger.info(f"Client | capture handoff | {input_bridge.describe()}")
+            await logger.info(f"Client | send queues | {client.describe_send_queues()}")
+            client.scheduler.reset_statistics()
+            input_bridge.loop_lag.reset()
+            input_bridge.handoff_latency.reset()
+            await logger.info(f"Client | audio callbacks | {capture_callback.describe()}, {playback_callback.describe()}")
+            await logger.info(f"Client | playout | {playback_callback.source.describe()}")
+            playback_callback.source.reset_statistics()
 
-        base64_audio = base64.b64encode(resampled_audio_data).decode("utf-8")
-        audio_input_queue.put(base64_audio)
+async def interrupt_response(client: RTLowLevelClient, delta_decoder: DeltaDecoder, response_id: str | None):
+    # Take the playback position before the flush, the flush skips the read position ahead
+    position = delta_decoder.output.playback_position()
+    delta_decoder.clear()
+    # Stop generating audio nobody will hear, and cut the assistant item to what was actually
+    # played so the server's transcript matches the user's
+    if response_id is not None:
+        await logger.info(f"Client | response.cancel | response_id: {response_id}")
+        await client.send(ResponseCancelMessage())
+    if position is not None:
+        item_id, content_index, played_samples = position
+        audio_end_ms = played_samples * 1000 // delta_decoder.output.sample_rate
+        await logger.info(f"Client | conversation.item.truncate | item_id: {item_id}, content_index: {content_index}, audio_end_ms: {audio_end_ms}")
+        await client.send(ItemTruncateMessage(item_id=item_id, content_index=content_index, audio_end_ms=audio_end_ms))
 
-async def send_audio(client: RTLowLevelClient):
-    while not client.closed:
-        base64_audio = await asyncio.get_event_loop().run_in_executor(None, audio_input_queue.get)
-        #await logger.info("Client | input_audio_buffer.append")
-        await client.send(InputAudioBufferAppendMessage(audio=base64_audio))
-        await asyncio.sleep(0)
+@dataclass
+class ServerEventContext:
+    """State shared by the server event handlers of one session."""
+    client: RTLowLevelClient
+    delta_decoder: DeltaDecoder
+    active_response_id: Optional[str] = None
+    interrupted_response_id: Optional[str] = None
+    session_id: Optional[str] = None
 
-def play_audio(output_stream: pyaudio.Stream):
-    global ai_last_talk_time
-    while True:
-        audio_data = audio_output_queue.get()
+# Log line builders by event type. They only run for the events event_log_sampler lets through,
+# so high-frequency deltas that are not logged cost a dictionary lookup and a counter
+server_event_log_formats = {
+    "session.created": lambda message: f"Server | session.created | model: {message.session.model}, session_id: {message.session.id}",
+    "error": lambda message: f"Server | error | error message:{message.error}",
+    "input_audio_buffer.committed": lambda message: f"Server | input_audio_buffer.committed | item_id:{message.item_id}",
+    "input_audio_buffer.cleared": lambda message: f"Server | input_audio_buffer.cleared | item_id: {message.item_id}",
+    "input_audio_buffer.speech_started": lambda message: f"Server | input_audio_buffer.speech_started | item_id: {message.item_id}, audio_start_ms: {message.audio_start_ms}",
+    "input_audio_buffer.speech_stopped": lambda message: f"Server | input_audio_buffer.speech_stopped | item_id: {message.item_id}, audio_end_ms: {message.audio_end_ms}",
+    "conversation.item.created": lambda message: f"Server | conversation.item.created | item_id: {message.item.id}, previous_item_id: {message.previous_item_id}",
+    "conversation.item.truncated": lambda message: f"Server | conversation.item.truncated | item_id: {message.item_id}, content_index: {message.content_index}, audio_end_ms: {message.audio_end_ms}",
+    "conversation.item.deleted": lambda message: f"Server | conversation.item.deleted | item_id: {message.item_id}",
+    "conversation.item.input_audio_transcription.completed": lambda message: f"Server | conversation.item.input_audio_transcription.completed | item_id: {message.item_id}, content_index: {message.content_index}, transcript: {message.transcript}",
+    "conversation.item.input_audio_transcription.failed": lambda message: f"Server | conversation.item.input_audio_transcription.failed | item_id: {message.item_id}, error: {message.error}",
+    "response.created": lambda message: f"Server | response.created | response_id: {message.response.id}",
+    "response.done": lambda message: f"Server | response.done | response_id: {message.response.id}",
+    "response.output_item.added": lambda message: f"Server | response.output_item.added | response_id: {message.response_id}, item_id: {message.item.id}",
+    "response.output_item.done": lambda message: f"Server | response.output_item.done | response_id: {message.response_id}, item_id: {message.item.id}",
+    "response.content_part.added": lambda message: f"Server | response.content_part.added | response_id: {message.response_id}, item_id: {message.item_id}",
+    "response.content_part.done": lambda message: f"Server | response.content_part.done | response_id: {message.response_id}, item_id: {message.item_id}",
+    "response.text.delta": lambda message: f"Server | response.text.delta | response_id: {message.response_id}, item_id: {message.item_id}, text: {message.delta}",
+    "response.text.done": lambda message: f"Server | response.text.done | response_id: {message.response_id}, item_id: {message.item_id}, text: {message.text}",
+    "response.audio_transcript.delta": lambda message: f"Server | response.audio_transcript.delta | response_id: {message.response_id}, item_id: {message.item_id}, transcript: {message.delta}",
+    "response.audio_transcript.done": lambda message: f"Server | response.audio_transcript.done | response_id: {message.response_id}, item_id: {message.item_id}, transcript: {message.transcript}",
+    "response.audio.delta": lambda message: f"Server | response.audio.delta | response_id: {message.response_id}, item_id: {message.item_id}, audio_data_length: {len(message.delta)}",
+    "response.audio.done": lambda message: f"Server | response.audio.done | response_id: {message.response_id}, item_id: {message.item_id}",
+    "response.function_call_arguments.delta": lambda message: f"Server | response.function_call_arguments.delta | response_id: {message.response_id}, item_id: {message.item_id}, arguments: {message.delta}",
+    "response.function_call_arguments.done": lambda message: f"Server | response.function_call_arguments.done | response_id: {message.response_id}, item_id: {message.item_id}, arguments: {message.arguments}",
+    "rate_limits.updated": lambda message: f"Server | rate_limits.updated | rate_limits: {message.rate_limits}",
+}
+# Event handlers by event type, registered with @server_event. Events without one are only logged
+server_event_handlers = {}
+
+def server_event(event_type: str):
+    def register(handler):
+        server_event_handlers[event_type] = handler
+        return handler
+    return register
+
+@server_event("session.created")
+async def on_session_created(context: ServerEventContext, message):
+    if context.session_id is not None:
+        # A second session on the same client means it reconnected. The response that was
+        # streaming ended with the old session, so whatever was buffered plays out
+        context.active_response_id = None
+        context.delta_decoder.end_of_stream()
+        await logger.info(f"Client | reconnected | {context.client.describe_reconnects()}")
+    context.session_id = message.session.id
+
+@server_event("input_audio_buffer.cleared")
+async def on_input_audio_buffer_cleared(context: ServerEventContext, message):
+    print("Input Audio Buffer Cleared Message")
+
+@server_event("input_audio_buffer.speech_started")
+async def on_speech_started(context: ServerEventContext, message):
+    print("Input Audio Buffer Speech Started Message")
+    print(f"  Item Id: {message.item_id}")
+    print(f"  Audio Start [ms]: {message.audio_start_ms}")
+    await interrupt_response(context.client, context.delta_decoder, context.active_response_id)
+    # A second barge-in before the next response keeps the cancelled one's late deltas dropped
+    if context.active_response_id is not None:
+        context.interrupted_response_id, context.active_response_id = context.active_response_id, None
+
+@server_event("input_audio_buffer.speech_stopped")
+async def on_speech_stopped(context: ServerEventContext, message):
+    print("Input Audio Buffer Speech Stopped Message")
+    print(f"  Item Id: {message.item_id}")
+    print(f"  Audio End [ms]: {message.audio_end_ms}")
+
+@server_event("conversation.item.created")
+async def on_item_created(context: ServerEventContext, message):
+    print("Conversation Item Created Message")
+    print(f"  Id: {message.item.id}")
+    print(f"  Previous Id: {message.previous_item_id}")
+    if message.item.type == "message":
+        print(f"  Role: {message.item.role}")
+        for index, content in enumerate(message.item.content):
+            print(f"  [{index}]:")
+            print(f"    Content Type: {content.type}")
+            if content.type == "input_text" or content.type == "text":
+                print(f"  Text: {content.text}")
+            elif content.type == "input_audio" or content.type == "audio":
+                print(f"  Audio Transcript: {content.transcript}")
+
+@server_event("conversation.item.truncated")
+async def on_item_truncated(context: ServerEventContext, message):
+    print("Conversation Item Truncated Message")
+    print(f"  Id: {message.item_id}")
+    print(f" Content Index: {message.content_index}")
+    print(f"  Audio End [ms]: {message.audio_end_ms}")
+
+@server_event("conversation.item.deleted")
+async def on_item_deleted(context: ServerEventContext, message):
+    print("Conversation Item Deleted Message")
+    print(f"  Id: {message.item_id}")
+
+@server_event("conversation.item.input_audio_transcription.completed")
+async def on_input_audio_transcription_completed(context: ServerEventContext, message):
+    print("Input Audio Transcription Completed Message")
+    print(f"  Id: {message.item_id}")
+    print(f"  Content Index: {message.content_index}")
+    print(f"  Transcript: {message.transcript}")
+
+@server_event("conversation.item.input_audio_transcription.failed")
+async def on_input_audio_transcription_failed(context: ServerEventContext, message):
+    print("Input Audio Transcription Failed Message")
+    print(f"  Id: {message.item_id}")
+    print(f"  Error: {message.error}")
 
-        # Mark that AI is talking, do not pass input audio to audio_input_queue to avoid echo
-        ai_last_talk_time = time.time()
+@server_event("response.created")
+async def on_response_created(context: ServerEventContext, message):
+    context.active_response_id = message.response.id
+    print("Response Created Message")
+    print(f"  Response Id: {message.response.id}")
+    print("  Output Items:")
+    for index, item in enumerate(message.response.output):
+        print(f"  [{index}]:")
+        print(f"    Item Id: {item.id}")
+        print(f"    Type: {item.type}")
+        if item.type == "message":
+            print(f"    Role: {item.role}")
+            match item.role:
+                case "system":
+                    for content_index, content in enumerate(item.content):
+                        print(f"    [{content_index}]:")
+                        print(f"      Content Type: {content.type}")
+                        print(f"      Text: {content.text}")
+                case "user":
+                    for content_index, content in enumerate(item.content):
+                        print(f"    [{content_index}]:")
+                        print(f"      Content Type: {content.type}")
+                        if content.type == "input_text":
+                            print(f"      Text: {content.text}")
+                        elif content.type == "input_audio":
+                            print(f"      Audio Data Length: {len(content.audio)}")
+                case "assistant":
+                    for content_index, content in enumerate(item.content):
+                        print(f"    [{content_index}]:")
+                        print(f"      Content Type: {content.type}")
+                        print(f"      Text: {content.text}")
+        elif item.type == "function_call":
+            print(f"    Call Id: {item.call_id}")
+            print(f"    Function Name: {item.name}")
+            print(f"    Parameters: {item.arguments}")
+        elif item.type == "function_call_output":
+            print(f"    Call Id: {item.call_id}")
+            print(f"    Output: {item.output}")
 
-        # resample audio data from 24000 Hz to 11025 Hz
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        resampled_audio_array = resample(audio_array, int(len(audio_array) * 11025 / 24000), )
-        resampled_audio_data = resampled_audio_array.astype(np.int16).tobytes()
-        
-        output_stream.write(resampled_audio_data)
+@server_event("response.done")
+async def on_response_done(context: ServerEventContext, message):
+    if message.response.id == context.active_response_id:
+        context.active_response_id = None
+    await logger.info(f"Client | delta decoder | {context.delta_decoder.describe()}")
+    context.delta_decoder.reset_statistics()
+    # print("Response Done Message")
+    # print(f"  Response Id: {message.response.id}")
+    # if message.response.status_details:
+    #     print(f"  Status Details: {message.response.status_details.model_dump_json()}")
 
-async def receive_messages(client: RTLowLevelClient):
+@server_event("response.text.done")
+async def on_response_text_done(context: ServerEventContext, message):
+    print("Response Text Done Message")
+    print(f"  Response Id: {message.response_id}")
+    print(f"  Text: {message.text}")
+
+@server_event("response.audio_transcript.done")
+async def on_response_audio_transcript_done(context: ServerEventContext, message):
+    print("Response Audio Transcript Done Message")
+    print(f"  Response Id: {message.response_id}")
+    print(f"  Item Id: {message.item_id}")
+    print(f"  Transcript: {message.transcript}")
+
+@server_event("response.audio.delta")
+async def on_response_audio_delta(context: ServerEventContext, message):
+    if message.response_id == context.interrupted_response_id:
+        # still in flight when the response was cancelled
+        return
+    # base64 decoding and resampling run on the decoder's worker thread, which writes into the
+    # playout buffer, so the receive loop goes straight back to reading the websocket
+    context.delta_decoder.submit(message.delta, item_id=message.item_id, content_index=message.content_index)
+
+@server_event("response.audio.done")
+async def on_response_audio_done(context: ServerEventContext, message):
+    context.delta_decoder.end_of_stream()
+
+@server_event("response.function_call_arguments.done")
+async def on_function_call_arguments_done(context: ServerEventContext, message):
+    try:
+        arguments = json.loads(message.arguments)
+        await call_tool(context.client, message.item_id, message.call_id, message.name, arguments)
+    except Exception as e:
+        print(f"Error calling tool: {e}")
+
+async def dispatch_server_event(context: ServerEventContext, message):
+    event_type = message.type
+    if event_log_sampler.should_log(event_type):
+        log_format = server_event_log_formats.get(event_type)
+        await logger.info(log_format(message) if log_format else f"Server | {event_type}")
+    handler = server_event_handlers.get(event_type)
+    if handler is not None:
+        await handler(context, message)
+
+async def receive_messages(client: RTLowLevelClient, delta_decoder: DeltaDecoder, pending_messages: list = ()):
+    context = ServerEventContext(client, delta_decoder)
+    # Events the server sent before the session was handed over, e.g. session.created
+    for message in pending_messages:
+        await dispatch_server_event(context, message)
     while True:
         message = await client.recv()
         # print(f"{message=}")
         if message is None:
+            if client.closed:
+                return
             continue
-        match message.type:
-            case "session.created":
-                await logger.info(f"Server | session.created | model: {message.session.model}, session_id: {message.session.id}")
-            case "error":
-                await logger.info(f"Server | error | error message:{message.error}")
-            case "input_audio_buffer.committed":
-                await logger.info(f"Server | input_audio_buffer.committed | item_id:{message.item_id}")
-                pass
-            case "input_audio_buffer.cleared":
-                await logger.info(f"Server | input_audio_buffer.cleared | item_id: {message.item_id}")
-                print("Input Audio Buffer Cleared Message")
-                pass
-            case "input_audio_buffer.speech_started":
-                await logger.info(f"Server | input_audio_buffer.speech_started | item_id: {message.item_id}, audio_start_ms: {message.audio_start_ms}")
-                print("Input Audio Buffer Speech Started Message")
-                print(f"  Item Id: {message.item_id}")
-                print(f"  Audio Start [ms]: {message.audio_start_ms}")
-                while not audio_output_queue.empty():
-                    audio_output_queue.get()
-                await asyncio.sleep(0)
-            case "input_audio_buffer.speech_stopped":
-                await logger.info(f"Server | input_audio_buffer.speech_stopped | item_id: {message.item_id}, audio_end_ms: {message.audio_end_ms}")
-                print("Input Audio Buffer Speech Stopped Message")
-                print(f"  Item Id: {message.item_id}")
-                print(f"  Audio End [ms]: {message.audio_end_ms}")
-                pass
-            case "conversation.item.created":
-                await logger.info(f"Server | conversation.item.created | item_id: {message.item.id}, previous_item_id: {message.previous_item_id}")
-                print("Conversation Item Created Message")
-                print(f"  Id: {message.item.id}")
-                print(f"  Previous Id: {message.previous_item_id}")
-                if message.item.type == "message":
-                    print(f"  Role: {message.item.role}")
-                    for index, content in enumerate(message.item.content):
-                        print(f"  [{index}]:")
-                        print(f"    Content Type: {content.type}")
-                        if content.type == "input_text" or content.type == "text":
-                            print(f"  Text: {content.text}")
-                        elif content.type == "input_audio" or content.type == "audio":
-                            print(f"  Audio Transcript: {content.transcript}")
-                pass
-            case "conversation.item.truncated":
-                await logger.info(f"Server | conversation.item.truncated | item_id: {message.item_id}, content_index: {message.content_index}, audio_end_ms: {message.audio_end_ms}")
-                print("Conversation Item Truncated Message")
-                print(f"  Id: {message.item_id}")
-                print(f" Content Index: {message.content_index}")
-                print(f"  Audio End [ms]: {message.audio_end_ms}")
-            case "conversation.item.deleted":
-                await logger.info(f"Server | conversation.item.deleted | item_id: {message.item_id}")
-                print("Conversation Item Deleted Message")
-                print(f"  Id: {message.item_id}")
-                pass
-            case "conversation.item.input_audio_transcription.completed":
-                await logger.info(f"Server | conversation.item.input_audio_transcription.completed | item_id: {message.item_id}, content_index: {message.content_index}, transcript: {message.transcript}")
-                print("Input Audio Transcription Completed Message")
-                print(f"  Id: {message.item_id}")
-                print(f"  Content Index: {message.content_index}")
-                print(f"  Transcript: {message.transcript}")
-            case "conversation.item.input_audio_transcription.failed":
-                await logger.info(f"Server | conversation.item.input_audio_transcription.failed | item_id: {message.item_id}, error: {message.error}")
-                print("Input Audio Transcription Failed Message")
-                print(f"  Id: {message.item_id}")
-                print(f"  Error: {message.error}")
-            case "response.created":
-                await logger.info(f"Server | response.created | response_id: {message.response.id}")
-                print("Response Created Message")
-                print(f"  Response Id: {message.response.id}")
-                print("  Output Items:")
-                for index, item in enumerate(message.response.output):
-                    print(f"  [{index}]:")
-                    print(f"    Item Id: {item.id}")
-                    print(f"    Type: {item.type}")
-                    if item.type == "message":
-                        print(f"    Role: {item.role}")
-                        match item.role:
-                            case "system":
-                                for content_index, content in enumerate(item.content):
-                                    print(f"    [{content_index}]:")
-                                    print(f"      Content Type: {content.type}")
-                                    print(f"      Text: {content.text}")
-                            case "user":
-                                for content_index, content in enumerate(item.content):
-                                    print(f"    [{content_index}]:")
-                                    print(f"      Content Type: {content.type}")
-                                    if content.type == "input_text":
-                                        print(f"      Text: {content.text}")
-                                    elif content.type == "input_audio":
-                                        print(f"      Audio Data Length: {len(content.audio)}")
-                            case "assistant":
-                                for content_index, content in enumerate(item.content):
-                                    print(f"    [{content_index}]:")
-                                    print(f"      Content Type: {content.type}")
-                                    print(f"      Text: {content.text}")
-                    elif item.type == "function_call":
-                        print(f"    Call Id: {item.call_id}")
-                        print(f"    Function Name: {item.name}")
-                        print(f"    Parameters: {item.arguments}")
-                    elif item.type == "function_call_output":
-                        print(f"    Call Id: {item.call_id}")
-                        print(f"    Output: {item.output}")
-            case "response.done":
-                await logger.info(f"Server | response.done | response_id: {message.response.id}")
-                # print("Response Done Message")
-                # print(f"  Response Id: {message.response.id}")
-                # if message.response.status_details:
-                #     print(f"  Status Details: {message.response.status_details.model_dump_json()}")
-                pass
-            case "response.output_item.added":
-                await logger.info(f"Server | response.output_item.added | response_id: {message.response_id}, item_id: {message.item.id}")
-            case "response.output_item.done":
-                await logger.info(f"Server | response.output_item.done | response_id: {message.response_id}, item_id: {message.item.id}")
-            case "response.content_part.added":
-                await logger.info(f"Server | response.content_part.added | response_id: {message.response_id}, item_id: {message.item_id}")
-            case "response.content_part.done":
-                await logger.info(f"Server | response.content_part.done | response_id: {message.response_id}, item_id: {message.item_id}")
-            case "response.text.delta":
-                await logger.info(f"Server | response.text.delta | response_id: {message.response_id}, item_id: {message.item_id}, text: {message.delta}")
-            case "response.text.done":
-                await logger.info(f"Server | response.text.done | response_id: {message.response_id}, item_id: {message.item_id}, text: {message.text}")
-                print("Response Text Done Message")
-                print(f"  Response Id: {message.response_id}")
-                print(f"  Text: {message.text}")
-            case "response.audio_transcript.delta":
-                await logger.info(f"Server | response.audio_transcript.delta | response_id: {message.response_id}, item_id: {message.item_id}, transcript: {message.delta}")
-            case "response.audio_transcript.done":
-                await logger.info(f"Server | response.audio_transcript.done | response_id: {message.response_id}, item_id: {message.item_id}, transcript: {message.transcript}")
-                print("Response Audio Transcript Done Message")
-                print(f"  Response Id: {message.response_id}")
-                print(f"  Item Id: {message.item_id}")
-                print(f"  Transcript: {message.transcript}")
-            case "response.audio.delta":
-                await logger.info(f"Server | response.audio.delta | response_id: {message.response_id}, item_id: {message.item_id}, audio_data_length: {len(message.delta)}")
-                # print("Response Audio Delta Message")
-                # print(f"  Response Id: {message.response_id}")
-                # print(f"  Item Id: {message.item_id}")
-                # print(f"  Audio Data Length: {len(message.delta)}")
-                audio_data = base64.b64decode(message.delta)
-                # print(f"  Audio Binary Data Length: {len(audio_data)}")
-                # audio_duration = len(audio_data) / OUTPUT_SAMPLE_RATE / OUTPUT_SAMPLE_WIDTH / OUTPUT_CHANNELS
-                # print(f"  Audio Duration Time: {audio_duration}")
-                for i in range(0, len(audio_data), OUTPUT_CHUNK_SIZE):
-                    audio_output_queue.put(audio_data[i:i+OUTPUT_CHUNK_SIZE])
-                await asyncio.sleep(0)
-            case "response.audio.done":
-                await logger.info(f"Server | response.audio.done | response_id: {message.response_id}, item_id: {message.item_id}")
-            case "response.function_call_arguments.delta":
-                await logger.info(f"Server | response.function_call_arguments.delta | response_id: {message.response_id}, item_id: {message.item_id}, arguments: {message.delta}")
-            case "response.function_call_arguments.done":
-                await logger.info(f"Server | response.function_call_arguments.done | response_id: {message.response_id}, item_id: {message.item_id}, arguments: {message.arguments}")
-                try:
-                    arguments = json.loads(message.arguments)
-                    await call_tool(client, message.item_id, message.call_id, message.name, arguments)
-                except Exception as e:
-                    print(f"Error calling tool: {e}")
-            case "rate_limits.updated":
-                await logger.info(f"Server | rate_limits.updated | rate_limits: {message.rate_limits}")
-            case _:
-                await logger.info(f"Server | {message.type}")
+        await dispatch_server_event(context, message)
 
 
 def get_env_var(var_name: str) -> str:
@@ -316,24 +422,71 @@ def get_env_var(var_name: str) -> str:
     return value
 
 
-async def start_realtime_chat():
+def create_session_update() -> SessionUpdateMessage:
+    return SessionUpdateMessage(
+        session=SessionUpdateParams(
+            turn_detection=ServerVAD(type="server_vad", threshold=0.5, prefix_padding_ms=200, silence_duration_ms=600),
+            input_audio_transcription=InputAudioTranscription(model="whisper-1"),
+            model="gpt-4o-realtime-preview-2024-10-01",
+            voice=VOICE_TYPE,
+            instructions=INSTRUCTIONS,
+            temperature=TEMPERATURE,
+            max_response_output_tokens=MAX_RESPONSE_OUTPUT_TOKENS,
+            modalities=['audio', 'text'],
+            input_audio_format=AUDIO_TRANSPORT_FORMAT,
+            output_audio_format=AUDIO_TRANSPORT_FORMAT,
+            tools=TOOLS,
+            tool_choice=TOOL_CHOICE,
+        )
+    )
+
+
+def create_session_pool() -> SessionPool:
     endpoint = get_env_var("AZURE_OPENAI_ENDPOINT")
-    key = get_env_var("AZURE_OPENAI_API_KEY")
     deployment = get_env_var("AZURE_OPENAI_DEPLOYMENT")
+    # With Entra ID the token comes from this process's cache, otherwise the API key is used
+    token_cache = shared_token_cache()
+    key_credential = AzureKeyCredential(get_env_var("AZURE_OPENAI_API_KEY")) if token_cache is None else None
+
+    def create_client():
+        return RTLowLevelClient(
+            endpoint,
+            key_credential=key_credential,
+            token_cache=token_cache,
+            azure_deployment=deployment,
+            reconnect=REALTIME_RECONNECT,
+            backoff=Backoff(max_attempts=REALTIME_RECONNECT_ATTEMPTS),
+            replay_items=REALTIME_REPLAY_ITEMS,
+            audio_queue_limit=REALTIME_AUDIO_QUEUE_LIMIT,
+            recorder=SessionRecorder.create(REALTIME_RECORD_DIR) if REALTIME_RECORD_DIR else None,
+        )
+
+    return SessionPool(create_client, create_session_update(), refresh_margin=REALTIME_SESSION_REFRESH_MARGIN)
+
+
+def set_first_audio(first_audio: asyncio.Future, played_at: float):
+    """Resolve first_audio with played_at, unless the conversation ended before any audio played."""
+    if not first_audio.done():
+        first_audio.set_result(played_at)
+
+async def log_wake_to_first_audio(first_audio: asyncio.Future, wake_time: float, warm: bool):
+    """Log the time from the wake word until the first assistant audio went to the speaker."""
+    played_at = await first_audio
+    await logger.info(f"Client | wake to first audio | {(played_at - wake_time) * 1000:.0f} ms, {'warm' if warm else 'cold'} session")
+
+async def start_realtime_chat(session_pool: Optional[SessionPool] = None, wake_time: Optional[float] = None):
+    """
+    Talk until the conversation ends. The session comes from session_pool, which hands over a
+    standby session when one is warm; without a pool a session is opened here. wake_time is the
+    time.monotonic() of the wake word, for the wake to first audio latency in the log, which is
+    taken when the playback callback first hands assistant audio to the speaker.
+    """
+    if session_pool is None:
+        session_pool = create_session_pool()
 
     p = pyaudio.PyAudio()
     input_default_input_index = p.get_default_input_device_info()['index']
     print(f"input_default_input_index: {input_default_input_index}")
-    input_stream = p.open(
-        format=STREAM_FORMAT,
-        channels=INPUT_CHANNELS,
-        rate=INPUT_SAMPLE_RATE,
-        input=True,
-        output=False,
-        frames_per_buffer=INPUT_CHUNK_SIZE,
-        input_device_index=input_default_input_index,
-        start=False,
-    )
 
     for i in range(p.get_device_count()):
         device_info = p.get_device_info_by_index(i)
@@ -344,46 +497,136 @@ async def start_realtime_chat():
     # ('wm8960-soundcard').index
     # p.get_default_output_device_info()['index']
     print(f"output_default_output_index: {output_default_output_index}")
+
+    # Run the sound card at the API rate when it can, so audio needs no resampling at all
+    rate_plan = negotiate_sample_rate(
+        p,
+        api_rate=API_SAMPLE_RATE,
+        fallback_rate=INPUT_SAMPLE_RATE,
+        format=STREAM_FORMAT,
+        input_device_index=input_default_input_index,
+        input_channels=INPUT_CHANNELS,
+        output_device_index=output_default_output_index,
+        output_channels=OUTPUT_CHANNELS,
+    )
+    print(f"Audio path: {rate_plan.describe()}")
+    await logger.info(f"Client | audio path | {rate_plan.describe()}")
+
+    # The streams run in callback mode: PortAudio's own thread moves each period between the
+    # sound card and these preallocated buffers. The microphone DSP runs on the capture
+    # processor's thread and the event loop only sends what it has gated
+    capture_buffer = RingBuffer(rate_plan.device_rate * INPUT_BUFFER_SECONDS)
+    # Processed microphone audio at API_SAMPLE_RATE, waiting to be sent. It and the batcher
+    # belong to this conversation, so unsent audio and batching stats do not carry over
+    audio_input_buffer = RingBuffer(API_SAMPLE_RATE * INPUT_BUFFER_SECONDS)
+    append_batcher = AppendBatcher(API_SAMPLE_RATE, AUDIO_APPEND_TARGET_MS)
+    audio_output_buffer = JitterBuffer(
+        rate_plan.device_rate,
+        OUTPUT_BUFFER_SECONDS,
+        target_delay_ms=PLAYOUT_TARGET_DELAY_MS,
+        min_delay_ms=PLAYOUT_MIN_DELAY_MS,
+        max_delay_ms=PLAYOUT_MAX_DELAY_MS,
+    )
+    # both streams run at the same rate, so the speaker audio lines up sample for sample with
+    # the microphone once the stream latencies are taken out
+    far_end_buffer = RingBuffer(rate_plan.device_rate * 2)
+    loop = asyncio.get_running_loop()
+    input_bridge = ThreadToLoopBridge(loop)
+    capture_callback = CaptureCallback(capture_buffer)
+    # The first period with assistant audio in it is reported from the PortAudio thread
+    first_audio = loop.create_future()
+    playback_callback = PlaybackCallback(
+        audio_output_buffer,
+        OUTPUT_CHUNK_SIZE,
+        far_end_buffer,
+        on_first_audio=lambda played_at: loop.call_soon_threadsafe(set_first_audio, first_audio, played_at),
+    )
+
+    input_stream = p.open(
+        format=STREAM_FORMAT,
+        channels=INPUT_CHANNELS,
+        rate=rate_plan.device_rate,
+        input=True,
+        output=False,
+        frames_per_buffer=INPUT_CHUNK_SIZE,
+        input_device_index=input_default_input_index,
+        start=False,
+        stream_callback=capture_callback,
+    )
     output_stream = p.open(
         format=STREAM_FORMAT,
         channels=OUTPUT_CHANNELS,
-        rate=OUTPUT_SAMPLE_RATE,
+        rate=rate_plan.device_rate,
         input=False,
         output=True,
         frames_per_buffer=OUTPUT_CHUNK_SIZE,
         output_device_index=output_default_output_index,
         start=False,
+        stream_callback=playback_callback,
     )
-    input_stream.start_stream()
-    output_stream.start_stream()
 
     print("Start Processing")
-    async with RTLowLevelClient(
-        endpoint, key_credential=AzureKeyCredential(key), azure_deployment=deployment
-    ) as client:
-        await logger.info("Client | session.update")
-        await client.send(
-            SessionUpdateMessage(
-                session=SessionUpdateParams(
-                    turn_detection=ServerVAD(type="server_vad", threshold=0.5, prefix_padding_ms=200, silence_duration_ms=600),
-                    input_audio_transcription=InputAudioTranscription(model="whisper-1"),
-                    model="gpt-4o-realtime-preview-2024-10-01",
-                    voice=VOICE_TYPE,
-                    instructions=INSTRUCTIONS,
-                    temperature=TEMPERATURE,
-                    max_response_output_tokens=MAX_RESPONSE_OUTPUT_TOKENS,
-                    modalities=['audio', 'text'],
-                    input_audio_format="pcm16",
-                    output_audio_format="pcm16",
-                    tools=TOOLS,
-                    tool_choice=TOOL_CHOICE,
-                )
+    session = await session_pool.acquire()
+    client = session.client
+    await logger.info(
+        f"Client | session ready | {'warm' if session.warm else 'cold'}, setup took {session.setup_time * 1000:.0f} ms, "
+        f"pool {session_pool.describe()}"
+    )
+    # Decodes the assistant's audio on its own thread once started, stopped with the session
+    output_resampler = StreamResampler(API_SAMPLE_RATE, rate_plan.device_rate)
+    delta_decoder = DeltaDecoder(audio_output_buffer, transport_codec, output_resampler)
+    capture_processor = None
+    wake_log_task = None
+    try:
+        input_resampler = StreamResampler(rate_plan.device_rate, API_SAMPLE_RATE)
+        vad_gate = VoiceActivityGate(
+            API_SAMPLE_RATE,
+            preroll_ms=LOCAL_VAD_PREROLL_MS,
+            hangover_ms=LOCAL_VAD_HANGOVER_MS,
+            min_rms=LOCAL_VAD_MIN_RMS,
+            enabled=LOCAL_VAD_ENABLED,
+        )
+        # The playback callback writes the far-end ring as it hands each period to PortAudio, so
+        # the echo of a period reaches the microphone one output latency after its reference.
+        # The input latency is not added: capture and far-end rings are read in step, and a
+        # longer delay would put the reference behind its own echo
+        echo_canceller = EchoCanceller(
+            rate_plan.device_rate,
+            tail_ms=ECHO_TAIL_MS,
+            delay_samples=int(output_stream.get_output_latency() * rate_plan.device_rate),
+        )
+        capture_processor = CaptureProcessor(
+            capture_buffer,
+            far_end_buffer,
+            audio_input_buffer,
+            echo_canceller,
+            input_resampler,
+            vad_gate,
+            append_batcher,
+            INPUT_CHUNK_SIZE,
+            bridge=input_bridge,
+        )
+        capture_processor.start()
+        input_stream.start_stream()
+        output_stream.start_stream()
+        if wake_time is not None:
+            # From here on the microphone streams into a configured session
+            await logger.info(
+                f"Client | wake to streaming | {(time.monotonic() - wake_time) * 1000:.0f} ms, "
+                f"{'warm' if session.warm else 'cold'} session"
+            )
+            wake_log_task = asyncio.create_task(log_wake_to_first_audio(first_audio, wake_time, session.warm))
+        send_task = asyncio.create_task(
+            send_audio(
+                client,
+                capture_processor,
+                input_bridge,
+                capture_callback,
+                playback_callback,
             )
         )
-        threading.Thread(target=listen_audio, args=(input_stream,), daemon=True).start()
-        threading.Thread(target=play_audio, args=(output_stream,), daemon=True).start()
-        send_task = asyncio.create_task(send_audio(client))
-        receive_task = asyncio.create_task(receive_messages(client))
+        delta_decoder.start()
+        receive_task = asyncio.create_task(receive_messages(client, delta_decoder, session.events))
         execute_tool_task = asyncio.create_task(execute_tool(client))
         send_text_client_event_task = asyncio.create_task(send_text_client_event(client))
 
@@ -392,6 +635,19 @@ async def start_realtime_chat():
             receive_task, 
             execute_tool_task, 
             send_text_client_event_task)
+    finally:
+        if wake_log_task is not None:
+            wake_log_task.cancel()
+        # Stop the PortAudio callbacks before the threads they feed, then release the devices
+        for stream in (input_stream, output_stream):
+            if not stream.is_stopped():
+                stream.stop_stream()
+            stream.close()
+        p.terminate()
+        if capture_processor is not None:
+            capture_processor.stop()
+        delta_decoder.stop()
+        await client.close()
 
 # if __name__ == "__main__":
 #     load_dotenv()
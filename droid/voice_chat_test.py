@@ -0,0 +1,90 @@
+import asyncio
+import base64
+import importlib
+
+import numpy as np
+import pytest
+
+from droid.audio import DeltaDecoder, JitterBuffer, StreamResampler
+from droid.audio.g711 import PCM16
+from droid.rtclient import create_message_from_dict
+
+SAMPLE_RATE = 24000
+
+
+@pytest.fixture
+def voice_chat(tmp_path, monkeypatch):
+    # The module opens its log file under ./log when it is first imported
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("droid.voice_chat")
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+def speech_started(item_id: str):
+    return create_message_from_dict(
+        {"type": "input_audio_buffer.speech_started", "event_id": "event_1", "item_id": item_id, "audio_start_ms": 0}
+    )
+
+
+def audio_delta(response_id: str, item_id: str, samples: int):
+    delta = base64.b64encode(np.full(samples, 1000, dtype=np.int16).tobytes()).decode("ascii")
+    return create_message_from_dict(
+        {
+            "type": "response.audio.delta",
+            "event_id": "event_2",
+            "response_id": response_id,
+            "item_id": item_id,
+            "output_index": 0,
+            "content_index": 0,
+            "delta": delta,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_barge_in_truncates_to_what_was_played_once(voice_chat):
+    output = JitterBuffer(SAMPLE_RATE, 5, target_delay_ms=40, min_delay_ms=40)
+    decoder = DeltaDecoder(output, PCM16, StreamResampler(SAMPLE_RATE, SAMPLE_RATE), threaded=False)
+    client = FakeClient()
+    context = voice_chat.ServerEventContext(client, decoder, active_response_id="resp_1")
+    for _ in range(5):
+        await voice_chat.dispatch_server_event(context, audio_delta("resp_1", "item_1", 480))
+    # The speaker has taken 1200 samples, 50 ms, when the user starts talking
+    output.read_into(np.zeros(1200, dtype=np.int16))
+
+    await voice_chat.dispatch_server_event(context, speech_started("item_user_1"))
+    assert [message.type for message in client.sent] == ["response.cancel", "conversation.item.truncate"]
+    truncate = client.sent[1]
+    assert (truncate.item_id, truncate.content_index, truncate.audio_end_ms) == ("item_1", 0, 50)
+    assert output.fill == 0
+
+    # Deltas of the cancelled response still in flight are dropped, and a second barge-in
+    # has no response to cancel and nothing played to truncate
+    await voice_chat.dispatch_server_event(context, audio_delta("resp_1", "item_1", 480))
+    await voice_chat.dispatch_server_event(context, speech_started("item_user_2"))
+    await voice_chat.dispatch_server_event(context, audio_delta("resp_1", "item_1", 480))
+    assert len(client.sent) == 2
+    assert output.fill == 0
+    assert context.interrupted_response_id == "resp_1"
+
+
+@pytest.mark.asyncio
+async def test_first_audio_after_the_conversation_ended_is_ignored(voice_chat):
+    loop = asyncio.get_running_loop()
+    first_audio = loop.create_future()
+    voice_chat.set_first_audio(first_audio, 1.5)
+    voice_chat.set_first_audio(first_audio, 2.5)
+    assert first_audio.result() == 1.5
+
+    # The wake log task cancels the future when the session ends before anything played
+    ended = loop.create_future()
+    ended.cancel()
+    voice_chat.set_first_audio(ended, 1.5)
+    assert ended.cancelled()
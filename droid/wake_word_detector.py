@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 import pvporcupine
 from pvrecorder import PvRecorder
 
@@ -10,8 +12,15 @@ class WakeWordDetector():
   ):
     self._access_key = access_key
     self.recorder = None
+    # time.monotonic() of the last detection
+    self.detected_at = None
     
   async def wait_for_wake_word(self):
+    # Porcupine reads the microphone in a blocking loop, so it runs on a worker thread and the
+    # event loop stays free for the display and the standby realtime session
+    return await asyncio.get_running_loop().run_in_executor(None, self._listen)
+
+  def _listen(self):
     porcupine = None
     recorder = None
     try:
@@ -45,6 +54,7 @@ class WakeWordDetector():
         pcm = recorder.read()
         result = porcupine.process(pcm)
         if result >= 0:
+          self.detected_at = time.monotonic()
           print('Wakeword {} detected. Stopping wake word detector.'.format(result))
           recorder.stop()
           # Stop & delete recorder to free up microphone to speech recognizer
@@ -2,7 +2,9 @@ import asyncio
 import os
 import random
 from dotenv import load_dotenv
-from droid.voice_chat import start_realtime_chat
+from droid.config import REALTIME_PREWARM
+from droid.token_cache import shared_token_cache
+from droid.voice_chat import create_session_pool, start_realtime_chat
 from droid.display import SummaryScreen, Face
 from droid.wake_word_detector import WakeWordDetector
 
@@ -39,6 +41,16 @@ async def main():
     exit_event = asyncio.Event()  # Event for stopping the loop
 
     summary_screen.showText("Wake me by saying\n'Hey Droid!'")
+
+    # Keep the Entra ID token fresh in the background, so neither connecting nor the agent waits for it
+    token_cache = shared_token_cache()
+    if token_cache is not None:
+        token_cache.start()
+
+    # Connect and configure the next realtime session while waiting for the wake word
+    session_pool = create_session_pool()
+    if REALTIME_PREWARM:
+        session_pool.start()
     
     # Start the displayFace function asynchronously
     display_task = asyncio.create_task(displayFace(exit_event))
@@ -54,7 +66,7 @@ async def main():
             wake_detected = await wake_detection_task
             if wake_detected:
                 summary_screen.showText("How can I help?")
-                await start_realtime_chat()
+                await start_realtime_chat(session_pool, wake_time=wake_word_detector.detected_at)
                 summary_screen.showText("Sleepy time.")
                 await asyncio.sleep(1)
             else:
@@ -67,6 +79,9 @@ async def main():
     finally:
         # Set the event to stop displayFace and wait for it to finish
         exit_event.set()
+        await session_pool.stop()
+        if token_cache is not None:
+            await token_cache.stop()
         summary_screen.poweroff()
 
 if __name__ == "__main__":